@@ -1,6 +1,19 @@
+import sys
+
 from fire import Fire
 import ODConvert.router as router
+from ODConvert.core import profiling
 
 
 def main():
-    Fire(router)
+    # Profiling flags apply to every command, so they are taken off
+    # the command line before Fire sees it
+    try:
+        argv, profile = profiling.parse_args(sys.argv[1:])
+    except ValueError as e:
+        sys.exit(f"ERROR: {e}")
+    if profile is None:
+        Fire(router, command=argv)
+        return
+    with profiling.session(**profile):
+        Fire(router, command=argv)
@@ -0,0 +1,238 @@
+import asyncio
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import chain
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Sequence, Tuple
+
+from ODConvert.core import profiling
+from ODConvert.core.autodetect import autodetect
+from ODConvert.core.cache import PartitionCache
+from ODConvert.core.dataset import DatasetHandler, DatasetImage
+from ODConvert.core.dataset import DatasetPartition
+from ODConvert.core.geometry import BoxFormat, convert_boxes, image_sizes
+from ODConvert.core.stream import RecordChunk, bounded
+
+# The library API: opening datasets and iterating over batches of their
+# images and boxes, without the CLI, its output or its prompts
+__all__ = [
+    "Batch", "BoxFormat", "open_dataset", "get_partition",
+    "iter_batches", "aiter_batches",
+]
+
+
+@dataclass
+class Batch:
+    """
+    A batch of images of a partition with their boxes, in columns. The
+    boxes of image i are the rows offsets[i] to offsets[i + 1]. Columns
+    are arrays, or NumPy arrays if requested, in which case boxes has a
+    row of four coordinates per box.
+    """
+    partition: str
+    images: List[DatasetImage]
+    image_ids: Sequence[int]
+    # Start row of every image, followed by the number of rows
+    offsets: Sequence[int]
+    class_ids: Sequence[int]
+    iscrowd: Sequence[int]
+    # The four coordinates of every box, in the requested format, as a
+    # flat array or an (n, 4) NumPy array
+    boxes: Sequence[float]
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def targets(self, position: int) -> Tuple[Sequence[int],
+                                              Sequence[float]]:
+        """
+        Returns the class IDs and boxes of an image of the batch.
+        :param position: The position of the image in the batch.
+        :return: Tuple of the class IDs and the boxes
+        """
+        start, stop = self.offsets[position], self.offsets[position + 1]
+        if isinstance(self.boxes, array):
+            return self.class_ids[start:stop], \
+                self.boxes[4 * start:4 * stop]
+        return self.class_ids[start:stop], self.boxes[start:stop]
+
+
+def open_dataset(path: str | Path | Sequence[str | Path],
+                 stream: bool = True, cache: bool = False,
+                 strict: bool = True,
+                 workers: int | None = None) -> DatasetHandler:
+    """
+    Detects the type of a dataset and opens it. Several datasets are
+    loaded concurrently and merged into one, see MergedDatasetHandler.
+    :param path: The path to the dataset, or a list of paths.
+    :param stream: Whether annotation files are streamed instead of
+    being loaded at once.
+    :param cache: Whether parsed partitions are stored in and reused
+    from the partition cache, see PartitionCache.
+    :param strict: Whether annotations of unknown images or classes
+    are rejected.
+    :param workers: The number of threads several datasets are loaded
+    on.
+    :return: DatasetHandler
+    """
+    options = dict(stream=stream, strict=strict,
+                   cache=PartitionCache() if cache else None)
+    if isinstance(path, (str, Path)):
+        return autodetect(Path(path), **options)
+    # Imported here as merging is only needed by few callers
+    from ODConvert.core.merge import MergedDatasetHandler, load_datasets
+    datasets = load_datasets([Path(p) for p in path], workers, **options)
+    if len(datasets) == 1:
+        return datasets[0]
+    return MergedDatasetHandler(datasets, workers)
+
+
+def get_partition(dataset: DatasetHandler, name: str) -> DatasetPartition:
+    """
+    Returns a partition of a dataset by name.
+    :param dataset: The dataset.
+    :param name: The name of the partition, e.g. "train".
+    :return: DatasetPartition
+    """
+    partitions = {p.name: p for p in dataset.get_partitions()}
+    if name not in partitions:
+        raise KeyError(
+            f"No partition named {name!r}, the dataset has: "
+            f"{', '.join(partitions)}")
+    return partitions[name]
+
+
+def _numpy():
+    # NumPy is an optional dependency, only needed for NumPy batches
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "NumPy batches require numpy, install it with: "
+            "pip install odconvert[numpy]")
+    return numpy
+
+
+def _make_batch(name: str, chunk: RecordChunk, box_format: BoxFormat,
+                normalized: bool, clip: bool, numpy: bool) -> Batch:
+    # Gather the rows of the chunk grouped by image
+    table = chunk.annotations
+    index = chunk.index
+    rows = array("q")
+    offsets = array("q", [0])
+    for image in chunk.images:
+        rows.extend(index.rows(image.id))
+        offsets.append(len(rows))
+    columns = tuple(
+        array("d", (column[row] for row in rows))
+        for column in (table.x_center, table.y_center,
+                       table.width, table.height))
+
+    # Boxes are stored as absolute center, width and height
+    if normalized or clip:
+        widths, heights = image_sizes(
+            (table.image_ids[row] for row in rows), index.images)
+        columns, _ = convert_boxes(
+            columns, BoxFormat.CXCYWH, box_format, widths, heights,
+            dst_normalized=normalized, clip=clip)
+    elif box_format is not BoxFormat.CXCYWH:
+        columns, _ = convert_boxes(columns, BoxFormat.CXCYWH, box_format)
+    # Probing the image sizes may have filled them in
+    images = [index.images.get(image.id, image) for image in chunk.images]
+    batch = Batch(
+        partition=name,
+        images=images,
+        image_ids=array("q", (image.id for image in images)),
+        offsets=offsets,
+        class_ids=array("q", (table.class_ids[row] for row in rows)),
+        iscrowd=array("b", (table.iscrowd[row] for row in rows)),
+        boxes=array("d", chain.from_iterable(zip(*columns))))
+    if numpy:
+        np = _numpy()
+        batch.image_ids = np.frombuffer(batch.image_ids, dtype=np.int64)
+        batch.offsets = np.frombuffer(batch.offsets, dtype=np.int64)
+        batch.class_ids = np.frombuffer(batch.class_ids, dtype=np.int64)
+        batch.iscrowd = np.frombuffer(batch.iscrowd, dtype=np.int8)
+        batch.boxes = np.frombuffer(
+            batch.boxes, dtype=np.float64).reshape(-1, 4)
+    return batch
+
+
+def iter_batches(partition: DatasetPartition, batch_size: int = 64,
+                 box_format: BoxFormat = BoxFormat.CXCYWH,
+                 normalized: bool = False, clip: bool = False,
+                 numpy: bool = False,
+                 prefetch: int = 0) -> Iterator[Batch]:
+    """
+    Yields the images of a partition in batches, in image ID order,
+    together with their boxes. Streamed partitions are read batch by
+    batch, so memory use does not grow with the partition.
+    :param partition: The partition.
+    :param batch_size: The maximum number of images per batch.
+    :param box_format: The format of the boxes.
+    :param normalized: Whether the boxes are made relative to the
+    image size, which is read from the image headers where unknown.
+    :param clip: Whether the boxes are clipped to their image.
+    :param numpy: Whether the columns are NumPy arrays, which requires
+    numpy. They share the memory of the batch arrays.
+    :param prefetch: The number of batches prepared ahead on a
+    background thread while the caller works, 0 prepares them on
+    demand.
+    :return: Iterator[Batch]
+    """
+    if batch_size < 1:
+        raise ValueError("The batch size must be at least 1")
+    if prefetch < 0:
+        raise ValueError("The prefetch depth cannot be negative")
+    if numpy:
+        # Fail before reading anything if NumPy is missing
+        _numpy()
+
+    def batches() -> Iterator[Batch]:
+        for chunk in partition.iter_chunks(batch_size):
+            with profiling.stage("batch", partition=partition.name):
+                batch = _make_batch(partition.name, chunk, box_format,
+                                    normalized, clip, numpy)
+            yield batch
+
+    if prefetch:
+        return bounded(batches(), prefetch)
+    return batches()
+
+
+async def aiter_batches(partition: DatasetPartition, batch_size: int = 64,
+                        box_format: BoxFormat = BoxFormat.CXCYWH,
+                        normalized: bool = False, clip: bool = False,
+                        numpy: bool = False,
+                        prefetch: int = 2) -> AsyncIterator[Batch]:
+    """
+    Yields the batches of a partition asynchronously, see iter_batches.
+    Batches are read on a background thread, so the event loop is
+    never blocked by reading the dataset.
+    :param partition: The partition.
+    :param batch_size: The maximum number of images per batch.
+    :param box_format: The format of the boxes.
+    :param normalized: Whether the boxes are made relative to the
+    image size.
+    :param clip: Whether the boxes are clipped to their image.
+    :param numpy: Whether the columns are NumPy arrays.
+    :param prefetch: The number of batches prepared ahead.
+    :return: AsyncIterator[Batch]
+    """
+    batches = iter_batches(partition, batch_size, box_format, normalized,
+                           clip, numpy, prefetch)
+    loop = asyncio.get_running_loop()
+    # A single thread takes the batches, so that closing the iterator
+    # waits for a pending read instead of interrupting it
+    executor = ThreadPoolExecutor(1, thread_name_prefix="odc-batches")
+    end = object()
+    try:
+        while True:
+            batch = await loop.run_in_executor(executor, next, batches, end)
+            if batch is end:
+                return
+            yield batch
+    finally:
+        executor.submit(batches.close)
+        executor.shutdown(wait=False)
@@ -1,2 +1,9 @@
-from ODConvert.commands.inspect import inspect
-from ODConvert.commands.convert import convert
+from ODConvert.utils.lazy import lazy_exports
+
+# Commands are imported on first use, so that e.g. inspect does not
+# import the converters
+__all__ = ["inspect", "convert"]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "inspect": "ODConvert.commands.inspect",
+    "convert": "ODConvert.commands.convert",
+})
@@ -6,14 +6,30 @@ from pathlib import Path
 import shutil
 import fire
 import ODConvert.core
+from ODConvert.core import profiling, registry
+from ODConvert.core.cache import PartitionCache
+from ODConvert.core.merge import MergedDatasetHandler, load_datasets
+from ODConvert.core.subset import SubsetDatasetHandler, make_subset
 
-from ODConvert.converters import YOLOConverter
+from ODConvert.converters.labels import LabelFormat
+from ODConvert.utils.files import LinkMode
 
 
-def convert(path: str, to_type: str):
+def convert(path: str, to_type: str, eager: bool = False,
+            cache: bool = True,
+            workers: int | None = None, link_mode: str = "copy",
+            processes: int = 1, resume: bool = False,
+            label_format: str = "files", dedup: bool = False,
+            classes: str | None = None, min_boxes: int = 0,
+            sample: float | None = None, seed: int = 0,
+            remap: str | None = None):
     # Convert the string path to a Path object
-    # at the first instance
-    path: Path = Path(path)
+    # at the first instance. Several datasets to merge are given as
+    # paths separated by commas
+    paths = [Path(str(item)) for item in _parse_list(path)]
+    if not paths:
+        raise fire.core.FireError("No dataset path given")
+    path: Path = paths[0]
 
     # Convert the string to_type to DatasetType
     try:
@@ -25,23 +41,100 @@ def convert(path: str, to_type: str):
             f"Invalid dataset type: {to_type}. Valid types are: "
             f"{', '.join([t.value for t in ODConvert.core.DatasetType])}")
 
-    if not path.is_dir() or not path.exists():
-        # If the path is not a directory, return False
-        raise fire.core.FireError(f"Path {path} is not a valid directory")
+    # Convert the string link_mode to LinkMode
+    try:
+        link_mode: LinkMode = LinkMode(link_mode.lower())
+    except ValueError:
+        # If the link_mode is not a valid LinkMode, raise an error
+        raise fire.core.FireError(
+            f"Invalid link mode: {link_mode}. Valid modes are: "
+            f"{', '.join([m.value for m in LinkMode])}")
+
+    # Convert the string label_format to LabelFormat
+    try:
+        label_format: LabelFormat = LabelFormat(label_format.lower())
+    except ValueError:
+        # If the label_format is not a valid LabelFormat, raise an error
+        raise fire.core.FireError(
+            f"Invalid label format: {label_format}. Valid formats are: "
+            f"{', '.join([f.value for f in LabelFormat])}")
+
+    # Check that the target type has a converter, which is only
+    # imported once the conversion is confirmed
+    supported = registry.converter_types()
+    if to_type not in supported:
+        raise fire.core.FireError(
+            f"Converting to {to_type} is not supported yet. Supported "
+            f"types are: {', '.join(t.value for t in supported)}")
+    # Label formats only apply to YOLO output
+    options = {}
+    if to_type is ODConvert.core.DatasetType.YOLO:
+        options["label_format"] = label_format
+    elif label_format is not LabelFormat.FILES:
+        raise fire.core.FireError(
+            "The label format only applies to YOLO output")
+
+    if workers is not None and workers < 1:
+        raise fire.core.FireError("The number of workers must be at least 1")
+    if processes < 1:
+        raise fire.core.FireError(
+            "The number of processes must be at least 1")
+
+    for source in paths:
+        if not source.is_dir() or not source.exists():
+            # If the path is not a directory, return False
+            raise fire.core.FireError(
+                f"Path {source} is not a valid directory")
 
     # Load dataset
-    dataset = ODConvert.core.autodetect(path)
+    # Annotation files are streamed unless eager loading is requested,
+    # and parsed partitions are reused from the cache unless disabled.
+    # Several datasets are loaded concurrently and merged into one
+    datasets = load_datasets(
+        paths, workers, stream=not eager,
+        cache=PartitionCache() if cache else None)
 
     # Dataset details
     print("[bold]Existing Dataset Details:[/bold]")
-    print(f"Path: {path.absolute()}")
-    print(f"Type: {dataset.get_type().color_encoded_str()}")
+    for source, dataset in zip(paths, datasets):
+        print(f"Path: {source.absolute()}")
+        print(f"Type: {dataset.get_type().color_encoded_str()}")
+    dataset = datasets[0]
+    # The output of merged datasets is named after the first one
+    output_dir = Path(f"{path.absolute()}_{to_type.value.lower()}")
+    if len(datasets) > 1:
+        dataset = MergedDatasetHandler(datasets, workers)
+        output_dir = Path(
+            f"{path.absolute()}_merged_{to_type.value.lower()}")
+        print("Merged classes: " + ", ".join(
+            f"{cls.id} → {cls.name}" for cls in dataset.get_classes()))
+
+    # Select a subset of the dataset, chunk by chunk as it is streamed,
+    # so that excluded images and boxes are never converted
+    subset = None
+    if classes is not None or min_boxes or sample is not None \
+            or remap is not None:
+        try:
+            subset = make_subset(
+                dataset.get_classes(), keep=_parse_list(classes),
+                min_boxes=min_boxes, sample=sample, seed=seed,
+                remap=_parse_remap(remap))
+        except ValueError as e:
+            raise fire.core.FireError(str(e))
+        dataset = SubsetDatasetHandler(dataset, subset)
 
     # Print plan
     print()
     print("[bold]Output Dataset Details:[/bold]")
-    print(f"Path: {path.absolute()}_{to_type.value.lower()}")
+    print(f"Path: {output_dir}")
     print(f"Type: {to_type.color_encoded_str()}")
+    if subset is not None:
+        print("Classes: " + ", ".join(
+            f"{cls.id} → {cls.name}" for cls in subset.classes))
+        if min_boxes:
+            print(f"Minimum boxes per image: {min_boxes}")
+        if sample is not None:
+            print(f"Sample: {sample:.1%} of the images (seed {seed})")
 
     # Ask for confirmation
     print()
@@ -52,28 +145,62 @@ def convert(path: str, to_type: str):
     # Try to create the output directory
     # and throw an error if it already exists
     try:
-        output_dir = Path(f"{path.absolute()}_{to_type.value.lower()}")
-        output_dir.mkdir(exist_ok=False)
+        # Resumed conversions continue in the existing directory
+        output_dir.mkdir(exist_ok=resume)
     except FileExistsError:
         print(
             f":warning: The planned output directory of "
-            f"{path.absolute()}_{to_type.value.lower()} already exists.")
+            f"{output_dir} already exists.")
+        print("Use --resume to only convert what changed since.")
         overide = Confirm.ask(
             "Do you want to override the existing directory?", default=False)
         if overide:
             print(
-                f"Overriding existing directory "
-                f"{path.absolute()}_{to_type.value.lower()}")
+                f"Overriding existing directory {output_dir}")
             # Remove the existing directory
             shutil.rmtree(output_dir)
             output_dir.mkdir()
         else:
-            raise fire.core.Fire(
+            raise fire.core.FireError(
                 f"Output directory {output_dir} already exists. ")
 
     print()  # Spacing
 
-    YOLOConverter(dataset, to_type, output_dir).convert()
+    converter = registry.get_converter(to_type)(
+        dataset, to_type, output_dir,
+        workers=workers, link_mode=link_mode,
+        processes=processes, resume=resume, dedup=dedup,
+        **options)
+    converter.convert()
     print()  # Spacing
     print("[green bold]:white_heavy_check_mark: "
           "Conversion completed successfully![/green bold]")
+    # Report what deduplication saved
+    plan = converter.dedup_plan
+    if plan is not None:
+        print(f"Deduplicated {plan.duplicates} images, saving "
+              f"{profiling.format_bytes(plan.saved_bytes)}")
+
+
+def _parse_list(value) -> list | None:
+    # Fire passes "a,b" as a string but "1,2" as a tuple
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [item.strip() for item in str(value).split(",") if item.strip()]
+
+
+def _parse_remap(value) -> str | dict | None:
+    # Either "compact" or "class=id,class=id"
+    if value is None or isinstance(value, dict) or value == "compact":
+        return value
+    remap = {}
+    for item in _parse_list(value):
+        key, separator, new = str(item).partition("=")
+        if not separator or not new.strip().isdigit():
+            raise fire.core.FireError(
+                f"Invalid class remapping: {item}. Use 'compact' or "
+                "class=id pairs separated by commas")
+        remap[key.strip()] = int(new)
+    return remap
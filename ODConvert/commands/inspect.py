@@ -1,15 +1,23 @@
 from rich import print
 
+from dataclasses import asdict
 from pathlib import Path
 
+import json
+import sys
 import ODConvert.core
+from ODConvert.core.cache import PartitionCache
 
 from rich.columns import Columns
+from rich.table import Table
 
 import fire
 
 
-def inspect(path: str):
+def inspect(path: str, eager: bool = False, cache: bool = True,
+            validate: bool = False, stats: bool = False,
+            report: str | bool | None = None,
+            workers: int | None = None):
     # Convert the string path to a Path object
     # at the first instance
     path: Path = Path(path)
@@ -18,25 +26,156 @@ def inspect(path: str):
         # If the path is not a directory, return False
         raise fire.core.FireError(f"Path {path} is not a valid directory")
 
-    dataset = ODConvert.core.autodetect(path)
+    # Annotation files are streamed unless eager loading is requested,
+    # and parsed partitions are reused from the cache unless disabled.
+    # Validation keeps annotations of unknown classes or images to
+    # report them, instead of failing to load them
+    dataset = ODConvert.core.autodetect(
+        path, stream=not eager, cache=PartitionCache() if cache else None,
+        strict=not validate)
 
     dps = dataset.get_partitions()
 
     classes = dataset.get_classes()
 
+    # Count images and annotations in a single pass per partition
+    counts = {dp.name: dp.counts() for dp in dps}
+    per_class = {cls.id: 0 for cls in classes}
+    for dp_counts in counts.values():
+        for cls_id, count in dp_counts.per_class.items():
+            per_class[cls_id] = per_class.get(cls_id, 0) + count
+
+    # Check and describe the images and boxes of every partition
+    validations = {}
+    partition_stats = {}
+    if validate or stats:
+        # Imported here as plain inspections do not need it
+        from ODConvert.core import validation
+        class_ids = [cls.id for cls in classes]
+        for dp in dps:
+            if validate:
+                validations[dp.name] = validation.validate_partition(
+                    dp, class_ids, workers)
+            if stats:
+                partition_stats[dp.name] = validation.partition_stats(dp)
+    valid = all(result.ok() for result in validations.values())
+
+    # Machine readable report
+    if report is not None:
+        document = {
+            "path": str(path.absolute()),
+            "type": str(dataset.get_type()),
+            "classes": [
+                {"id": cls.id, "name": cls.name,
+                 "annotations": per_class[cls.id]}
+                for cls in classes
+            ],
+            "partitions": {
+                name: {
+                    "images": dp_counts.images,
+                    "annotations": dp_counts.annotations,
+                    **({"validation": {
+                        **asdict(validations[name]),
+                        "ok": validations[name].ok()
+                    }} if name in validations else {}),
+                    **({"stats": asdict(partition_stats[name])}
+                       if name in partition_stats else {}),
+                }
+                for name, dp_counts in counts.items()
+            },
+        }
+        if validate:
+            document["valid"] = valid
+        text = json.dumps(document, indent=2) + "\n"
+        # Without a file name the report is written to stdout instead
+        # of the summary
+        if report is True:
+            sys.stdout.write(text)
+            _exit(validate, valid)
+            return
+        Path(report).write_text(text)
+
     # Dataset details
     print(f"Path: {path.absolute()}")
     print(f"Type: {dataset.get_type().color_encoded_str()}")
     # Classes
     print()
     print(f"[bold]Detected {len(classes)} classes:[/bold]")
-    print(Columns([f"{cls.id:2} → {cls.name}" for cls in classes]))
+    print(Columns([
+        f"{cls.id:2} → {cls.name} ({per_class[cls.id]})" for cls in classes
+    ]))
     # Partitions
     print()
     print(f"[bold]Detected {len(dps)} partitions:[/bold]")
     print(Columns(
         [
-            f"[magenta]{dp.name}[/magenta] → {dp.stats()[0]}"
-            f"images and {dp.stats()[1]} annotations" for dp in dps
+            f"[magenta]{name}[/magenta] → {dp_counts.images} "
+            f"images and {dp_counts.annotations} annotations"
+            for name, dp_counts in counts.items()
         ],
     ))
+    for name, result in validations.items():
+        print()
+        _print_validation(name, result)
+    for name, result in partition_stats.items():
+        print()
+        _print_stats(name, result, {cls.id: cls.name for cls in classes})
+    if report is not None:
+        print()
+        print(f"Report written to {report}")
+    _exit(validate, valid)
+
+
+def _exit(validate: bool, valid: bool):
+    # Failed validations exit with an error, e.g. to stop a pipeline
+    # before a long conversion
+    if validate and not valid:
+        raise fire.core.FireExit(1, "The dataset failed validation.")
+
+
+def _print_validation(name: str, result):
+    table = Table(title=f"Validation of {name}", title_justify="left")
+    table.add_column("Check", no_wrap=True)
+    table.add_column("Count", justify="right")
+    table.add_column("Examples")
+    for check, findings in (
+            ("Missing images", result.missing_images),
+            ("Orphan annotations", result.orphan_annotations),
+            ("Unknown classes", result.unknown_classes),
+            ("Zero area boxes", result.zero_area_boxes),
+            ("Out of bounds boxes", result.out_of_bounds_boxes)):
+        count = f"[red]{findings.count}[/red]" if findings.count \
+            else "[green]0[/green]"
+        table.add_row(check, count, ", ".join(
+            str(example) for example in findings.examples[:3]))
+    if result.unknown_image_sizes:
+        table.add_row("Images of unknown size",
+                      f"[yellow]{result.unknown_image_sizes}[/yellow]",
+                      "bounds not checked")
+    print(table)
+
+
+def _print_stats(name: str, result, names):
+    table = Table(title=f"Boxes of {name}", title_justify="left")
+    table.add_column("Class", no_wrap=True)
+    table.add_column("Boxes", justify="right")
+    for area in ("Small", "Medium", "Large"):
+        table.add_column(area, justify="right")
+    for class_id, count in result.per_class.items():
+        areas = result.box_areas.get(class_id, {})
+        table.add_row(
+            f"{class_id} {names.get(class_id, '?')}", str(count),
+            *(str(areas.get(area, 0))
+              for area in ("small", "medium", "large")))
+    print(table)
+    # Histogram of the box sizes
+    largest = max(result.box_sizes.values(), default=0) or 1
+    histogram = Table(title="Box sizes (square root of the area, px)",
+                      title_justify="left", show_header=False, box=None)
+    for label, count in result.box_sizes.items():
+        histogram.add_row(label, str(count),
+                          "█" * round(40 * count / largest))
+    print(histogram)
+    print(f"{result.images_without_annotations} images without "
+          f"annotations, at most {result.max_boxes_per_image} boxes "
+          "per image")
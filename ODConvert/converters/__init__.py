@@ -1 +1,12 @@
-from ODConvert.converters.yolo import YOLOConverter
+from ODConvert.utils.lazy import lazy_exports
+
+# Converters are imported on first use, so that converting to one type
+# does not import the others
+__all__ = ["YOLOConverter", "VOCConverter", "COCOConverter",
+           "ODCConverter"]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "YOLOConverter": "ODConvert.converters.yolo",
+    "VOCConverter": "ODConvert.converters.voc",
+    "COCOConverter": "ODConvert.converters.coco",
+    "ODCConverter": "ODConvert.converters.odc",
+})
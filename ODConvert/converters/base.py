@@ -1,24 +1,127 @@
+import os
+import shutil
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from multiprocessing import Manager
+from queue import Empty
 from ODConvert.core import DatasetHandler, DatasetType, DatasetPartition
-from typing import final
+from ODConvert.core import DatasetImage, profiling
+from ODConvert.core.dedup import DedupPlan, default_hash_cache, plan_dedup
+from ODConvert.core.stream import RecordChunk, bounded
+from ODConvert.utils.files import LinkMode, transfer_file
+from ODConvert.converters.manifest import Manifest
+from typing import Callable, ContextManager, Iterator, List, Sequence, Tuple
+from typing import TypeVar, final
+from itertools import chain
 from pathlib import Path
+from threading import get_ident
 from rich import print
+from rich.progress import Progress
+
+T = TypeVar("T")
+
+
+def _load_partition(partition: DatasetPartition,
+                    profile: dict | None = None) -> Tuple[int, dict | None]:
+    """
+    Loads a partition in a worker process, which stores it in the
+    partition cache (if any) for the conversion workers to reuse.
+    :param partition: The partition to load.
+    :param profile: The profiling options of the parent, if any.
+    :return: Tuple of the number of images in the partition and the
+    profiling data of the worker
+    """
+    if profile is not None:
+        profiling.start(**profile)
+    partition.get_annotations()
+    return len(partition.get_images()), profiling.export()
+
+
+def _convert_shard(converter: "DatasetConverter",
+                   partition: DatasetPartition,
+                   shard: range,
+                   queue,
+                   profile: dict | None = None) -> dict | None:
+    """
+    Converts a shard of a partition in a worker process, reporting
+    progress back to the parent through the queue.
+    :param converter: The converter, without its dataset.
+    :param partition: The partition the shard belongs to.
+    :param shard: The range of image positions to convert.
+    :param queue: Receives (partition name, completed count) tuples.
+    :param profile: The profiling options of the parent, if any.
+    :return: dict | None, the profiling data of the worker
+    """
+    if profile is not None:
+        profiling.start(**profile)
+    converter.progress = lambda done: queue.put((partition.name, done))
+    with profiling.stage("convert_partition", partition=partition.name,
+                         shard=shard.start):
+        converter.convert_partition(partition, shard)
+    return profiling.export()
 
 
 class DatasetConverter(ABC):
 
-    def __init__(self, dataset: DatasetHandler, to: DatasetType, path: Path):
+    # Number of items handed to a worker at a time
+    batch_size = 64
+    # Number of shards per process the images are split into when
+    # converting with multiple processes
+    shards_per_process = 2
+    # Number of images per chunk partitions are streamed in, and the
+    # number of chunks read ahead of the conversion
+    chunk_size = 1024
+    queue_depth = 4
+    # Description of the progress bar of a partition
+    description = "[white]Converting images[/white]"
+
+    def __init__(self, dataset: DatasetHandler, to: DatasetType, path: Path,
+                 workers: int | None = None,
+                 link_mode: LinkMode = LinkMode.COPY,
+                 processes: int = 1,
+                 resume: bool = False,
+                 dedup: bool = False):
         """
         Initialize the DatasetConverter.
         :param dataset: The dataset to convert.
         :param to: The target dataset type.
+        :param path: The output directory.
+        :param workers: The number of I/O worker threads, defaults to
+        the ThreadPoolExecutor default.
+        :param link_mode: How images are placed in the output.
+        :param processes: The number of worker processes partitions
+        are loaded and converted on.
+        :param resume: Skip images that a previous conversion into the
+        same output directory already completed, see Manifest.
+        :param dedup: Store images with identical contents only once,
+        see transfer.
         """
         self.dataset = dataset
         self.to = to
         self.path = path
+        self.workers = workers
+        self.link_mode = link_mode
+        self.processes = processes
+        self.resume = resume
+        self.dedup = dedup
+        # The duplicate images of the dataset, once they are found
+        self.dedup_plan: DedupPlan | None = None
+        # Receives the number of completed items instead of the
+        # progress bar when running inside a worker process
+        self.progress: Callable[[int], None] | None = None
         # Call the setup method to perform any necessary setup
         self.setup()
 
+    def __getstate__(self):
+        # Worker processes get the converter settings only, the
+        # dataset stays in the parent process
+        state = self.__dict__.copy()
+        state["dataset"] = None
+        state["progress"] = None
+        return state
+
     @abstractmethod
     def setup(self):
         pass
@@ -40,17 +143,334 @@ class DatasetConverter(ABC):
 
     @final
     def convert(self):
+        with profiling.stage("convert"):
+            self.prepare()
+            # Symbolic links reference the sources without copying them,
+            # so there is nothing to deduplicate
+            if self.dedup and self.link_mode is not LinkMode.SYMLINK:
+                with profiling.stage("dedup"):
+                    self.dedup_plan = self.__plan_dedup()
+            if self.processes > 1:
+                self.__convert_parallel()
+            else:
+                self.__convert_serial()
+            with profiling.stage("convert.finish"):
+                self.finish()
+                shutil.rmtree(self.__objects_path(), ignore_errors=True)
+
+    def prepare(self):
+        """
+        Prepares the output before any partition is converted, in the
+        parent process. Converters whose partitions (shards) produce
+        parts of a shared file remove the parts of earlier runs here.
+        """
+        pass
+
+    def finish(self):
+        """
+        Completes the output once all partitions are converted, in the
+        parent process. Converters whose partitions (shards) produce
+        parts of a shared file join them here.
+        """
+        pass
+
+    def __plan_dedup(self) -> DedupPlan:
+        """
+        Finds the images of all partitions with identical contents.
+        :return: DedupPlan
+        """
+        print("[bold]Finding duplicate images[/bold]")
+        cache = default_hash_cache()
+        try:
+            return plan_dedup(
+                chain.from_iterable(
+                    (image.path for image in partition.get_images().values())
+                    for partition in self.dataset.get_partitions()),
+                workers=self.workers, cache=cache)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def __objects_path(self) -> Path:
+        # Holds one file per duplicated content while converting
+        return self.path / ".odconvert" / "objects"
+
+    @final
+    def transfer(self, src: Path, dst: Path):
+        """
+        Places an image in the output, see transfer_file. When
+        deduplicating, the contents of images that occur more than once
+        are placed in the output only once, in an object store shared
+        by all workers, and every such image is a hard link of it.
+        :param src: The source image.
+        :param dst: The destination path.
+        """
+        key = self.dedup_plan.key(src) if self.dedup_plan else None
+        if key is None:
+            transfer_file(src, dst, self.link_mode)
+            return
+        stored = self.__objects_path() / key
+        try:
+            if not stored.exists():
+                # Workers place the contents under their own name first,
+                # whichever links it into the store first wins
+                stored.parent.mkdir(parents=True, exist_ok=True)
+                own = stored.with_name(f"{key}.{os.getpid()}.{get_ident()}")
+                transfer_file(src, own, self.link_mode)
+                try:
+                    os.link(own, stored)
+                except FileExistsError:
+                    pass
+                finally:
+                    own.unlink()
+            # Links cannot replace an existing file
+            dst.unlink(missing_ok=True)
+            os.link(stored, dst)
+        except OSError:
+            # The filesystem does not support hard links
+            transfer_file(src, dst, self.link_mode)
+
+    def __convert_serial(self):
         for partition in self.dataset.get_partitions():
             # Print the partition details
             print(
                 "[bold]Converting "
                 f"[dodger_blue1]{partition.name}[/dodger_blue1] "
-                f"partition into {DatasetType.YOLO.color_encoded_str()} "
+                f"partition into {self.to.color_encoded_str()} "
                 "format "
                 "[/bold]")
             # Convert each partition
-            self.convert_partition(partition)
+            with profiling.stage("convert_partition",
+                                 partition=partition.name):
+                self.convert_partition(partition)
+
+    def __convert_parallel(self):
+        """
+        Loads all partitions concurrently on a process pool, then
+        splits them into image range shards and converts the shards
+        concurrently, so that the conversion time is bound by the
+        largest shard rather than the sum of all partitions.
+        """
+        partitions = list(self.dataset.get_partitions())
+        # Resolve the dataset wide classes once, so that the partitions
+        # take them along to the workers instead of every worker
+        # resolving them on its own
+        self.dataset.get_classes()
+        print(
+            f"[bold]Loading {len(partitions)} partitions on "
+            f"{self.processes} processes[/bold]")
+        profile = profiling.options()
+        with ProcessPoolExecutor(self.processes) as pool:
+            sizes = []
+            for size, exported in pool.map(
+                    _load_partition, partitions,
+                    [profile] * len(partitions)):
+                sizes.append(size)
+                profiling.merge(exported)
+
+        # Split the images into shards of (at most) equal size
+        total = sum(sizes)
+        shard_size = max(
+            1, -(-total // (self.processes * self.shards_per_process)))
+        shards = [
+            (partition, range(start, min(start + shard_size, size)))
+            for partition, size in zip(partitions, sizes)
+            for start in range(0, size, shard_size)
+        ]
+        print(
+            "[bold]Converting "
+            + ", ".join(
+                f"[dodger_blue1]{partition.name}[/dodger_blue1]"
+                for partition in partitions)
+            + f" partitions into {self.to.color_encoded_str()} format "
+            f"({len(shards)} shards)[/bold]")
+
+        failures: List[Tuple[str, BaseException]] = []
+        with Manager() as manager, Progress() as progress, \
+                ProcessPoolExecutor(self.processes) as pool:
+            queue = manager.Queue()
+            tasks = {
+                partition.name: progress.add_task(
+                    f"[white]{partition.name}[/white]", total=size)
+                for partition, size in zip(partitions, sizes)
+            }
+
+            def drain():
+                # Apply all progress reported by the workers so far
+                while True:
+                    try:
+                        name, done = queue.get_nowait()
+                    except Empty:
+                        return
+                    progress.advance(tasks[name], done)
+
+            pending = {
+                pool.submit(_convert_shard, self, partition, shard, queue,
+                            profile): (partition, shard)
+                for partition, shard in shards
+            }
+            while pending:
+                done, _ = wait(pending, timeout=0.1,
+                               return_when=FIRST_COMPLETED)
+                drain()
+                for future in done:
+                    partition, shard = pending.pop(future)
+                    if future.exception() is not None:
+                        failures.append((
+                            f"{partition.name}[{shard.start}:{shard.stop}]",
+                            future.exception()))
+                    else:
+                        profiling.merge(future.result())
+            drain()
+
+        if failures:
+            # Show the failed shards and abort the conversion
+            for shard, error in failures:
+                print(f"[red]:x: {shard}: {error}[/red]")
+            raise RuntimeError(
+                f"{len(failures)} of {len(shards)} shards failed to convert.")
+
+    @final
+    def convert_partition(self, partition: DatasetPartition,
+                          shard: range | None = None):
+        """
+        Converts a partition, or only a shard of it. Whole partitions
+        are streamed chunk by chunk: a producer thread reads the next
+        chunks while the current one is written, at most queue_depth
+        chunks ahead, so that memory use does not grow with the size
+        of the partition. Shards are converted from the loaded
+        partition in one chunk.
+        :param partition: The partition to convert.
+        :param shard: The range of image positions (in image ID order)
+        to convert, see shard_images. None converts all images.
+        """
+        if shard is None:
+            chunks = bounded(partition.iter_chunks(self.chunk_size),
+                             self.queue_depth)
+            total = None
+        else:
+            images = self.shard_images(partition, shard)
+            chunks = iter([RecordChunk(
+                images=images, annotations=partition.get_annotations(),
+                index=partition.get_index())])
+            total = len(images)
+        with self.open_partition(partition, shard) as convert_chunk, \
+                self.__progress_bar(self.description, total) as advance:
+            # Stop the producer thread if the conversion fails
+            with _closing(chunks):
+                for chunk in chunks:
+                    convert_chunk(chunk, advance)
 
     @abstractmethod
-    def convert_partition(self, partition: DatasetPartition):
+    def open_partition(self, partition: DatasetPartition,
+                       shard: range | None = None
+                       ) -> ContextManager[Callable[
+                           [RecordChunk, Callable[[int], None]], None]]:
+        """
+        Prepares the output of a partition (shard), yielding the
+        function that converts a chunk of it and reports the number of
+        converted images. The output is finished once all chunks have
+        been converted and the context exits.
+        :param partition: The partition to convert.
+        :param shard: The shard to convert, or None for all images.
+        :return: ContextManager of the chunk conversion function
+        """
         pass
+
+    @final
+    def shard_images(self, partition: DatasetPartition,
+                     shard: range | None = None) -> List[DatasetImage]:
+        """
+        Returns the images of a partition that belong to a shard.
+        :param partition: The partition.
+        :param shard: The range of image positions in image ID order,
+        or None for all images.
+        :return: List[DatasetImage]
+        """
+        images = partition.get_images()
+        if shard is None:
+            return list(images.values())
+        return [images[id] for id in sorted(images)[shard.start:shard.stop]]
+
+    @final
+    def open_manifest(self, partition: DatasetPartition,
+                      shard: range | None = None) -> Manifest:
+        """
+        Opens the manifest that records the converted images of a
+        partition (shard) in the output directory.
+        :param partition: The partition being converted.
+        :param shard: The shard being converted, if any.
+        :return: Manifest
+        """
+        return Manifest(
+            self.path / ".odconvert" / "manifest" / partition.name,
+            shard=shard.start if shard is not None else 0,
+            resume=self.resume
+        )
+
+    @contextmanager
+    def __progress_bar(self, description: str, total: int | None
+                       ) -> Iterator[Callable[[int], None]]:
+        """
+        Shows a progress bar, or forwards progress to the parent
+        process when running inside a worker.
+        :param description: The progress bar description.
+        :param total: The total number of items, None if unknown.
+        :return: Iterator[Callable[[int], None]] advancing the bar
+        """
+        if self.progress is not None:
+            yield self.progress
+            return
+        with Progress() as progress:
+            task = progress.add_task(description, total=total)
+            yield lambda done: progress.advance(task, done)
+
+    @final
+    def run_parallel(self, items: Sequence[T], func: Callable[[T], None],
+                     advance: Callable[[int], None]):
+        """
+        Runs func for every item on a pool of I/O worker threads,
+        reporting the progress. Failures do not stop the other items,
+        they are reported together once all items have been processed.
+        :param items: The items to process.
+        :param func: The function to call for each item.
+        :param advance: Receives the number of processed items.
+        """
+
+        def run_batch(batch: Sequence[T]) -> Tuple[int, List]:
+            failures = []
+            for item in batch:
+                try:
+                    func(item)
+                except Exception as e:
+                    failures.append((item, e))
+            return len(batch), failures
+
+        failures: List[Tuple[T, Exception]] = []
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [
+                pool.submit(run_batch, items[i:i + self.batch_size])
+                for i in range(0, len(items), self.batch_size)
+            ]
+            for future in as_completed(futures):
+                done, batch_failures = future.result()
+                failures.extend(batch_failures)
+                advance(done)
+
+        if failures:
+            # Show the first few failures and abort the conversion
+            for item, error in failures[:10]:
+                print(f"[red]:x: {item}: {error}[/red]")
+            raise RuntimeError(
+                f"{len(failures)} of {len(items)} items failed to convert.")
+
+
+@contextmanager
+def _closing(items: Iterator) -> Iterator[None]:
+    # Like contextlib.closing, for iterators that may not be generators
+    try:
+        yield
+    finally:
+        close = getattr(items, "close", None)
+        if close is not None:
+            close()
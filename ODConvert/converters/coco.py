@@ -0,0 +1,198 @@
+import json
+import shutil
+from array import array
+from contextlib import contextmanager
+from typing import Dict, List
+
+from ODConvert.core import BoxFormat, DatasetImage, DatasetType
+from ODConvert.core import convert_boxes, image_sizes, profiling
+from ODConvert.core.imagesize import fill_image_sizes
+from ODConvert.core.stream import RecordChunk
+
+from ODConvert.converters.base import DatasetConverter
+from ODConvert.converters.manifest import label_digest
+
+
+# Entries of the images and annotations arrays, filled in with the %
+# operator, which formats numbers faster than json.dumps
+IMAGE_TEMPLATE = '{"id":%d,"file_name":%s,"width":%d,"height":%d}'
+ANNOTATION_TEMPLATE = (
+    '{"id":%d,"image_id":%d,"category_id":%d,'
+    '"bbox":[%.2f,%.2f,%.2f,%.2f],"area":%.2f,"iscrowd":%d}')
+
+
+class COCOConverter(DatasetConverter):
+
+    description = "[white]Copying images and writing annotations[/white]"
+    # Size of the text buffered before it is written to the parts
+    buffer_size = 1 << 20
+
+    def setup(self):
+        # Create the annotations and images paths
+        self.annotations_path = self.path.joinpath("annotations")
+        self.images_path = self.path.joinpath("images")
+        # Partitions (shards) write their images and annotations to
+        # part files first, which finish joins into the COCO files
+        self.parts_path = self.path.joinpath(".odconvert", "coco")
+        # COCO tools treat annotation ID 0 as unmatched, so sources
+        # that number their annotations from 0 are shifted by one
+        self.id_offset = 0 if self.dataset.get_type() is DatasetType.COCO \
+            else 1
+
+    def additional_checks(self):
+        return True
+
+    def prepare(self):
+        # Parts of an interrupted run may stem from a different shard
+        # layout, so only the parts written by this run are joined
+        shutil.rmtree(self.parts_path, ignore_errors=True)
+
+    @contextmanager
+    def open_partition(self, partition, shard=None):
+        # Create the directories for the partition
+        partition_images_path = self.images_path.joinpath(partition.name)
+        partition_images_path.mkdir(parents=True, exist_ok=True)
+        parts_path = self.parts_path.joinpath(partition.name)
+        parts_path.mkdir(parents=True, exist_ok=True)
+        part = f"{shard.start if shard is not None else 0:012d}"
+
+        def convert_chunk(chunk: RecordChunk, advance):
+            # Get the images of the chunk and their annotation rows
+            images = chunk.images
+            table = chunk.annotations
+            index = chunk.index
+            rows = array("q")
+            for image in images:
+                rows.extend(index.rows(image.id))
+
+            with profiling.stage("convert.boxes", partition=partition.name):
+                # Every image entry holds the size of its image, read it
+                # from the image header where it is not known yet
+                fill_image_sizes(index.images, (image.id for image in images))
+
+                # Convert the boxes to top left corners and sizes in one
+                # batch, clipping them to the image and dropping
+                # degenerate ones
+                widths, heights = image_sizes(
+                    (table.image_ids[row] for row in rows), index.images)
+                (x_min, y_min, width, height), keep = convert_boxes(
+                    tuple(
+                        array("d", (column[row] for row in rows))
+                        for column in (table.x_center, table.y_center,
+                                       table.width, table.height)
+                    ),
+                    BoxFormat.CXCYWH, BoxFormat.XYWH,
+                    widths=widths, heights=heights, clip=True, min_size=0.0)
+
+                # Format the entries of the chunk in image order
+                image_entries: List[str] = []
+                digests: Dict[int, str] = {}
+                for image in images:
+                    sized = index.images[image.id]
+                    file_name = f"{partition.name}/{image.id}" \
+                                f"{image.path.suffix}"
+                    entry = IMAGE_TEMPLATE % (
+                        image.id, json.dumps(file_name),
+                        sized.width or 0, sized.height or 0)
+                    image_entries.append(entry)
+                    digests[image.id] = entry
+                annotation_entries: List[str] = []
+                for position, row in enumerate(keep):
+                    row = rows[row]
+                    w, h = width[position], height[position]
+                    entry = ANNOTATION_TEMPLATE % (
+                        table.ids[row] + self.id_offset,
+                        table.image_ids[row], table.class_ids[row],
+                        x_min[position], y_min[position], w, h, w * h,
+                        table.iscrowd[row])
+                    annotation_entries.append(entry)
+                    digests[table.image_ids[row]] += entry
+                write_entries(images_part, image_entries)
+                write_entries(annotations_part, annotation_entries)
+
+            def convert_image(image: DatasetImage):
+                new_file_path = partition_images_path.joinpath(
+                    f"{image.id}{image.path.suffix}")
+                digest = label_digest(digests[image.id])
+                outputs = (new_file_path,)
+                # Skip images that are already converted and unchanged
+                if manifest.is_current(image.id, image.path, outputs, digest):
+                    return
+                # Copy or link the image to the new file path
+                self.transfer(image.path, new_file_path)
+                manifest.record(image.id, image.path, outputs, digest)
+
+            # Copy images on the worker pool
+            with profiling.stage("convert.files", partition=partition.name):
+                self.run_parallel(images, convert_image, advance)
+
+        # Entries are written separated by commas, so that the parts can
+        # be joined into JSON arrays as they are
+        written = {"images": 0, "annotations": 0}
+
+        def write_entries(part, entries: List[str]):
+            if not entries:
+                return
+            name = "images" if part is images_part else "annotations"
+            text = ",".join(entries)
+            if written[name]:
+                text = "," + text
+            written[name] += len(entries)
+            part.write(text)
+            profiling.add_io(written=len(text))
+
+        with open(parts_path.joinpath(f"{part}.images"), "w",
+                  buffering=self.buffer_size) as images_part, \
+                open(parts_path.joinpath(f"{part}.annotations"), "w",
+                     buffering=self.buffer_size) as annotations_part, \
+                self.open_manifest(partition, shard) as manifest:
+            yield convert_chunk
+
+    def finish(self):
+        """
+        Joins the parts of every partition into its COCO annotation
+        file, copying the parts instead of loading them.
+        """
+        self.annotations_path.mkdir(parents=True, exist_ok=True)
+        categories = ",".join(
+            json.dumps({
+                "id": cls.id,
+                "name": cls.name,
+                "supercategory": cls.parent.name
+                if cls.parent is not None else "none",
+            })
+            for cls in sorted(self.dataset.get_classes(),
+                              key=lambda cls: cls.id))
+        for partition in self.dataset.get_partitions():
+            parts_path = self.parts_path.joinpath(partition.name)
+            if not parts_path.is_dir():
+                continue
+            output = self.annotations_path.joinpath(
+                f"instances_{partition.name}.json")
+            with open(output, "w", buffering=self.buffer_size) as f:
+                f.write('{"categories":[' + categories + "]")
+                for key in ("images", "annotations"):
+                    f.write(f',"{key}":[')
+                    self.__join_parts(
+                        f, sorted(parts_path.glob(f"*.{key}")))
+                    f.write("]")
+                f.write("}\n")
+            profiling.add_io(written=output.stat().st_size, files=1)
+            shutil.rmtree(parts_path)
+        shutil.rmtree(self.parts_path, ignore_errors=True)
+
+    @staticmethod
+    def __join_parts(f, parts):
+        # Parts of later shards continue the array of earlier ones
+        first = True
+        for part in parts:
+            with open(part, "r") as source:
+                # Peek at the first character to skip empty parts
+                head = source.read(1)
+                if not head:
+                    continue
+                if not first:
+                    f.write(",")
+                first = False
+                f.write(head)
+                shutil.copyfileobj(source, f)
@@ -0,0 +1,142 @@
+import os
+from array import array
+from enum import Enum
+from pathlib import Path
+from threading import Lock
+from typing import List
+
+from ODConvert.core import profiling
+
+
+class LabelFormat(Enum):
+    # One label file per image
+    FILES = "files"
+    # One text file of labels per partition
+    TEXT = "text"
+    # One Parquet table of labels per partition
+    PARQUET = "parquet"
+
+    def __str__(self):
+        return self.value
+
+
+def write_file(path: Path, data: bytes):
+    """
+    Writes a whole file with a single open, write and close, without
+    any Python level buffering.
+    :param path: The file to (over)write.
+    :param data: The contents of the file.
+    """
+    profiling.add_io(written=len(data), files=1)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+class LabelShardWriter:
+    """
+    Collects the labels of a partition (or shard of it) from worker
+    threads and writes them to a single file instead of one file per
+    image. Text shards hold one "image_id class_id x_center y_center
+    width height" line per box and are flushed in large blocks, Parquet
+    shards are written as one table when the writer is closed.
+    """
+
+    # Size of the text buffered before it is written out
+    flush_bytes = 4 << 20
+
+    def __init__(self, path: Path, format: LabelFormat):
+        """
+        Initialize the LabelShardWriter.
+        :param path: The shard file, without suffix.
+        :param format: LabelFormat.TEXT or LabelFormat.PARQUET.
+        """
+        self.format = format
+        self.__lock = Lock()
+        if format is LabelFormat.PARQUET:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError(
+                    "Parquet label output requires pyarrow, install it "
+                    "with: pip install odconvert[parquet]")
+            self.path = path.with_name(f"{path.name}.parquet")
+            self.__columns = {
+                "image_id": array("q"),
+                "class_id": array("q"),
+                "x_center": array("d"),
+                "y_center": array("d"),
+                "width": array("d"),
+                "height": array("d"),
+            }
+        else:
+            self.path = path.with_name(f"{path.name}.txt")
+            self.__file = open(self.path, "wb")
+            self.__buffer: List[bytes] = []
+            self.__buffered = 0
+
+    def add(self, image_id: int, class_ids: List[int],
+            boxes: List[tuple]):
+        """
+        Adds the labels of one image. Safe to call from worker threads.
+        :param image_id: The ID of the image.
+        :param class_ids: The class ID of every box.
+        :param boxes: The normalized (x_center, y_center, width,
+        height) of every box.
+        """
+        if self.format is LabelFormat.PARQUET:
+            with self.__lock:
+                columns = self.__columns
+                for class_id, (x, y, w, h) in zip(class_ids, boxes):
+                    columns["image_id"].append(image_id)
+                    columns["class_id"].append(class_id)
+                    columns["x_center"].append(x)
+                    columns["y_center"].append(y)
+                    columns["width"].append(w)
+                    columns["height"].append(h)
+            return
+        # Format all boxes of the image outside of the lock
+        data = "".join(
+            f"{image_id} {class_id} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n"
+            for class_id, (x, y, w, h) in zip(class_ids, boxes)
+        ).encode()
+        with self.__lock:
+            self.__buffer.append(data)
+            self.__buffered += len(data)
+            if self.__buffered >= self.flush_bytes:
+                self.__flush()
+
+    def __flush(self):
+        profiling.add_io(written=self.__buffered)
+        self.__file.write(b"".join(self.__buffer))
+        self.__buffer.clear()
+        self.__buffered = 0
+
+    def close(self):
+        """
+        Writes out all remaining labels and closes the shard file.
+        """
+        with self.__lock:
+            if self.format is LabelFormat.PARQUET:
+                import pyarrow
+                import pyarrow.parquet
+                pyarrow.parquet.write_table(
+                    pyarrow.table({
+                        name: pyarrow.array(column)
+                        for name, column in self.__columns.items()
+                    }),
+                    self.path
+                )
+                return
+            self.__flush()
+            self.__file.close()
+
+    def __enter__(self) -> "LabelShardWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
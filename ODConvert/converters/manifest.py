@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Sequence
+
+
+def label_digest(label: str | bytes) -> str:
+    """
+    Returns a short digest of the label data written for an image.
+    :param label: The label data.
+    :return: str
+    """
+    if isinstance(label, str):
+        label = label.encode()
+    return hashlib.blake2b(label, digest_size=16).hexdigest()
+
+
+def _signature(path: Path) -> List[int] | None:
+    """
+    Returns the size and modification time of a file (or link), or
+    None if it does not exist.
+    :param path: The file.
+    :return: List[int] | None
+    """
+    try:
+        stat = os.lstat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class Manifest:
+    """
+    Records the images of a partition that have been converted, so that
+    an interrupted or repeated conversion only redoes images whose
+    source, outputs or labels changed. Each entry stores the source
+    size and mtime, the size and mtime of every output file and a
+    digest of the label data. Entries are appended to a JSON lines
+    file per partition shard, which survives crashes up to the last
+    flushed batch.
+    """
+
+    # Number of records buffered before they are flushed to disk
+    flush_every = 256
+
+    def __init__(self, directory: Path, shard: int = 0,
+                 resume: bool = False):
+        """
+        Initialize the Manifest of a partition.
+        :param directory: The manifest directory of the partition.
+        :param shard: The first image position of the shard written by
+        this manifest, which names its file.
+        :param resume: Load the entries of previous runs.
+        """
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.entries: Dict[int, dict] = {}
+        if resume:
+            self.__load()
+        self.__file = open(directory / f"{shard}.jsonl", "a")
+        self.__lock = Lock()
+        self.__buffered = 0
+
+    def __load(self):
+        """
+        Loads the entries of all shards, later files taking precedence.
+        """
+        files = sorted(self.directory.glob("*.jsonl"),
+                       key=lambda file: file.stat().st_mtime_ns)
+        for file in files:
+            with open(file) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A crash may leave a partially written line
+                        continue
+                    self.entries[entry["id"]] = entry
+
+    def is_current(self, image_id: int, source: Path,
+                   outputs: Sequence[Path], labels: str) -> bool:
+        """
+        Checks whether an image was converted before from the same
+        source, its outputs are unchanged and its labels are the same.
+        :param image_id: The ID of the image.
+        :param source: The source image file.
+        :param outputs: The output files of the image.
+        :param labels: The digest of the label data, see label_digest.
+        :return: bool
+        """
+        entry = self.entries.get(image_id)
+        if entry is None or entry["labels"] != labels:
+            return False
+        if entry["source"] != _signature(source):
+            return False
+        return entry["outputs"] == [_signature(out) for out in outputs]
+
+    def record(self, image_id: int, source: Path,
+               outputs: Sequence[Path], labels: str):
+        """
+        Records a converted image. Safe to call from worker threads.
+        :param image_id: The ID of the image.
+        :param source: The source image file.
+        :param outputs: The output files of the image.
+        :param labels: The digest of the label data, see label_digest.
+        """
+        line = json.dumps({
+            "id": image_id,
+            "source": _signature(source),
+            "outputs": [_signature(out) for out in outputs],
+            "labels": labels,
+        })
+        with self.__lock:
+            self.__file.write(line + "\n")
+            self.__buffered += 1
+            if self.__buffered >= self.flush_every:
+                self.__file.flush()
+                self.__buffered = 0
+
+    def close(self):
+        """
+        Flushes and closes the manifest file.
+        """
+        with self.__lock:
+            self.__file.close()
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,155 @@
+import os
+import shutil
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+
+from ODConvert.core import profiling
+from ODConvert.core.imagesize import fill_image_sizes
+from ODConvert.core.odc import BOX_COLUMNS, COLUMNS, column_file
+from ODConvert.core.odc import write_manifest, write_strings
+from ODConvert.core.stream import RecordChunk
+
+from ODConvert.converters.base import DatasetConverter
+
+# Columns holding end offsets, which are rebased when parts are joined
+OFFSET_COLUMNS = (column_file("images.rows", "q"),
+                  column_file("images.path", "q"))
+
+
+class ODCConverter(DatasetConverter):
+
+    description = "[white]Writing columns[/white]"
+    # Size of the blocks copied when the parts are joined
+    buffer_size = 1 << 20
+
+    def setup(self):
+        # Partitions (shards) write their columns to part directories
+        # first, which finish joins into the partition directories
+        self.parts_path = self.path.joinpath(".odconvert", "odc")
+
+    def additional_checks(self):
+        return True
+
+    def prepare(self):
+        # Parts of an earlier run may stem from a different shard
+        # layout, so only the parts written by this run are joined
+        shutil.rmtree(self.parts_path, ignore_errors=True)
+
+    @contextmanager
+    def open_partition(self, partition, shard=None):
+        # Images are referenced by their absolute path instead of being
+        # copied, so the part holds the annotations only. Parts are
+        # appended to, and prepare removed those of earlier runs
+        part_path = self.parts_path.joinpath(
+            partition.name, f"{shard.start if shard is not None else 0:012d}")
+        part_path.mkdir(parents=True)
+        # Rows and string table bytes written to the part so far
+        written = {"rows": 0, "paths": 0}
+
+        def append(name: str, values: array):
+            with open(part_path / column_file(name, values.typecode),
+                      "ab") as f:
+                values.tofile(f)
+            profiling.add_io(written=len(values) * values.itemsize)
+
+        def convert_chunk(chunk: RecordChunk, advance):
+            table = chunk.annotations
+            index = chunk.index
+            images = sorted(chunk.images, key=lambda image: image.id)
+
+            with profiling.stage("convert.columns", partition=partition.name):
+                # Store the image sizes, so that reading the dataset back
+                # never needs to probe the images
+                fill_image_sizes(index.images, (image.id for image in images))
+                sized = [index.images[image.id] for image in images]
+
+                # Gather the rows of the chunk grouped by image, and the
+                # end row of every image
+                rows = array("q")
+                ends = array("q")
+                for image in sized:
+                    rows.extend(index.rows(image.id))
+                    ends.append(written["rows"] + len(rows))
+                written["rows"] += len(rows)
+
+                append("images.id", array("q", (i.id for i in sized)))
+                append("images.width", array(
+                    "q", (i.width if i.width is not None else -1
+                          for i in sized)))
+                append("images.height", array(
+                    "q", (i.height if i.height is not None else -1
+                          for i in sized)))
+                append("images.rows", ends)
+                written["paths"] = write_strings(
+                    part_path, "images.path",
+                    (os.path.abspath(image.path) for image in sized),
+                    written["paths"])
+                for name, column in table.columns().items():
+                    append(BOX_COLUMNS[name], array(
+                        COLUMNS[BOX_COLUMNS[name]],
+                        (column[row] for row in rows)))
+            advance(len(images))
+
+        yield convert_chunk
+
+    def finish(self):
+        """
+        Joins the parts of every partition into its columns, rebasing
+        the offsets of later parts, then writes the classes and the
+        manifest that marks the dataset as complete.
+        """
+        names = []
+        for partition in self.dataset.get_partitions():
+            parts_path = self.parts_path.joinpath(partition.name)
+            if not parts_path.is_dir():
+                continue
+            names.append(partition.name)
+            output = self.path.joinpath(partition.name)
+            output.mkdir(parents=True, exist_ok=True)
+            parts = sorted(parts_path.iterdir())
+            files = [column_file(name, typecode)
+                     for name, typecode in COLUMNS.items()]
+            files += ["images.path.bin", column_file("images.path", "q")]
+            for file in files:
+                self.__join_parts(
+                    output / file, [part / file for part in parts],
+                    rebase=file in OFFSET_COLUMNS)
+            profiling.add_io(files=len(files))
+            shutil.rmtree(parts_path)
+        shutil.rmtree(self.parts_path, ignore_errors=True)
+
+        # Write the classes, then the manifest last
+        classes = sorted(self.dataset.get_classes(), key=lambda c: c.id)
+        for file in ("classes.id.i8", "classes.name.bin", "classes.name.i8"):
+            self.path.joinpath(file).unlink(missing_ok=True)
+        with open(self.path / column_file("classes.id", "q"), "wb") as f:
+            array("q", (cls.id for cls in classes)).tofile(f)
+        write_strings(self.path, "classes.name",
+                      (cls.name for cls in classes))
+        write_manifest(self.path, names)
+
+    def __join_parts(self, output: Path, parts, rebase: bool):
+        # A single part is moved into place as it is
+        if len(parts) == 1:
+            parts[0].touch()
+            os.replace(parts[0], output)
+            return
+        # The offsets of later parts continue from the last offset of
+        # the parts before them
+        base = 0
+        with open(output, "wb") as f:
+            for part in parts:
+                if not part.exists():
+                    continue
+                if not rebase:
+                    with open(part, "rb") as source:
+                        shutil.copyfileobj(source, f, self.buffer_size)
+                    continue
+                offsets = array("q")
+                offsets.frombytes(part.read_bytes())
+                if base:
+                    offsets = array("q", (o + base for o in offsets))
+                offsets.tofile(f)
+                if offsets:
+                    base = offsets[-1]
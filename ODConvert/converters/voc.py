@@ -0,0 +1,164 @@
+from array import array
+from contextlib import contextmanager
+from typing import Dict
+from xml.sax.saxutils import escape
+
+from ODConvert.core import BoxFormat, DatasetImage
+from ODConvert.core import convert_boxes, image_sizes, profiling
+from ODConvert.core.imagesize import fill_image_sizes
+from ODConvert.core.stream import RecordChunk
+
+from ODConvert.converters.base import DatasetConverter
+from ODConvert.converters.labels import write_file
+from ODConvert.converters.manifest import label_digest
+
+
+# Annotation file of an image, filled in with str.format
+ANNOTATION_TEMPLATE = """<annotation>
+\t<folder>JPEGImages</folder>
+\t<filename>{filename}</filename>
+\t<size>
+\t\t<width>{width}</width>
+\t\t<height>{height}</height>
+\t\t<depth>3</depth>
+\t</size>
+\t<segmented>0</segmented>
+{objects}</annotation>
+"""
+
+# Object element of an annotation file, filled in with str.format
+OBJECT_TEMPLATE = """\t<object>
+\t\t<name>{name}</name>
+\t\t<pose>Unspecified</pose>
+\t\t<truncated>0</truncated>
+\t\t<difficult>{difficult}</difficult>
+\t\t<bndbox>
+\t\t\t<xmin>{x_min}</xmin>
+\t\t\t<ymin>{y_min}</ymin>
+\t\t\t<xmax>{x_max}</xmax>
+\t\t\t<ymax>{y_max}</ymax>
+\t\t</bndbox>
+\t</object>
+"""
+
+
+class VOCConverter(DatasetConverter):
+
+    description = "[white]Copying images and writing annotations[/white]"
+
+    def setup(self):
+        # Create the annotations, images and image sets paths
+        self.annotations_path = self.path.joinpath("Annotations")
+        self.images_path = self.path.joinpath("JPEGImages")
+        self.sets_path = self.path.joinpath("ImageSets", "Main")
+
+    def additional_checks(self):
+        return True
+
+    @staticmethod
+    def image_stem(partition, id: int) -> str:
+        """
+        Returns the output file name (without suffix) of an image. All
+        partitions share the image and annotation directories, and the
+        image IDs of different partitions may overlap, so the name is
+        prefixed with the partition.
+        :param partition: The partition of the image.
+        :param id: The ID of the image.
+        :return: str
+        """
+        return f"{partition.name}_{id}"
+
+    @contextmanager
+    def open_partition(self, partition, shard=None):
+        # Create the directories shared by all partitions
+        for path in (self.annotations_path, self.images_path,
+                     self.sets_path):
+            path.mkdir(parents=True, exist_ok=True)
+        # The IDs of the converted images, for the image list
+        ids = array("q")
+
+        def convert_chunk(chunk: RecordChunk, advance):
+            # Get the images of the chunk and their annotation rows
+            images = chunk.images
+            table = chunk.annotations
+            index = chunk.index
+            rows = array("q")
+            for image in images:
+                rows.extend(index.rows(image.id))
+            ids.extend(image.id for image in images)
+
+            with profiling.stage("convert.boxes", partition=partition.name):
+                # Every annotation file holds the size of its image, read
+                # it from the image header where it is not known yet
+                fill_image_sizes(index.images, (image.id for image in images))
+
+                # Convert the boxes to corners in one batch, clipping them
+                # to the image and dropping degenerate ones
+                widths, heights = image_sizes(
+                    (table.image_ids[row] for row in rows), index.images)
+                (x_min, y_min, x_max, y_max), keep = convert_boxes(
+                    tuple(
+                        array("d", (column[row] for row in rows))
+                        for column in (table.x_center, table.y_center,
+                                       table.width, table.height)
+                    ),
+                    BoxFormat.CXCYWH, BoxFormat.XYXY,
+                    widths=widths, heights=heights, clip=True, min_size=0.0)
+                # Map annotation rows to their converted box, rows whose
+                # box was dropped are left out
+                converted: Dict[int, int] = {
+                    rows[kept]: position for position, kept in enumerate(keep)
+                }
+
+            def convert_image(image: DatasetImage):
+                # Construct a new file name using the partition, the image
+                # ID and the original file extension
+                stem = self.image_stem(partition, image.id)
+                new_file_name = f"{stem}{image.path.suffix}"
+                new_file_path = self.images_path.joinpath(new_file_name)
+                annotation_path = self.annotations_path.joinpath(
+                    f"{stem}.xml")
+                # The image with its dimensions filled in
+                sized = index.images[image.id]
+                # Fill in the templates for all objects of the image
+                objects = "".join(
+                    OBJECT_TEMPLATE.format(
+                        name=names[table.class_ids[row]],
+                        difficult=table.iscrowd[row],
+                        x_min=round(x_min[i]), y_min=round(y_min[i]),
+                        x_max=round(x_max[i]), y_max=round(y_max[i]))
+                    for row in index.rows(image.id)
+                    if (i := converted.get(row)) is not None
+                )
+                annotation = ANNOTATION_TEMPLATE.format(
+                    filename=escape(new_file_name),
+                    width=sized.width or 0, height=sized.height or 0,
+                    objects=objects
+                ).encode()
+                digest = label_digest(annotation)
+                outputs = (new_file_path, annotation_path)
+                # Skip images that are already converted and unchanged
+                if manifest.is_current(image.id, image.path, outputs, digest):
+                    return
+                # Copy or link the image to the new file path
+                self.transfer(image.path, new_file_path)
+                # Write the annotation file in a single write
+                write_file(annotation_path, annotation)
+                manifest.record(image.id, image.path, outputs, digest)
+
+            # Copy images and write annotations on the worker pool
+            with profiling.stage("convert.files", partition=partition.name):
+                self.run_parallel(images, convert_image, advance)
+
+        # Escape every class name once instead of once per object
+        names = {cls.id: escape(cls.name) for cls in partition.get_classes()}
+        with self.open_manifest(partition, shard) as manifest:
+            yield convert_chunk
+        # The image list is written once all images are converted,
+        # by the first shard of a partition converted in shards
+        if shard is None or shard.start == 0:
+            listed = ids if shard is None else partition.get_images()
+            write_file(
+                self.sets_path.joinpath(f"{partition.name}.txt"),
+                "".join(f"{self.image_stem(partition, id)}\n"
+                        for id in sorted(listed)).encode())
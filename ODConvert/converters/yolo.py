@@ -1,66 +1,172 @@
-from ODConvert.core import DatasetAnnotation
-from typing import Dict, List
-import shutil
-from rich.progress import track
+import json
+import re
+from array import array
+from contextlib import contextmanager
+from typing import Dict
+
+from ODConvert.core import BoxFormat, DatasetImage
+from ODConvert.core import convert_boxes, image_sizes, profiling
+from ODConvert.core.stream import RecordChunk
 
 from ODConvert.converters.base import DatasetConverter
+from ODConvert.converters.labels import LabelFormat, LabelShardWriter
+from ODConvert.converters.labels import write_file
+from ODConvert.converters.manifest import label_digest
 
 
 class YOLOConverter(DatasetConverter):
 
+    description = "[white]Copying images and writing labels[/white]"
+
+    def __init__(self, *args,
+                 label_format: LabelFormat = LabelFormat.FILES, **kwargs):
+        """
+        Initialize the YOLOConverter, see DatasetConverter.
+        :param label_format: Write one label file per image, or one
+        text or Parquet label file per partition.
+        """
+        self.label_format = label_format
+        super().__init__(*args, **kwargs)
+
     def setup(self):
         # Create the images and labels paths
         self.images_path = self.path.joinpath("images")
         self.labels_path = self.path.joinpath("labels")
+        self.__write_names()
+
+    def __write_names(self):
+        """
+        Writes the class names of the dataset to data.yaml, as a
+        mapping of class IDs to names, so that the output can be read
+        back with its class names.
+        """
+        lines = ["names:"]
+        for cls in sorted(self.dataset.get_classes(), key=lambda c: c.id):
+            lines.append(f"  {cls.id}: {json.dumps(cls.name)}")
+        write_file(self.path.joinpath("data.yaml"),
+                   ("\n".join(lines) + "\n").encode())
 
     def additional_checks(self):
         return True
 
-    def convert_partition(self, partition):
+    def prepare(self):
+        # Label files of a partition are named after the shards of the
+        # run that wrote them, remove those of earlier runs so that a
+        # different shard layout does not label images twice
+        if self.label_format is LabelFormat.FILES \
+                or not self.labels_path.is_dir():
+            return
+        names = "|".join(re.escape(partition.name)
+                         for partition in self.dataset.get_partitions())
+        pattern = re.compile(rf"(?:{names})(?:\.\d{{9}})?\.(?:txt|parquet)")
+        for path in self.labels_path.iterdir():
+            if pattern.fullmatch(path.name) and path.is_file():
+                path.unlink()
+
+    @contextmanager
+    def open_partition(self, partition, shard=None):
         # Create the directories for the partition
         partition_images_path = self.images_path.joinpath(partition.name)
         partition_images_path.mkdir(parents=True, exist_ok=True)
         partition_labels_path = self.labels_path.joinpath(partition.name)
-        partition_labels_path.mkdir(parents=True, exist_ok=True)
-        # Get the images and annotations for the partition
-        images = partition.get_images()
-        annotations = partition.get_annotations()
-
-        # Setup & fill images with annotations dictionary
-        images_with_annotations: Dict[int, List[DatasetAnnotation]] = {}
-        for image in images.values():
-            # Create an empty list for images with annotations
-            images_with_annotations[image.id] = []
-        for annotation in annotations:
-            # Get the image ID from the annotation
-            image_id = annotation.image.id
-            # Append the annotation to the list of annotations for the image
-            images_with_annotations[image_id].append(annotation)
-
-        # Copy images and write labels
-        for image_with_annotations in track(
-            images_with_annotations,
-            description="[white]Copying images and writing labels[/white]"
-        ):
-            # Copy the image to the partition images path
-            image = images[image_with_annotations]
-            # Construct a new file name using the image ID and the original
-            # file extension
-            new_file_name = f"{image.id}{image.path.suffix}"
-            new_file_path = partition_images_path.joinpath(new_file_name)
-            # Copy the image to the new file path
-            shutil.copyfile(image.path, new_file_path)
-            # Create the image annotation file
-            partition_labels_path.joinpath(
-                f"{image_with_annotations}.txt").touch(exist_ok=True)
-            # Write the annotations to the file
-            with open(partition_labels_path.joinpath(
-                    f"{image_with_annotations}.txt"), "w") as f:
-                for annot in images_with_annotations[image_with_annotations]:
-                    # Get the class ID and bounding box
-                    cls_id = annot.cls.id
-                    bbox = annot.bbox
-                    # Write the annotation to the file
-                    f.write(
-                        f"{cls_id} {bbox.x_center} {bbox.y_center} "
-                        f"{bbox.width} {bbox.height}\n")
+        if self.label_format is LabelFormat.FILES:
+            partition_labels_path.mkdir(parents=True, exist_ok=True)
+        else:
+            self.labels_path.mkdir(parents=True, exist_ok=True)
+
+        def convert_chunk(chunk: RecordChunk, advance):
+            # Get the images of the chunk and their annotation rows
+            images = chunk.images
+            table = chunk.annotations
+            index = chunk.index
+            rows = array("q")
+            for image in images:
+                rows.extend(index.rows(image.id))
+
+            with profiling.stage("convert.boxes", partition=partition.name):
+                # Normalize the boxes by their image size in one batch,
+                # clipping them to the image and dropping degenerate ones
+                widths, heights = image_sizes(
+                    (table.image_ids[row] for row in rows), index.images)
+                (x_center, y_center, width, height), keep = convert_boxes(
+                    tuple(
+                        array("d", (column[row] for row in rows))
+                        for column in (table.x_center, table.y_center,
+                                       table.width, table.height)
+                    ),
+                    BoxFormat.CXCYWH, BoxFormat.CXCYWH,
+                    widths=widths, heights=heights,
+                    dst_normalized=True, clip=True, min_size=0.0)
+                # Map annotation rows to their normalized box, rows whose
+                # box was dropped are left out
+                normalized: Dict[int, int] = {
+                    rows[kept]: position for position, kept in enumerate(keep)
+                }
+
+            def convert_image(image: DatasetImage):
+                # Construct a new file name using the image ID and the
+                # original file extension
+                new_file_name = f"{image.id}{image.path.suffix}"
+                new_file_path = partition_images_path.joinpath(new_file_name)
+                label_path = partition_labels_path.joinpath(f"{image.id}.txt")
+                # Collect the normalized boxes of the image
+                class_ids = []
+                boxes = []
+                for row in index.rows(image.id):
+                    i = normalized.get(row)
+                    if i is None:
+                        continue
+                    class_ids.append(table.class_ids[row])
+                    boxes.append(
+                        (x_center[i], y_center[i], width[i], height[i]))
+                # Format all boxes of the image into one buffer, images
+                # without annotations get an empty label file
+                label = "".join(
+                    f"{class_id} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n"
+                    for class_id, (x, y, w, h) in zip(class_ids, boxes)
+                ).encode()
+                digest = label_digest(label)
+                if shard_writer is not None:
+                    # Label shards are rewritten as a whole on every run
+                    shard_writer.add(image.id, class_ids, boxes)
+                    outputs = (new_file_path,)
+                else:
+                    outputs = (new_file_path, label_path)
+                # Skip images that are already converted and unchanged
+                if manifest.is_current(image.id, image.path, outputs, digest):
+                    return
+                # Copy or link the image to the new file path
+                self.transfer(image.path, new_file_path)
+                # Write the image annotation file in a single write
+                if shard_writer is None:
+                    write_file(label_path, label)
+                manifest.record(image.id, image.path, outputs, digest)
+
+            # Copy images and write labels on the worker pool
+            with profiling.stage("convert.files", partition=partition.name):
+                self.run_parallel(images, convert_image, advance)
+
+        shard_writer = self.__open_label_shard(partition, shard)
+        try:
+            with self.open_manifest(partition, shard) as manifest:
+                yield convert_chunk
+        finally:
+            if shard_writer is not None:
+                shard_writer.close()
+
+    def __open_label_shard(self, partition, shard: range | None
+                           ) -> LabelShardWriter | None:
+        """
+        Opens the single label file of a partition (shard) unless
+        labels are written as one file per image.
+        :param partition: The partition being converted.
+        :param shard: The shard being converted, if any.
+        :return: LabelShardWriter | None
+        """
+        if self.label_format is LabelFormat.FILES:
+            return None
+        name = partition.name
+        if shard is not None:
+            name += f".{shard.start:09d}"
+        return LabelShardWriter(
+            self.labels_path.joinpath(name), self.label_format)
@@ -1,3 +1,6 @@
 from ODConvert.core.boundingbox import BoundingBox
-from ODConvert.core.dataset import DatasetClass, DatasetAnnotation, DatasetImage, DatasetPartition, DatasetHandler, DatasetType
+from ODConvert.core.dataset import DatasetClass, DatasetAnnotation, DatasetImage, DatasetPartition, DatasetHandler, DatasetType, PartitionCounts
+from ODConvert.core.table import AnnotationTable
+from ODConvert.core.index import PartitionIndex
+from ODConvert.core.geometry import BoxFormat, convert_boxes, image_sizes
 from ODConvert.core.autodetect import autodetect
@@ -1,24 +1,29 @@
-from ODConvert.core import DatasetHandler, DatasetType
+from ODConvert.core import DatasetHandler, profiling
 from pathlib import Path
 
+from ODConvert.core import registry
 
-def autodetect(path: Path) -> DatasetHandler:
+
+def autodetect(path: Path, **options) -> DatasetHandler:
+    """
+    Detects the type of the dataset at the given path and returns
+    a handler for it.
+    :param path: The path to the dataset.
+    :param options: Options passed on to the dataset handler.
+    :return: DatasetHandler
+    """
     # Reject fake paths or non-dirs
     if not path.exists() or not path.is_dir():
         raise FileNotFoundError(
             f"Specified path: {path} does not exist or is not a directory.")
 
-    items = [item for item in path.iterdir()]
-
-    # Check for a COCO dataset by looking for a directory named "annotations"
-    # that contains any .json files
-    for item in path.iterdir():
-        if item.is_dir() and item.name == "annotations":
-            # Check if there are any .json files in the annotations directory
-            if any(file.suffix == ".json" for file in item.iterdir()):
-                # Assume this is a COCO dataset
-                from ODConvert.handlers.coco import COCODatasetHandler
-                return COCODatasetHandler(path)
+    # Detect the dataset type with the sniffers of the registered
+    # formats, then create the handler of the most likely one only
+    with profiling.stage("autodetect"):
+        detected = registry.detect(path)
+        if detected is not None:
+            typ, _ = detected
+            return registry.get_handler(typ)(path, **options)
 
     raise TypeError(
         "Unable to detect dataset type. Please specify the dataset type manually."
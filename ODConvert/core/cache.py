@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ODConvert.core import profiling
+from ODConvert.core.dataset import DatasetClass, DatasetImage
+from ODConvert.core.table import AnnotationTable
+
+
+# Identifies (and versions) the binary layout of a cache entry
+_MAGIC = b"ODCPART1"
+# Size of each block sampled for the content hash
+_SAMPLE_SIZE = 1 << 20
+
+
+def default_cache_dir() -> Path:
+    """
+    Returns the cache directory, which can be overridden with the
+    ODCONVERT_CACHE_DIR environment variable.
+    :return: Path
+    """
+    return Path(os.environ.get(
+        "ODCONVERT_CACHE_DIR",
+        Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")) / "odconvert"
+    )).expanduser()
+
+
+def fingerprint(path: Path) -> str:
+    """
+    Returns a key identifying the current contents of a file. It covers
+    the absolute path, size and modification time of the file and a
+    hash of its first, middle and last megabyte, so that computing it
+    stays cheap on multi-gigabyte files.
+    :param path: The file to fingerprint.
+    :return: str
+    """
+    stat = path.stat()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(
+        f"{path.absolute()}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        for offset in (0, stat.st_size // 2, stat.st_size - _SAMPLE_SIZE):
+            f.seek(max(offset, 0))
+            digest.update(f.read(_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+class PartitionCache:
+    """
+    On-disk cache of parsed dataset partitions. Each entry stores the
+    classes, images and annotation table of one annotation file in a
+    compact binary layout, keyed by the fingerprint of that file. The
+    least recently used entries are evicted once the cache grows over
+    its size limit.
+    """
+
+    def __init__(self, directory: Path | None = None,
+                 max_bytes: int = 4 << 30):
+        """
+        Initialize the PartitionCache.
+        :param directory: The cache directory, see default_cache_dir.
+        :param max_bytes: The total size the cache is trimmed to.
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def __entry(self, annotation_file: Path) -> Path:
+        return self.directory / f"{fingerprint(annotation_file)}.odcp"
+
+    def load(self, annotation_file: Path) -> Optional[Tuple[
+            List[DatasetClass], Dict[int, DatasetImage], AnnotationTable]]:
+        """
+        Returns the cached classes, images and annotation table of an
+        annotation file, or None if it is not cached.
+        :param annotation_file: The annotation file of the partition.
+        :return: Optional[Tuple[List[DatasetClass],
+        Dict[int, DatasetImage], AnnotationTable]]
+        """
+        entry = self.__entry(annotation_file)
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        profiling.add_io(read=len(data), files=1)
+        if not data.startswith(_MAGIC):
+            return None
+        # Mark the entry as recently used
+        os.utime(entry)
+        try:
+            return self.__decode(data)
+        except (ValueError, KeyError, struct.error):
+            # Treat unreadable entries as missing, they are
+            # overwritten by the next store
+            return None
+
+    def __decode(self, data: bytes) -> Tuple[
+            List[DatasetClass], Dict[int, DatasetImage], AnnotationTable]:
+        """
+        Decodes the contents of a cache entry.
+        :param data: The contents of the entry.
+        :return: Tuple[List[DatasetClass], Dict[int, DatasetImage],
+        AnnotationTable]
+        """
+        # Read the JSON header that describes the binary columns
+        offset = len(_MAGIC)
+        (header_size,) = struct.unpack_from("<Q", data, offset)
+        offset += 8
+        header = json.loads(data[offset:offset + header_size])
+        offset += header_size
+        columns: Dict[str, array] = {}
+        for name, typecode, size in header["columns"]:
+            column = array(typecode)
+            column.frombytes(data[offset:offset + size])
+            columns[name] = column
+            offset += size
+        paths = data[offset:].decode().split("\0")
+
+        classes = [
+            DatasetClass(id=id, name=name) for id, name in header["classes"]
+        ]
+        images = {
+            id: DatasetImage(
+                id=id,
+                path=Path(path),
+                width=width if width >= 0 else None,
+                height=height if height >= 0 else None
+            )
+            for id, path, width, height in zip(
+                columns.pop("images.ids"), paths,
+                columns.pop("images.widths"), columns.pop("images.heights"))
+        }
+        table = AnnotationTable({cls.id: cls for cls in classes}, images)
+        for name, column in columns.items():
+            setattr(table, name, column)
+        return classes, images, table
+
+    def store(self, annotation_file: Path,
+              classes: List[DatasetClass],
+              images: Dict[int, DatasetImage],
+              table: AnnotationTable):
+        """
+        Stores the parsed classes, images and annotation table of an
+        annotation file, then trims the cache to its size limit.
+        :param annotation_file: The annotation file of the partition.
+        :param classes: The classes of the partition.
+        :param images: The images of the partition, keyed by ID.
+        :param table: The annotation table of the partition.
+        """
+        columns = dict(table.columns())
+        columns["images.ids"] = array("q", images.keys())
+        # Some exporters write the image dimensions as floats
+        columns["images.widths"] = array("q", (
+            -1 if image.width is None else round(image.width)
+            for image in images.values()))
+        columns["images.heights"] = array("q", (
+            -1 if image.height is None else round(image.height)
+            for image in images.values()))
+        blobs = [column.tobytes() for column in columns.values()]
+        header = json.dumps({
+            "classes": [[cls.id, cls.name] for cls in classes],
+            "columns": [
+                [name, column.typecode, len(blob)]
+                for (name, column), blob in zip(columns.items(), blobs)
+            ],
+        }).encode()
+        paths = "\0".join(
+            str(image.path.absolute()) for image in images.values())
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self.__entry(annotation_file)
+        # Write to a temporary file first so that readers never see
+        # a partially written entry
+        temp = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+            f.write(paths.encode())
+        os.replace(temp, entry)
+        profiling.add_io(written=entry.stat().st_size, files=1)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits
+        within its size limit.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".odcp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,16 +1,23 @@
 from dataclasses import dataclass
 from abc import abstractmethod
-from typing import List, Optional, Tuple, Dict
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from typing import Dict, TYPE_CHECKING
 from pathlib import Path
 from enum import Enum
 
 from ODConvert.core import BoundingBox
 
+if TYPE_CHECKING:
+    from ODConvert.core.index import PartitionIndex
+    from ODConvert.core.table import AnnotationTable
+    from ODConvert.core.stream import RecordChunk
+
 
 class DatasetType(Enum):
     YOLO = "YOLO"
     COCO = "COCO"
     VOC = "VOC"
+    ODC = "ODC"
 
     def __str__(self):
         """
@@ -31,6 +38,8 @@ class DatasetType(Enum):
                 return "orange3"
             case DatasetType.VOC:
                 return "red"
+            case DatasetType.ODC:
+                return "magenta"
 
     def color_encoded_str(self) -> str:
         """
@@ -52,6 +61,8 @@ class DatasetClass:
 class DatasetImage:
     id: int | None
     path: Path
+    width: int | None = None
+    height: int | None = None
 
 
 @dataclass(frozen=True)
@@ -63,6 +74,13 @@ class DatasetAnnotation:
     iscrowd: int
 
 
+@dataclass(frozen=True)
+class PartitionCounts:
+    images: int
+    annotations: int
+    per_class: Dict[int, int]
+
+
 class DatasetPartition:
     name: str
     image_dir: Path
@@ -73,37 +91,112 @@ class DatasetPartition:
         pass
 
     @abstractmethod
-    def get_annotations(self) -> List[DatasetAnnotation]:
+    def get_annotations(self) -> "AnnotationTable":
         pass
 
     @abstractmethod
     def get_images(self) -> Dict[int, DatasetImage]:
         pass
 
+    def iter_annotations(self) -> Iterator[DatasetAnnotation]:
+        """
+        Yields the annotations in the dataset partition one at a time.
+        Partitions that can stream their annotations override this to
+        avoid holding them all in memory.
+        :return: Iterator[DatasetAnnotation]
+        """
+        yield from self.get_annotations()
+
+    def iter_chunks(self, size: int = 1024) -> Iterator["RecordChunk"]:
+        """
+        Yields the images of the partition in image ID order, in
+        chunks of at most size images together with their annotations.
+        Partitions that can read their annotations chunk by chunk
+        override this to avoid loading them all at once.
+        :param size: The maximum number of images per chunk.
+        :return: Iterator[RecordChunk]
+        """
+        from ODConvert.core.stream import RecordChunk
+        images = self.get_images()
+        table = self.get_annotations()
+        index = self.get_index()
+        ids = sorted(images)
+        for start in range(0, len(ids), size):
+            yield RecordChunk(
+                images=[images[id] for id in ids[start:start + size]],
+                annotations=table, index=index)
+
+    def get_index(self) -> "PartitionIndex":
+        """
+        Returns the lookup index of the dataset partition, building it
+        on first use.
+        :return: PartitionIndex
+        """
+        index = getattr(self, "_index", None)
+        if index is None:
+            from ODConvert.core.index import PartitionIndex
+            index = PartitionIndex(
+                self.get_classes(), self.get_images(), self.get_annotations)
+            self._index = index
+        return index
+
+    def get_class(self, id: int) -> DatasetClass | None:
+        """
+        Get a class by its ID.
+        :param id: The ID of the class.
+        :return: DatasetClass object
+        """
+        return self.get_index().classes.get(id)
+
+    def get_image(self, id: int) -> DatasetImage | None:
+        """
+        Get an image by its ID.
+        :param id: The ID of the image.
+        :return: DatasetImage object
+        """
+        return self.get_index().images.get(id)
+
+    def counts(self) -> PartitionCounts:
+        """
+        Returns the number of images, annotations and annotations per
+        class ID in the dataset partition. Partitions that can count
+        without loading their annotations override this.
+        :return: PartitionCounts
+        """
+        annotations = self.get_annotations()
+        return PartitionCounts(
+            images=len(self.get_images()),
+            annotations=len(annotations),
+            per_class=annotations.class_counts()
+        )
+
     def stats(self) -> Tuple[int, int]:
         """
         Returns the number of images and annotations in the dataset partition.
         :return: Tuple[int, int]
         """
-        images = self.get_images()
-        annotations = self.get_annotations()
-        return len(images), len(annotations)
+        counts = self.counts()
+        return counts.images, counts.annotations
 
 
 class DatasetHandler:
 
     def __init__(self,
                  typ: DatasetType,
-                 classes: List[DatasetClass],
+                 classes: Iterable[DatasetClass] | Callable[
+                     [], Iterable[DatasetClass]],
                  partitions: List[DatasetPartition]
                  ):
         # Set the dataset type
         self.__type: DatasetType = typ
+        # Classes may be given as a function, so that handlers can
+        # defer reading them until they are first needed
+        self.__load_classes = classes if callable(classes) else None
         # Convert the provided classes and partitions to dictionaries
         # for faster lookup
-        self.__classes: Dict[int, DatasetClass] = {
-            cls.id: cls for cls in classes
-        }
+        self.__classes: Dict[int, DatasetClass] | None = None
+        if self.__load_classes is None:
+            self.__classes = {cls.id: cls for cls in classes}
         self.__partitions: Dict[str, DatasetPartition] = {
             partition.name: partition for partition in partitions
         }
@@ -120,6 +213,8 @@ class DatasetHandler:
         Returns the list of classes in the dataset.
         :return: List[DatasetClass]
         """
+        if self.__classes is None:
+            self.__classes = {cls.id: cls for cls in self.__load_classes()}
         return self.__classes.values()
 
     def get_partitions(self) -> List[DatasetPartition]:
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import sqlite3
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from ODConvert.core import profiling
+from ODConvert.core.cache import default_cache_dir
+
+
+# Size of the blocks files are hashed in
+_CHUNK_SIZE = 1 << 20
+# Maximum number of parameters of a single SQLite query
+_QUERY_SIZE = 500
+
+
+class ContentHashCache:
+    """
+    Persistent cache of file content hashes in an SQLite database,
+    keyed by the absolute path of the file and validated against its
+    modification time and size.
+    """
+
+    def __init__(self, path: Path | None = None):
+        """
+        Initialize the ContentHashCache.
+        :param path: The database file, defaults to contenthash.sqlite
+        in the cache directory, see default_cache_dir.
+        """
+        self.path = path or default_cache_dir() / "contenthash.sqlite"
+        self.__lock = Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False)
+        # Write ahead logging lets concurrent processes read while
+        # another one writes
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, "
+            "digest TEXT)")
+        self.__connection.commit()
+
+    def lookup(self, paths: Sequence[str]
+               ) -> Dict[str, Tuple[Tuple[int, int], str]]:
+        """
+        Returns the cached entries of the given absolute paths.
+        :param paths: The absolute file paths.
+        :return: Dict of ((mtime_ns, size), digest) tuples keyed by
+        path, for the paths that are cached
+        """
+        entries = {}
+        with self.__lock:
+            for i in range(0, len(paths), _QUERY_SIZE):
+                chunk = paths[i:i + _QUERY_SIZE]
+                rows = self.__connection.execute(
+                    "SELECT path, mtime_ns, size, digest FROM hashes "
+                    f"WHERE path IN ({','.join('?' * len(chunk))})",
+                    chunk)
+                for path, mtime_ns, size, digest in rows:
+                    entries[path] = ((mtime_ns, size), digest)
+        return entries
+
+    def store(self, entries: Iterable[Tuple[str, int, int, str]]):
+        """
+        Stores computed content hashes.
+        :param entries: (path, mtime_ns, size, digest) tuples.
+        """
+        with self.__lock:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                entries)
+            self.__connection.commit()
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self.__lock:
+            self.__connection.close()
+
+
+def default_hash_cache() -> ContentHashCache | None:
+    """
+    Opens the content hash cache in the default cache directory.
+    :return: ContentHashCache | None if the cache cannot be opened
+    """
+    try:
+        return ContentHashCache()
+    except (OSError, sqlite3.Error):
+        # Hashing still works without a cache, just not across runs
+        return None
+
+
+def content_hash(path: str | Path) -> str:
+    """
+    Hashes the contents of a file, reading it in fixed size blocks.
+    :param path: The file.
+    :return: str, the hex digest
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    read = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(_CHUNK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            read += len(block)
+    profiling.add_io(read=read, files=1)
+    return digest.hexdigest()
+
+
+@dataclass
+class DedupPlan:
+    """
+    The duplicate images of a dataset. Every source file whose content
+    occurs more than once is mapped to a key identifying the content,
+    files with unique contents are not included.
+    """
+    keys: Dict[str, str] = field(default_factory=dict)
+    # Number of images that are duplicates of an earlier one, and the
+    # bytes their copies would have taken
+    duplicates: int = 0
+    saved_bytes: int = 0
+
+    def key(self, path: str | Path) -> str | None:
+        """
+        Returns the content key of a source file.
+        :param path: The source file.
+        :return: str | None if its content is unique
+        """
+        return self.keys.get(os.path.abspath(path))
+
+
+def plan_dedup(paths: Iterable[str | Path], workers: int | None = None,
+               cache: ContentHashCache | None = None) -> DedupPlan:
+    """
+    Finds the images with identical contents. Files are compared by
+    size first, and only files sharing their size with a different
+    file are hashed, on a pool of worker threads. Hard links of the
+    same file are recognised without hashing.
+    :param paths: The source file of every image, a file referenced
+    by several images is listed once per image.
+    :param workers: The number of worker threads, defaults to the
+    ThreadPoolExecutor default.
+    :param cache: The cache of previously computed hashes, if any.
+    :return: DedupPlan
+    """
+    # Count the images of every file
+    occurrences: Dict[str, int] = defaultdict(int)
+    for path in paths:
+        occurrences[os.path.abspath(path)] += 1
+
+    # Group the files by size, and the names of a file by inode
+    by_size: Dict[int, Dict[Tuple[int, int], List[str]]] = \
+        defaultdict(lambda: defaultdict(list))
+    stats: Dict[str, os.stat_result] = {}
+    for path in occurrences:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Missing files fail once they are transferred
+            continue
+        stats[path] = stat
+        by_size[stat.st_size][(stat.st_dev, stat.st_ino)].append(path)
+
+    # Files of the same size on different inodes need to be hashed
+    keys: Dict[str, str] = {}
+    pending: List[str] = []
+    for size, inodes in by_size.items():
+        for (device, inode), names in inodes.items():
+            if len(inodes) > 1:
+                pending.append(names[0])
+            else:
+                keys[names[0]] = f"inode-{device}-{inode}"
+    known = cache.lookup(pending) if cache is not None and pending else {}
+
+    def digest(path: str) -> Tuple[str, bool]:
+        # Returns the content key of a file, and whether it has to be
+        # stored in the cache
+        stat = stats[path]
+        entry = known.get(path)
+        if entry is not None and entry[0] == (stat.st_mtime_ns,
+                                              stat.st_size):
+            return entry[1], False
+        return content_hash(path), True
+
+    with ThreadPoolExecutor(workers) as pool:
+        hashed = list(pool.map(digest, pending))
+    for path, (key, _) in zip(pending, hashed):
+        keys[path] = key
+    if cache is not None:
+        try:
+            cache.store(
+                (path, stats[path].st_mtime_ns, stats[path].st_size, key)
+                for path, (key, new) in zip(pending, hashed) if new)
+        except sqlite3.Error:
+            # A locked or read-only cache only costs the next run
+            pass
+    # Other names of a hashed inode share its key
+    for inodes in by_size.values():
+        for names in inodes.values():
+            for name in names[1:]:
+                keys[name] = keys[names[0]]
+
+    # Keep the contents that more than one image refers to
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for path, key in keys.items():
+        groups[key].append(path)
+    plan = DedupPlan()
+    for key, names in groups.items():
+        count = sum(occurrences[name] for name in names)
+        if count < 2:
+            continue
+        plan.duplicates += count - 1
+        plan.saved_bytes += (count - 1) * stats[names[0]].st_size
+        for name in names:
+            plan.keys[name] = key
+    return plan
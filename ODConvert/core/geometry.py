@@ -0,0 +1,138 @@
+from array import array
+from enum import Enum
+from typing import Dict, Optional, Sequence, Tuple
+
+from ODConvert.core.dataset import DatasetImage
+
+
+# Four parallel coordinate columns, one row per box
+Boxes = Tuple[Sequence[float], Sequence[float],
+              Sequence[float], Sequence[float]]
+
+
+class BoxFormat(Enum):
+    # COCO: top left corner, width and height
+    XYWH = "xywh"
+    # VOC: top left and bottom right corners
+    XYXY = "xyxy"
+    # YOLO: center, width and height
+    CXCYWH = "cxcywh"
+
+
+def image_sizes(image_ids: Sequence[int],
+                images: Dict[int, DatasetImage],
+                probe: bool = True
+                ) -> Tuple[array, array]:
+    """
+    Returns the width and height of the image of every row.
+    :param image_ids: The image ID of every row.
+    :param images: The images of the partition, keyed by ID.
+    :param probe: Whether to read the dimensions that are not known
+    yet from the image file headers, updating images in place.
+    :return: Tuple[array, array] of widths and heights
+    """
+    image_ids = array("q", image_ids)
+    if probe:
+        # Imported here as probing is only needed by few callers
+        from ODConvert.core.imagesize import fill_image_sizes
+        fill_image_sizes(images, image_ids)
+    sizes = {}
+    for image in images.values():
+        if image.width is None or image.height is None:
+            continue
+        sizes[image.id] = (image.width, image.height)
+    widths = array("d")
+    heights = array("d")
+    for image_id in image_ids:
+        size = sizes.get(image_id)
+        if size is None:
+            raise ValueError(
+                f"Image with ID {image_id} has no known dimensions.")
+        widths.append(size[0])
+        heights.append(size[1])
+    return widths, heights
+
+
+def convert_boxes(boxes: Boxes,
+                  src: BoxFormat,
+                  dst: BoxFormat,
+                  widths: Optional[Sequence[float]] = None,
+                  heights: Optional[Sequence[float]] = None,
+                  src_normalized: bool = False,
+                  dst_normalized: bool = False,
+                  clip: bool = False,
+                  min_size: Optional[float] = None
+                  ) -> Tuple[Tuple[array, array, array, array], array]:
+    """
+    Converts a batch of boxes between formats in a single pass,
+    optionally clipping them to their image and dropping degenerate
+    ones on the way.
+    :param boxes: The four coordinate columns in the src format.
+    :param src: The format of the given boxes.
+    :param dst: The format to convert the boxes to.
+    :param widths: The image width of every row, required for
+    normalization and clipping.
+    :param heights: The image height of every row, required for
+    normalization and clipping.
+    :param src_normalized: Whether the given boxes are relative to
+    the image size.
+    :param dst_normalized: Whether the returned boxes should be
+    relative to the image size.
+    :param clip: Whether to clip the boxes to the image bounds.
+    :param min_size: If given, boxes whose absolute width or height
+    (after clipping) is not above this are dropped as degenerate.
+    :return: The four converted coordinate columns and the indices of
+    the rows that were kept.
+    """
+    sized = src_normalized or dst_normalized or clip
+    if sized and (widths is None or heights is None):
+        raise ValueError("Image sizes are required to normalize or clip.")
+    a, b, c, d = boxes
+    out = (array("d"), array("d"), array("d"), array("d"))
+    out_a, out_b, out_c, out_d = (column.append for column in out)
+    keep = array("q")
+    keep_row = keep.append
+    for row in range(len(a)):
+        # Bring the box into absolute corner form
+        if src is BoxFormat.XYWH:
+            x0, y0 = a[row], b[row]
+            x1, y1 = x0 + c[row], y0 + d[row]
+        elif src is BoxFormat.XYXY:
+            x0, y0, x1, y1 = a[row], b[row], c[row], d[row]
+        else:
+            half_w, half_h = c[row] / 2, d[row] / 2
+            x0, y0 = a[row] - half_w, b[row] - half_h
+            x1, y1 = a[row] + half_w, b[row] + half_h
+        if sized:
+            img_w, img_h = widths[row], heights[row]
+            if src_normalized:
+                x0, x1 = x0 * img_w, x1 * img_w
+                y0, y1 = y0 * img_h, y1 * img_h
+        if clip:
+            x0 = min(max(x0, 0.0), img_w)
+            x1 = min(max(x1, 0.0), img_w)
+            y0 = min(max(y0, 0.0), img_h)
+            y1 = min(max(y1, 0.0), img_h)
+        box_w, box_h = x1 - x0, y1 - y0
+        # Drop degenerate boxes
+        if min_size is not None and (
+                box_w <= min_size or box_h <= min_size):
+            continue
+        keep_row(row)
+        if dst_normalized:
+            x0, x1, box_w = x0 / img_w, x1 / img_w, box_w / img_w
+            y0, y1, box_h = y0 / img_h, y1 / img_h, box_h / img_h
+        # Write the box out in the target form
+        if dst is BoxFormat.CXCYWH:
+            out_a(x0 + box_w / 2)
+            out_b(y0 + box_h / 2)
+        else:
+            out_a(x0)
+            out_b(y0)
+        if dst is BoxFormat.XYXY:
+            out_c(x1)
+            out_d(y1)
+        else:
+            out_c(box_w)
+            out_d(box_h)
+    return out, keep
@@ -0,0 +1,296 @@
+import os
+import sqlite3
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from ODConvert.core import profiling
+from ODConvert.core.cache import default_cache_dir
+from ODConvert.core.dataset import DatasetImage
+
+
+# Number of header bytes read before giving up on a JPEG
+_JPEG_MAX_HEADER = 1 << 20
+# Number of bytes that hold the dimensions of all other formats
+_HEADER_SIZE = 32
+# Number of images a worker thread probes at a time
+_BATCH_SIZE = 256
+# Maximum number of parameters of a single SQLite query
+_QUERY_SIZE = 500
+
+# Image size of a file, None if it could not be read
+Size = Tuple[int, int] | None
+
+
+def read_image_size(path: str | Path) -> Size:
+    """
+    Returns the (width, height) of a JPEG, PNG, BMP, WebP or GIF image
+    by reading its header only, never decoding the image data.
+    :param path: The image file.
+    :return: Tuple[int, int] | None if the format is not recognised
+    """
+    with open(path, "rb") as f:
+        head = f.read(_HEADER_SIZE)
+        # PNG: dimensions are the first fields of the IHDR chunk
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        # JPEG: walk the markers up to the first start of frame
+        if head.startswith(b"\xff\xd8"):
+            f.seek(2)
+            return _read_jpeg_size(f)
+    # BMP: dimensions follow the size of the info header
+    if head.startswith(b"BM") and len(head) >= 26:
+        (header_size,) = struct.unpack_from("<I", head, 14)
+        if header_size == 12:
+            return struct.unpack_from("<HH", head, 18)
+        width, height = struct.unpack_from("<ii", head, 18)
+        # Top-down bitmaps have a negative height
+        return abs(width), abs(height)
+    # WebP: dimensions depend on the first chunk of the RIFF container
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP" \
+            and len(head) >= 30:
+        return _read_webp_size(head)
+    # GIF: dimensions are the first fields of the screen descriptor
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack_from("<HH", head, 6)
+    return None
+
+
+def _read_jpeg_size(f) -> Size:
+    """
+    Walks the JPEG markers of f, positioned after the SOI marker, up to
+    the first start of frame segment.
+    :param f: A binary file object.
+    :return: Tuple[int, int] | None
+    """
+    while f.tell() < _JPEG_MAX_HEADER:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        kind = marker[1]
+        # Fill bytes and markers without a length
+        if kind == 0xFF:
+            f.seek(-1, 1)
+            continue
+        if kind in (0x01, *range(0xD0, 0xD9)):
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        (length,) = struct.unpack(">H", length_bytes)
+        # Start of frame markers, except DHT, JPG and DAC
+        if 0xC0 <= kind <= 0xCF and kind not in (0xC4, 0xC8, 0xCC):
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+    return None
+
+
+def _read_webp_size(head: bytes) -> Size:
+    """
+    Reads the dimensions from the first chunk of a WebP file.
+    :param head: The first bytes of the file.
+    :return: Tuple[int, int] | None
+    """
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        # Lossy: 14 bit dimensions after the frame start code
+        if head[23:26] != b"\x9d\x01\x2a":
+            return None
+        width, height = struct.unpack_from("<HH", head, 26)
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        # Lossless: 14 bit dimensions minus one after the signature
+        if head[20] != 0x2F:
+            return None
+        (bits,) = struct.unpack_from("<I", head, 21)
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        # Extended: 24 bit canvas dimensions minus one
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+class ImageSizeCache:
+    """
+    Persistent cache of probed image dimensions in an SQLite database,
+    keyed by the absolute path of the image and validated against its
+    modification time and size.
+    """
+
+    def __init__(self, path: Path | None = None):
+        """
+        Initialize the ImageSizeCache.
+        :param path: The database file, defaults to imagesize.sqlite
+        in the cache directory, see default_cache_dir.
+        """
+        self.path = path or default_cache_dir() / "imagesize.sqlite"
+        self.__lock = Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False)
+        # Write ahead logging lets concurrent processes read while
+        # another one writes
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS sizes ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, "
+            "width INTEGER, height INTEGER)")
+        self.__connection.commit()
+
+    def lookup(self, paths: Sequence[str]
+               ) -> Dict[str, Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """
+        Returns the cached entries of the given absolute paths.
+        :param paths: The absolute image paths.
+        :return: Dict of ((mtime_ns, size), (width, height)) tuples
+        keyed by path, for the paths that are cached
+        """
+        entries = {}
+        with self.__lock:
+            for i in range(0, len(paths), _QUERY_SIZE):
+                chunk = paths[i:i + _QUERY_SIZE]
+                rows = self.__connection.execute(
+                    "SELECT path, mtime_ns, size, width, height FROM sizes "
+                    f"WHERE path IN ({','.join('?' * len(chunk))})",
+                    chunk)
+                for path, mtime_ns, size, width, height in rows:
+                    entries[path] = ((mtime_ns, size), (width, height))
+        return entries
+
+    def store(self, entries: Iterable[Tuple[str, int, int, int, int]]):
+        """
+        Stores probed image dimensions.
+        :param entries: (path, mtime_ns, size, width, height) tuples.
+        """
+        with self.__lock:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO sizes VALUES (?, ?, ?, ?, ?)",
+                entries)
+            self.__connection.commit()
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self.__lock:
+            self.__connection.close()
+
+
+def default_size_cache() -> ImageSizeCache | None:
+    """
+    Opens the image size cache in the default cache directory.
+    :return: ImageSizeCache | None if the cache cannot be opened
+    """
+    try:
+        return ImageSizeCache()
+    except (OSError, sqlite3.Error):
+        # Probing still works without a cache, just not across runs
+        return None
+
+
+def probe_many(paths: Sequence[str | Path],
+               workers: int | None = None,
+               cache: ImageSizeCache | None = None) -> List[Size]:
+    """
+    Returns the dimensions of many images, probing their headers on a
+    pool of worker threads. Images whose modification time and size
+    match their cache entry are not opened at all.
+    :param paths: The image files.
+    :param workers: The number of worker threads, defaults to the
+    ThreadPoolExecutor default.
+    :param cache: The cache of previously probed dimensions, if any.
+    :return: List[Tuple[int, int] | None] in the order of paths, None
+    for images that are missing or of an unknown format
+    """
+    paths = [os.path.abspath(path) for path in paths]
+    known = cache.lookup(paths) if cache is not None else {}
+
+    def probe(batch: Sequence[str]) -> List[Tuple[Size, tuple | None]]:
+        # Returns the size of every image of the batch, along with
+        # its signature if it has to be stored in the cache
+        results = []
+        for path in batch:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                results.append((None, None))
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            entry = known.get(path)
+            if entry is not None and entry[0] == signature:
+                results.append((entry[1], None))
+                continue
+            try:
+                size = read_image_size(path)
+            except OSError:
+                size = None
+            results.append((size, signature))
+        return results
+
+    batches = [paths[i:i + _BATCH_SIZE]
+               for i in range(0, len(paths), _BATCH_SIZE)]
+    if len(batches) > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(chain.from_iterable(pool.map(probe, batches)))
+    else:
+        results = list(chain.from_iterable(map(probe, batches)))
+
+    profiling.add_io(
+        files=sum(1 for _, signature in results if signature is not None))
+    sizes: List[Size] = []
+    probed = []
+    for path, (size, signature) in zip(paths, results):
+        sizes.append(size)
+        if size is not None and signature is not None:
+            probed.append((path, *signature, *size))
+    if cache is not None and probed:
+        try:
+            cache.store(probed)
+        except sqlite3.Error:
+            # A locked or read-only cache only costs the next run
+            pass
+    return sizes
+
+
+def fill_image_sizes(images: Dict[int, DatasetImage],
+                     ids: Iterable[int] | None = None,
+                     persist: bool = True):
+    """
+    Probes the dimensions of the images that do not have them yet,
+    replacing them in the given dictionary.
+    :param images: The images of a partition, keyed by ID.
+    :param ids: The IDs of the images that need dimensions, defaults
+    to all images.
+    :param persist: Whether to use the image size cache in the default
+    cache directory, see default_size_cache.
+    """
+    if ids is None:
+        ids = images.keys()
+    missing = [
+        images[id] for id in set(ids)
+        if images[id].width is None or images[id].height is None
+    ]
+    if not missing:
+        return
+    # The cache is only opened once there is something to probe
+    with profiling.stage("probe"):
+        cache = default_size_cache() if persist else None
+        try:
+            sizes = probe_many(
+                [image.path for image in missing], cache=cache)
+        finally:
+            if cache is not None:
+                cache.close()
+    for image, size in zip(missing, sizes):
+        if size is not None:
+            images[image.id] = DatasetImage(
+                id=image.id, path=image.path, width=size[0], height=size[1])
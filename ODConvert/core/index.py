@@ -0,0 +1,74 @@
+from array import array
+from functools import cached_property
+from typing import Callable, Dict, Iterable, Sequence, Tuple
+
+from ODConvert.core.dataset import DatasetClass, DatasetImage
+from ODConvert.core.table import AnnotationTable
+
+
+class PartitionIndex:
+    """
+    Lookup maps of a dataset partition, built once and shared by
+    handlers and converters: class ID to class, image ID to image and
+    image ID to the span of its annotation rows.
+    """
+
+    def __init__(self,
+                 classes: Iterable[DatasetClass],
+                 images: Dict[int, DatasetImage],
+                 table: Callable[[], AnnotationTable]):
+        """
+        Initialize the PartitionIndex.
+        :param classes: The classes of the partition.
+        :param images: The images of the partition, keyed by ID.
+        :param table: Returns the annotation table of the partition,
+        only called once the annotation spans are first needed.
+        """
+        self.classes: Dict[int, DatasetClass] = {
+            cls.id: cls for cls in classes
+        }
+        self.images: Dict[int, DatasetImage] = images
+        self.__table = table
+
+    @cached_property
+    def order(self) -> Sequence[int]:
+        """
+        Returns the annotation row indices ordered by image ID. Tables
+        that are already grouped by image are not reordered.
+        :return: Sequence[int]
+        """
+        image_ids = self.__table().image_ids
+        if all(a <= b for a, b in zip(image_ids, image_ids[1:])):
+            return range(len(image_ids))
+        return array("q", sorted(range(len(image_ids)),
+                                 key=image_ids.__getitem__))
+
+    @cached_property
+    def spans(self) -> Dict[int, Tuple[int, int]]:
+        """
+        Returns the (start, stop) span into order of the annotation
+        rows of every image that has annotations.
+        :return: Dict[int, Tuple[int, int]]
+        """
+        image_ids = self.__table().image_ids
+        order = self.order
+        spans: Dict[int, Tuple[int, int]] = {}
+        current, start = None, 0
+        for position, row in enumerate(order):
+            image_id = image_ids[row]
+            if image_id != current:
+                if current is not None:
+                    spans[current] = (start, position)
+                current, start = image_id, position
+        if current is not None:
+            spans[current] = (start, len(order))
+        return spans
+
+    def rows(self, image_id: int) -> Sequence[int]:
+        """
+        Returns the annotation row indices of an image.
+        :param image_id: The ID of the image.
+        :return: Sequence[int]
+        """
+        start, stop = self.spans.get(image_id, (0, 0))
+        return self.order[start:stop]
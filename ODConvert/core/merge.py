@@ -0,0 +1,213 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from ODConvert.core import profiling
+from ODConvert.core.autodetect import autodetect
+from ODConvert.core.dataset import DatasetClass, DatasetHandler
+from ODConvert.core.dataset import DatasetImage, DatasetPartition
+from ODConvert.core.dataset import PartitionCounts
+from ODConvert.core.stream import RecordChunk, make_chunk
+from ODConvert.core.table import AnnotationTable
+
+
+def load_datasets(paths: Sequence[Path], workers: int | None = None,
+                  **options) -> List[DatasetHandler]:
+    """
+    Detects and loads several datasets concurrently, on a pool of
+    worker threads.
+    :param paths: The paths to the datasets.
+    :param workers: The number of worker threads, defaults to the
+    ThreadPoolExecutor default.
+    :param options: Options passed on to the dataset handlers.
+    :return: List[DatasetHandler] in the order of paths
+    """
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(
+            lambda path: autodetect(path, **options), paths))
+
+
+@dataclass(frozen=True)
+class MergeSource:
+    """
+    A partition of one of the merged datasets, with the merged IDs of
+    its classes. Image and annotation IDs are interleaved with those of
+    the other datasets, ID * number of datasets + position of the
+    dataset, so that they never collide and can be assigned chunk by
+    chunk without knowing the IDs of the other datasets.
+    """
+    partition: DatasetPartition
+    # Merged class ID of every class ID of the dataset
+    class_map: Dict[int, int]
+    # Position of the dataset among the merged datasets
+    position: int
+    datasets: int
+
+    def key(self, id: int) -> int:
+        """
+        Returns the merged ID of an image or annotation ID.
+        :param id: The ID in the dataset.
+        :return: int
+        """
+        return id * self.datasets + self.position
+
+    def apply(self, classes: Sequence[DatasetClass],
+              chunk: RecordChunk) -> RecordChunk:
+        """
+        Assigns the merged image, annotation and class IDs to a chunk
+        of the partition, copying out the rows of its images only.
+        :param classes: The merged classes.
+        :param chunk: The chunk.
+        :return: RecordChunk
+        """
+        index = chunk.index
+        images = [replace(image, id=self.key(image.id))
+                  for image in chunk.images]
+        rows = array("q")
+        for image in chunk.images:
+            rows.extend(index.rows(image.id))
+        table = chunk.annotations
+        merged = AnnotationTable(
+            {cls.id: cls for cls in classes},
+            {image.id: image for image in images})
+        for name, column in table.columns().items():
+            values = (column[row] for row in rows)
+            if name == "class_ids":
+                values = (self.class_map[value] for value in values)
+            elif name in ("ids", "image_ids"):
+                values = map(self.key, values)
+            getattr(merged, name).extend(values)
+        return make_chunk(classes, images, merged)
+
+
+class MergedDatasetHandler(DatasetHandler):
+    """
+    A view of several datasets as one. Classes are unified by name,
+    numbered from 0 in the order the datasets first name them, and
+    partitions with the same name are merged. The merged partitions
+    stream the chunks of the datasets one after another.
+    """
+
+    def __init__(self, datasets: Sequence[DatasetHandler],
+                 workers: int | None = None):
+        """
+        Initialize the MergedDatasetHandler.
+        :param datasets: The datasets, in the order their classes are
+        numbered and their partitions are streamed in.
+        :param workers: The number of threads the classes of the
+        datasets are read on.
+        """
+        if not datasets:
+            raise ValueError("No datasets to merge.")
+        self.datasets = list(datasets)
+        # Reading the classes may load annotations, e.g. of YOLO
+        # datasets without class names, so read them concurrently
+        with ThreadPoolExecutor(workers) as pool:
+            sources = list(pool.map(
+                lambda dataset: sorted(dataset.get_classes(),
+                                       key=lambda cls: cls.id),
+                self.datasets))
+
+        # Assign the merged class IDs by name
+        by_name: Dict[str, DatasetClass] = {}
+        class_maps: List[Dict[int, int]] = []
+        for classes in sources:
+            class_map = {}
+            for cls in classes:
+                merged = by_name.get(cls.name)
+                if merged is None:
+                    merged = by_name[cls.name] = DatasetClass(
+                        id=len(by_name), name=cls.name, parent=None)
+                class_map[cls.id] = merged.id
+            class_maps.append(class_map)
+        self.classes: Tuple[DatasetClass, ...] = tuple(by_name.values())
+
+        # Merge the partitions by name
+        merged_sources: Dict[str, List[MergeSource]] = {}
+        for position, dataset in enumerate(self.datasets):
+            for partition in dataset.get_partitions():
+                merged_sources.setdefault(partition.name, []).append(
+                    MergeSource(partition, class_maps[position], position,
+                                len(self.datasets)))
+        super().__init__(
+            self.datasets[0].get_type(), self.classes,
+            [MergedDatasetPartition(name, sources, self.classes)
+             for name, sources in merged_sources.items()])
+
+
+class MergedDatasetPartition(DatasetPartition):
+
+    def __init__(self, name: str, sources: Sequence[MergeSource],
+                 classes: Sequence[DatasetClass]):
+        self.name = name
+        self.sources = list(sources)
+        self.classes = tuple(classes)
+        self.image_dir = self.sources[0].partition.image_dir
+        self.annotation_file = self.sources[0].partition.annotation_file
+        self.__merged: RecordChunk | None = None
+
+    def __reduce__(self):
+        return (MergedDatasetPartition,
+                (self.name, self.sources, self.classes))
+
+    def __merge(self) -> RecordChunk:
+        # Loads the partitions of all datasets concurrently, then
+        # concatenates them into one table
+        if self.__merged is None:
+            def load(source: MergeSource) -> RecordChunk:
+                partition = source.partition
+                images = partition.get_images()
+                chunk = RecordChunk(
+                    images=[images[id] for id in sorted(images)],
+                    annotations=partition.get_annotations(),
+                    index=partition.get_index())
+                with profiling.stage("merge", partition=self.name):
+                    return source.apply(self.classes, chunk)
+
+            with ThreadPoolExecutor(len(self.sources)) as pool:
+                chunks = list(pool.map(load, self.sources))
+            images = [image for chunk in chunks for image in chunk.images]
+            table = AnnotationTable(
+                {cls.id: cls for cls in self.classes},
+                {image.id: image for image in images})
+            for chunk in chunks:
+                for name, column in chunk.annotations.columns().items():
+                    getattr(table, name).extend(column)
+            self.__merged = make_chunk(self.classes, images, table)
+        return self.__merged
+
+    def get_classes(self) -> List[DatasetClass]:
+        return list(self.classes)
+
+    def get_images(self) -> Dict[int, DatasetImage]:
+        return self.__merge().index.images
+
+    def get_annotations(self) -> AnnotationTable:
+        return self.__merge().annotations
+
+    def counts(self) -> PartitionCounts:
+        # Sum the counts of the datasets, which do not need to load
+        # their annotations for it
+        images = annotations = 0
+        per_class: Dict[int, int] = {}
+        for source in self.sources:
+            counts = source.partition.counts()
+            images += counts.images
+            annotations += counts.annotations
+            for class_id, count in counts.per_class.items():
+                class_id = source.class_map.get(class_id, class_id)
+                per_class[class_id] = per_class.get(class_id, 0) + count
+        return PartitionCounts(images=images, annotations=annotations,
+                               per_class=per_class)
+
+    def iter_chunks(self, size: int = 1024) -> Iterator[RecordChunk]:
+        # The images of every dataset are in the order of their merged
+        # IDs, but the datasets follow each other rather than being
+        # interleaved
+        for source in self.sources:
+            for chunk in source.partition.iter_chunks(size):
+                with profiling.stage("merge", partition=self.name):
+                    chunk = source.apply(self.classes, chunk)
+                yield chunk
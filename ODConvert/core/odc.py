@@ -0,0 +1,167 @@
+import json
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+# Layout of ODC datasets, ODConvert's own memory mapped format:
+#
+#   odc.json                  manifest, written last
+#   classes.id.i8             class IDs
+#   classes.name.{bin,i8}     class names, see StringTable
+#   <partition>/images.id.i8      image IDs, in image ID order
+#   <partition>/images.width.i8   image widths, -1 if unknown
+#   <partition>/images.height.i8  image heights, -1 if unknown
+#   <partition>/images.rows.i8    end row of the boxes of each image
+#   <partition>/images.path.{bin,i8}  absolute image paths
+#   <partition>/boxes.*       annotation columns, grouped by image
+#
+# Columns are little-endian arrays of a fixed width, their file suffix
+# names the type of their values.
+MANIFEST = "odc.json"
+FORMAT = "odc"
+VERSION = 1
+SUFFIXES: Dict[str, str] = {"q": "i8", "b": "i1", "d": "f8"}
+# Typecodes of the columns of a partition
+COLUMNS: Dict[str, str] = {
+    "images.id": "q",
+    "images.width": "q",
+    "images.height": "q",
+    "images.rows": "q",
+    "boxes.id": "q",
+    "boxes.image_id": "q",
+    "boxes.class_id": "q",
+    "boxes.iscrowd": "b",
+    "boxes.x_center": "d",
+    "boxes.y_center": "d",
+    "boxes.width": "d",
+    "boxes.height": "d",
+}
+# Columns of a partition holding the annotation table columns, keyed
+# by the table column
+BOX_COLUMNS: Dict[str, str] = {
+    "ids": "boxes.id",
+    "image_ids": "boxes.image_id",
+    "class_ids": "boxes.class_id",
+    "iscrowd": "boxes.iscrowd",
+    "x_center": "boxes.x_center",
+    "y_center": "boxes.y_center",
+    "width": "boxes.width",
+    "height": "boxes.height",
+}
+
+
+def column_file(name: str, typecode: str) -> str:
+    """
+    Returns the file name of a column.
+    :param name: The column name, e.g. "boxes.id".
+    :param typecode: The array typecode of the column values.
+    :return: str
+    """
+    return f"{name}.{SUFFIXES[typecode]}"
+
+
+def map_column(path: Path, typecode: str) -> Sequence:
+    """
+    Maps a column file into memory read-only. The returned view shares
+    the page cache with every other process mapping the same file, and
+    slicing it copies nothing.
+    :param path: The column file.
+    :param typecode: The array typecode of the column values.
+    :return: Sequence, a memoryview of the values
+    """
+    if sys.byteorder != "little":
+        raise NotImplementedError(
+            "ODC datasets can only be mapped on little-endian machines.")
+    with open(path, "rb") as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(array(typecode)).toreadonly()
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped).cast(typecode)
+
+
+class StringTable(Sequence[str]):
+    """
+    A memory mapped table of UTF-8 strings: the strings concatenated
+    in a .bin file, and the end offset of every string in an .i8
+    column. Strings are only decoded when they are indexed.
+    """
+
+    def __init__(self, directory: Path, name: str):
+        """
+        Initialize the StringTable.
+        :param directory: The directory holding the table files.
+        :param name: The table name, e.g. "images.path".
+        """
+        self.ends = map_column(directory / column_file(name, "q"), "q")
+        self.data = map_column(directory / f"{name}.bin", "B")
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        start = self.ends[index - 1] if index else 0
+        return bytes(self.data[start:self.ends[index]]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+def write_strings(directory: Path, name: str, strings: Iterable[str],
+                  offset: int = 0) -> int:
+    """
+    Appends strings to a string table, see StringTable.
+    :param directory: The directory holding the table files.
+    :param name: The table name, e.g. "images.path".
+    :param strings: The strings to append.
+    :param offset: The size of the strings already in the table.
+    :return: int, the size of the strings in the table afterwards
+    """
+    ends = array("q")
+    data = bytearray()
+    for string in strings:
+        data += string.encode("utf-8")
+        ends.append(offset + len(data))
+    with open(directory / f"{name}.bin", "ab") as f:
+        f.write(data)
+    with open(directory / column_file(name, "q"), "ab") as f:
+        ends.tofile(f)
+    return offset + len(data)
+
+
+def read_manifest(directory: Path) -> dict:
+    """
+    Reads and checks the manifest of an ODC dataset.
+    :param directory: The dataset directory.
+    :return: dict
+    """
+    manifest = json.loads((directory / MANIFEST).read_text())
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"{directory} is not an ODC dataset.")
+    if manifest.get("version") != VERSION:
+        raise ValueError(
+            f"Unsupported ODC version {manifest.get('version')}, "
+            f"expected {VERSION}.")
+    return manifest
+
+
+def write_manifest(directory: Path, partitions: List[str]):
+    """
+    Writes the manifest of an ODC dataset, which marks it as complete.
+    :param directory: The dataset directory.
+    :param partitions: The names of the partitions.
+    """
+    (directory / MANIFEST).write_text(json.dumps({
+        "format": FORMAT,
+        "version": VERSION,
+        "byteorder": "little",
+        "partitions": partitions,
+    }, indent=2) + "\n")
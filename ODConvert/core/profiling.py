@@ -0,0 +1,290 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import ContextManager, Dict, Iterator, List, Tuple
+
+
+# Returned by stage while profiling is off, so that instrumented code
+# only pays for a function call and a None check
+_NULL = nullcontext()
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    files: int = 0
+
+    def add(self, other: "StageStats"):
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.bytes_read += other.bytes_read
+        self.bytes_written += other.bytes_written
+        self.files += other.files
+
+
+class Session:
+    """
+    Collects the stage timings, I/O counters and (optionally) trace
+    events of a profiled run. Counters are attributed to the innermost
+    stage of the calling thread, or of the main thread for worker
+    threads that did not open a stage of their own.
+    """
+
+    def __init__(self, trace: bool = False):
+        """
+        Initialize the Session.
+        :param trace: Whether to keep every stage as a trace event for
+        a Chrome trace, instead of only the per stage totals.
+        """
+        self.trace = trace
+        self.stages: Dict[str, StageStats] = {}
+        self.events: List[dict] = []
+        self.__lock = threading.Lock()
+        self.__stacks: Dict[int, List[str]] = {}
+        self.__main = threading.main_thread().ident
+
+    def __stats(self, name: str) -> StageStats:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    @contextmanager
+    def stage(self, name: str, **args) -> Iterator[None]:
+        thread = threading.get_ident()
+        stack = self.__stacks.setdefault(thread, [])
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            with self.__lock:
+                stats = self.__stats(name)
+                stats.calls += 1
+                stats.seconds += end - start
+                if self.trace:
+                    self.events.append({
+                        "name": name, "ph": "X", "pid": os.getpid(),
+                        "tid": thread, "ts": start * 1e6,
+                        "dur": (end - start) * 1e6, "args": args,
+                    })
+
+    def add_io(self, read: int, written: int, files: int):
+        stack = self.__stacks.get(threading.get_ident()) \
+            or self.__stacks.get(self.__main)
+        name = stack[-1] if stack else "other"
+        with self.__lock:
+            stats = self.__stats(name)
+            stats.bytes_read += read
+            stats.bytes_written += written
+            stats.files += files
+
+    def export(self) -> dict:
+        """
+        Returns the collected data in a form that can be sent from a
+        worker process to the parent, see merge.
+        :return: dict
+        """
+        with self.__lock:
+            return {"stages": dict(self.stages), "events": self.events}
+
+    def merge(self, exported: dict):
+        """
+        Adds the data collected by a worker process.
+        :param exported: The data returned by export in the worker.
+        """
+        with self.__lock:
+            for name, stats in exported["stages"].items():
+                self.__stats(name).add(stats)
+            self.events.extend(exported["events"])
+
+
+# The active session, None while profiling is off
+_session: Session | None = None
+
+
+def start(trace: bool = False):
+    """
+    Starts collecting profiling data in this process.
+    :param trace: Whether to keep trace events, see Session.
+    """
+    global _session
+    _session = Session(trace=trace)
+
+
+def stop() -> Session | None:
+    """
+    Stops collecting profiling data.
+    :return: Session | None, the data collected since start
+    """
+    global _session
+    session, _session = _session, None
+    return session
+
+
+def enabled() -> bool:
+    return _session is not None
+
+
+def options() -> dict | None:
+    """
+    Returns the options to start profiling in a worker process with,
+    or None while profiling is off.
+    :return: dict | None
+    """
+    if _session is None:
+        return None
+    return {"trace": _session.trace}
+
+
+def stage(name: str, **args) -> ContextManager[None]:
+    """
+    Measures the code run in the context as the stage name.
+    :param name: The name of the stage.
+    :param args: Details shown with the stage in Chrome traces.
+    :return: ContextManager[None]
+    """
+    if _session is None:
+        return _NULL
+    return _session.stage(name, **args)
+
+
+def add_io(read: int = 0, written: int = 0, files: int = 0):
+    """
+    Counts bytes read and written and files touched by the current
+    stage.
+    :param read: The number of bytes read.
+    :param written: The number of bytes written.
+    :param files: The number of files touched.
+    """
+    if _session is None:
+        return
+    _session.add_io(read, written, files)
+
+
+def merge(exported: dict | None):
+    """
+    Adds the data collected by a worker process to this process.
+    :param exported: The data returned by export in the worker, or
+    None if profiling was off.
+    """
+    if _session is not None and exported is not None:
+        _session.merge(exported)
+
+
+def export() -> dict | None:
+    """
+    Returns the data collected in this (worker) process, see merge.
+    :return: dict | None
+    """
+    return _session.export() if _session is not None else None
+
+
+def parse_args(argv: List[str]) -> Tuple[List[str], dict | None]:
+    """
+    Removes the profiling flags from the command line arguments.
+    --profile prints a summary, --profile-pstats=FILE also dumps
+    cProfile statistics and --profile-trace=FILE writes a Chrome
+    trace. Either file option implies --profile.
+    :param argv: The command line arguments, without the program.
+    :return: Tuple of the remaining arguments and the profiling
+    options, None if profiling was not requested
+    """
+    remaining: List[str] = []
+    options: dict | None = None
+    arguments = iter(argv)
+    for argument in arguments:
+        name, _, value = argument.partition("=")
+        if name == "--profile":
+            options = options or {}
+        elif name in ("--profile-pstats", "--profile-trace"):
+            if not value:
+                value = next(arguments, "")
+            if not value:
+                raise ValueError(f"{name} requires a file name.")
+            options = options or {}
+            options[name[len("--profile-"):]] = Path(value)
+        else:
+            remaining.append(argument)
+    return remaining, options
+
+
+@contextmanager
+def session(pstats: Path | None = None,
+            trace: Path | None = None) -> Iterator[None]:
+    """
+    Profiles the code run in the context, then prints a summary table
+    and writes the requested output files.
+    :param pstats: The file cProfile statistics are dumped to.
+    :param trace: The file a Chrome trace is written to.
+    """
+    start(trace=trace is not None)
+    profiler = cProfile.Profile() if pstats is not None else None
+    started = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        with stage("total"):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - started
+        collected = stop()
+        print_summary(collected, elapsed)
+        if profiler is not None:
+            profiler.dump_stats(pstats)
+            print(f"cProfile statistics written to {pstats}")
+        if trace is not None:
+            trace.write_text(json.dumps({
+                "traceEvents": collected.events,
+                "displayTimeUnit": "ms",
+            }))
+            print(f"Chrome trace written to {trace}")
+
+
+def format_bytes(count: int) -> str:
+    """
+    Formats a number of bytes for display, e.g. "1.5 MB".
+    :param count: The number of bytes.
+    :return: str
+    """
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.0f} {unit}" if unit == "B" \
+                else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def print_summary(collected: Session, elapsed: float):
+    """
+    Prints the time, I/O and throughput of every stage.
+    :param collected: The profiling data.
+    :param elapsed: The wall time of the whole run in seconds.
+    """
+    from rich import print
+    from rich.table import Column, Table
+    table = Table(Column("Stage", no_wrap=True), "Calls", "Time (s)",
+                  "Read", "Written", "Files", "MB/s", "Files/s",
+                  title=f"Profile ({elapsed:.2f}s)")
+    for name, stats in sorted(collected.stages.items(),
+                              key=lambda item: -item[1].seconds):
+        seconds = stats.seconds or float("nan")
+        moved = stats.bytes_read + stats.bytes_written
+        table.add_row(
+            name, str(stats.calls), f"{stats.seconds:.3f}",
+            format_bytes(stats.bytes_read), format_bytes(stats.bytes_written),
+            str(stats.files),
+            f"{moved / seconds / (1 << 20):.1f}" if moved else "-",
+            f"{stats.files / seconds:.0f}" if stats.files else "-")
+    print(table)
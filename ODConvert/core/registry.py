@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from importlib import import_module
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from ODConvert.core.dataset import DatasetType
+from ODConvert.utils.detect_type import DirectoryListing
+from ODConvert.utils.detect_type import sniff_coco, sniff_odc, sniff_voc
+from ODConvert.utils.detect_type import sniff_yolo
+
+
+@dataclass(frozen=True)
+class DatasetFormat:
+    """
+    A registered dataset format. The handler and converter are given
+    as "module:attribute" references and only imported when used, so
+    that registering a format costs nothing until it is detected or
+    converted to.
+    """
+    type: DatasetType
+    # Scores how likely a directory holds a dataset of this format,
+    # from the directory entries and the first few KB of candidate
+    # files only
+    sniff: Callable[[DirectoryListing], float]
+    handler: str
+    converter: str | None = None
+
+
+# Registered dataset formats, keyed by their type
+FORMATS: Dict[DatasetType, DatasetFormat] = {}
+
+
+def register_format(format: DatasetFormat):
+    """
+    Registers a dataset format, replacing any format registered for
+    the same type.
+    :param format: The dataset format.
+    """
+    FORMATS[format.type] = format
+
+
+def _resolve(reference: str) -> object:
+    module, _, attribute = reference.partition(":")
+    return getattr(import_module(module), attribute)
+
+
+def get_handler(type: DatasetType) -> Callable:
+    """
+    Imports the dataset handler class of a format.
+    :param type: The dataset type.
+    :return: Callable, the DatasetHandler subclass
+    """
+    if type not in FORMATS:
+        raise KeyError(f"No dataset format is registered for {type}")
+    return _resolve(FORMATS[type].handler)
+
+
+def converter_types() -> List[DatasetType]:
+    """
+    Returns the dataset types that can be converted to.
+    :return: List[DatasetType]
+    """
+    return [type for type, format in FORMATS.items()
+            if format.converter is not None]
+
+
+def get_converter(type: DatasetType) -> Callable:
+    """
+    Imports the converter class of a format.
+    :param type: The dataset type to convert to.
+    :return: Callable, the DatasetConverter subclass
+    """
+    format = FORMATS.get(type)
+    if format is None or format.converter is None:
+        raise KeyError(f"Converting to {type} is not supported")
+    return _resolve(format.converter)
+
+
+def sniff(path: Path) -> List[Tuple[DatasetType, float]]:
+    """
+    Runs the sniffers of all registered formats in parallel against a
+    single, shared listing of the directory.
+    :param path: The dataset directory.
+    :return: List[Tuple[DatasetType, float]] of the formats with a
+    confidence above zero, most likely first
+    """
+    listing = DirectoryListing(path)
+    formats = list(FORMATS.values())
+    with ThreadPoolExecutor(len(formats) or 1) as pool:
+        scores = list(pool.map(
+            lambda format: format.sniff(listing), formats))
+    matches = [(format.type, score)
+               for format, score in zip(formats, scores) if score > 0]
+    return sorted(matches, key=lambda match: -match[1])
+
+
+def detect(path: Path) -> Tuple[DatasetType, float] | None:
+    """
+    Detects the type of the dataset at the given path without reading
+    its annotations or creating its handler.
+    :param path: The dataset directory.
+    :return: Tuple[DatasetType, float] of the most likely type and its
+    confidence, or None if no format matches
+    """
+    matches = sniff(path)
+    return matches[0] if matches else None
+
+
+register_format(DatasetFormat(
+    type=DatasetType.COCO,
+    sniff=sniff_coco,
+    handler="ODConvert.handlers.coco:COCODatasetHandler",
+    converter="ODConvert.converters.coco:COCOConverter",
+))
+register_format(DatasetFormat(
+    type=DatasetType.YOLO,
+    sniff=sniff_yolo,
+    handler="ODConvert.handlers.yolo:YOLODatasetHandler",
+    converter="ODConvert.converters.yolo:YOLOConverter",
+))
+register_format(DatasetFormat(
+    type=DatasetType.VOC,
+    sniff=sniff_voc,
+    handler="ODConvert.handlers.voc:VOCDatasetHandler",
+    converter="ODConvert.converters.voc:VOCConverter",
+))
+register_format(DatasetFormat(
+    type=DatasetType.ODC,
+    sniff=sniff_odc,
+    handler="ODConvert.handlers.odc:ODCDatasetHandler",
+    converter="ODConvert.converters.odc:ODCConverter",
+))
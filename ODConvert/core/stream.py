@@ -0,0 +1,178 @@
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import Dict, Iterable, Iterator, List, TypeVar
+
+from ODConvert.core.dataset import DatasetClass, DatasetImage
+from ODConvert.core.index import PartitionIndex
+from ODConvert.core.table import AnnotationTable
+
+T = TypeVar("T")
+
+
+@dataclass
+class RecordChunk:
+    """
+    A chunk of the images of a partition together with their
+    annotations, the unit conversions are streamed in. Chunks of
+    streamed partitions hold the annotation rows of their own images
+    only, chunks of loaded partitions share the partition table.
+    """
+    images: List[DatasetImage]
+    annotations: AnnotationTable
+    index: PartitionIndex
+
+
+def make_chunk(classes: Iterable[DatasetClass], images: List[DatasetImage],
+               table: AnnotationTable) -> RecordChunk:
+    """
+    Creates a chunk from the images and the annotation table of a
+    chunk, indexing the table by image.
+    :param classes: The classes of the partition.
+    :param images: The images of the chunk.
+    :param table: The annotations of the images.
+    :return: RecordChunk
+    """
+    index = PartitionIndex(
+        classes, {image.id: image for image in images}, lambda: table)
+    return RecordChunk(images=images, annotations=table, index=index)
+
+
+def bounded(items: Iterator[T], depth: int) -> Iterator[T]:
+    """
+    Produces the items of an iterator on a background thread, at most
+    depth items ahead of the consumer. The producer blocks while the
+    queue is full, so that reading a dataset never runs away from
+    writing its conversion, and stops as soon as the consumer does.
+    :param items: The items, e.g. the chunks of a partition.
+    :param depth: The maximum number of produced, unconsumed items.
+    :return: Iterator[T]
+    """
+    queue: Queue = Queue(maxsize=depth)
+    stop = Event()
+    # Marks the end of the items, followed by the error if any
+    end = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as e:
+            put((end, e))
+        finally:
+            # Release what the producing generator holds, e.g.
+            # temporary files, on this thread
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    thread = Thread(target=produce, name="odc-producer", daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item, error = queue.get(timeout=0.1)
+            except Empty:
+                if not thread.is_alive() and queue.empty():
+                    raise RuntimeError("The producer stopped unexpectedly.")
+                continue
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class ChunkSpill:
+    """
+    Groups annotation rows by chunk on disk, for sources whose
+    annotations are not ordered by image. Rows are buffered in memory
+    per chunk and appended to one file per chunk whenever the buffers
+    grow past their limit, so memory use does not grow with the
+    number of annotations.
+    """
+
+    # id, image ID, class ID, iscrowd and the four box values
+    ROW = struct.Struct("<qqqbdddd")
+
+    def __init__(self, directory: Path, buffer_size: int = 16 << 20):
+        """
+        Initialize the ChunkSpill.
+        :param directory: The (temporary) directory the chunk files
+        are written to.
+        :param buffer_size: The number of bytes buffered in memory
+        before the buffers are written out.
+        """
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.__buffers: Dict[int, bytearray] = {}
+        self.__buffered = 0
+
+    def add(self, chunk: int, id: int, image_id: int, class_id: int,
+            iscrowd: int, a: float, b: float, c: float, d: float):
+        """
+        Adds an annotation row to a chunk.
+        """
+        buffer = self.__buffers.get(chunk)
+        if buffer is None:
+            buffer = self.__buffers[chunk] = bytearray()
+        buffer += self.ROW.pack(id, image_id, class_id, iscrowd, a, b, c, d)
+        self.__buffered += self.ROW.size
+        if self.__buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered rows to the chunk files.
+        """
+        for chunk, buffer in self.__buffers.items():
+            with open(self.directory / f"{chunk}.rows", "ab") as f:
+                f.write(buffer)
+        self.__buffers.clear()
+        self.__buffered = 0
+
+    def table(self, chunk: int, classes: Dict[int, DatasetClass],
+              images: Dict[int, DatasetImage]) -> AnnotationTable:
+        """
+        Reads the rows of a chunk into a table and removes them from
+        the spill. The box columns hold the values as they were added.
+        :param chunk: The chunk number.
+        :param classes: The classes of the partition, keyed by ID.
+        :param images: The images of the chunk, keyed by ID.
+        :return: AnnotationTable
+        """
+        path = self.directory / f"{chunk}.rows"
+        data = bytearray()
+        if path.exists():
+            data += path.read_bytes()
+            os.unlink(path)
+        buffer = self.__buffers.pop(chunk, None)
+        if buffer is not None:
+            data += buffer
+            self.__buffered -= len(buffer)
+        table = AnnotationTable(classes, images)
+        columns = (table.ids, table.image_ids, table.class_ids,
+                   table.iscrowd, table.x_center, table.y_center,
+                   table.width, table.height)
+        # Transpose the rows into the columns, one column at a time
+        rows = list(self.ROW.iter_unpack(data))
+        for position, column in enumerate(columns):
+            column.extend(row[position] for row in rows)
+        return table
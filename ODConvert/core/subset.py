@@ -0,0 +1,209 @@
+import hashlib
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from ODConvert.core import profiling
+from ODConvert.core.dataset import DatasetClass, DatasetHandler
+from ODConvert.core.dataset import DatasetImage, DatasetPartition
+from ODConvert.core.stream import RecordChunk, make_chunk
+from ODConvert.core.table import AnnotationTable
+
+
+@dataclass(frozen=True)
+class Subset:
+    """
+    Selects part of a dataset: the boxes of some classes, the images
+    with at least a number of (selected) boxes and a random sample of
+    the images, and assigns new IDs to the selected classes.
+    """
+    # Output class ID of every selected source class ID
+    class_map: Dict[int, int]
+    # The output classes
+    classes: Tuple[DatasetClass, ...]
+    min_boxes: int = 0
+    # Fraction of the images that are kept, None keeps all
+    sample: float | None = None
+    seed: int = 0
+
+    def sampled(self, partition: str, image: DatasetImage) -> bool:
+        """
+        Decides whether an image belongs to the sample. The decision
+        only depends on the seed and the image, so that it is the same
+        however the images are chunked or sharded.
+        :param partition: The name of the partition of the image.
+        :param image: The image.
+        :return: bool
+        """
+        if self.sample is None:
+            return True
+        digest = hashlib.blake2b(
+            f"{self.seed}/{partition}/{image.id}".encode(), digest_size=8)
+        return int.from_bytes(digest.digest(), "little") < \
+            self.sample * (1 << 64)
+
+    def apply(self, partition: str, chunk: RecordChunk) -> RecordChunk:
+        """
+        Selects the images and boxes of a chunk, remapping their class
+        IDs. Excluded boxes are never copied out of the chunk.
+        :param partition: The name of the partition of the chunk.
+        :param chunk: The chunk.
+        :return: RecordChunk, with a table of the selected rows only
+        """
+        table = chunk.annotations
+        index = chunk.index
+        class_ids = table.class_ids
+        images: List[DatasetImage] = []
+        rows = array("q")
+        for image in chunk.images:
+            if not self.sampled(partition, image):
+                continue
+            kept = [row for row in index.rows(image.id)
+                    if class_ids[row] in self.class_map]
+            if len(kept) < self.min_boxes:
+                continue
+            images.append(image)
+            rows.extend(kept)
+        selected = AnnotationTable(
+            {cls.id: cls for cls in self.classes},
+            {image.id: image for image in images})
+        for name, column in table.columns().items():
+            if name == "class_ids":
+                selected.class_ids.extend(
+                    self.class_map[class_ids[row]] for row in rows)
+            else:
+                getattr(selected, name).extend(column[row] for row in rows)
+        return make_chunk(self.classes, images, selected)
+
+
+def _find_class(classes: Dict[int, DatasetClass], key: str | int) \
+        -> DatasetClass:
+    # Classes are given by ID or by name
+    if isinstance(key, int) or str(key).isdigit():
+        cls = classes.get(int(key))
+    else:
+        cls = next((cls for cls in classes.values() if cls.name == key),
+                   None)
+    if cls is None:
+        raise ValueError(f"Unknown class: {key}")
+    return cls
+
+
+def make_subset(classes: Iterable[DatasetClass],
+                keep: Iterable[str | int] | None = None,
+                min_boxes: int = 0,
+                sample: float | None = None,
+                seed: int = 0,
+                remap: str | Dict[str | int, int] | None = None) -> Subset:
+    """
+    Creates a subset of a dataset.
+    :param classes: The classes of the dataset.
+    :param keep: The names or IDs of the classes to keep, None keeps
+    all classes.
+    :param min_boxes: The number of boxes (of the kept classes) an
+    image needs to be kept.
+    :param sample: The fraction of the images to keep, None keeps all.
+    :param seed: Selects a different sample of the same size.
+    :param remap: "compact" to number the kept classes from 0 in the
+    order of their IDs, or the new ID of classes by name or ID. Classes
+    mapped to the same ID are merged under the name of the one with
+    the lowest ID.
+    :return: Subset
+    """
+    every = {cls.id: cls for cls in classes}
+    kept = sorted(
+        every.values() if keep is None else
+        {cls.id: cls for cls in (_find_class(every, key)
+                                 for key in keep)}.values(),
+        key=lambda cls: cls.id)
+    if min_boxes < 0:
+        raise ValueError("The minimum number of boxes cannot be negative")
+    if sample is not None and not 0 < sample <= 1:
+        raise ValueError("The sample must be a fraction between 0 and 1")
+
+    # Assign the output IDs of the kept classes
+    if remap is None:
+        class_map = {cls.id: cls.id for cls in kept}
+    elif remap == "compact":
+        class_map = {cls.id: new for new, cls in enumerate(kept)}
+    elif isinstance(remap, dict):
+        # Classes to remap are looked up among all classes, so that
+        # the mapping can be reused with a different selection
+        mapped = {_find_class(every, key).id: int(new)
+                  for key, new in remap.items()}
+        class_map = {cls.id: mapped.get(cls.id, cls.id) for cls in kept}
+    else:
+        raise ValueError(f"Invalid class remapping: {remap}")
+    output: Dict[int, DatasetClass] = {}
+    for cls in kept:
+        new = class_map[cls.id]
+        if new not in output:
+            output[new] = DatasetClass(id=new, name=cls.name, parent=None)
+    return Subset(
+        class_map=class_map,
+        classes=tuple(sorted(output.values(), key=lambda cls: cls.id)),
+        min_boxes=min_boxes, sample=sample, seed=seed)
+
+
+class SubsetDatasetHandler(DatasetHandler):
+    """
+    A view of a subset of a dataset, see Subset. Its partitions select
+    the images and boxes of the subset chunk by chunk as the dataset is
+    streamed.
+    """
+
+    def __init__(self, dataset: DatasetHandler, subset: Subset):
+        """
+        Initialize the SubsetDatasetHandler.
+        :param dataset: The dataset.
+        :param subset: The subset of the dataset.
+        """
+        self.dataset = dataset
+        self.subset = subset
+        super().__init__(
+            dataset.get_type(), subset.classes,
+            [SubsetDatasetPartition(partition, subset)
+             for partition in dataset.get_partitions()])
+
+
+class SubsetDatasetPartition(DatasetPartition):
+
+    def __init__(self, partition: DatasetPartition, subset: Subset):
+        self.partition = partition
+        self.subset = subset
+        self.name = partition.name
+        self.image_dir = partition.image_dir
+        self.annotation_file = partition.annotation_file
+        self.__selected: RecordChunk | None = None
+
+    def __reduce__(self):
+        return (SubsetDatasetPartition, (self.partition, self.subset))
+
+    def __select(self) -> RecordChunk:
+        # Selects the subset of the whole partition at once
+        if self.__selected is None:
+            partition = self.partition
+            images = partition.get_images()
+            chunk = RecordChunk(
+                images=[images[id] for id in sorted(images)],
+                annotations=partition.get_annotations(),
+                index=partition.get_index())
+            with profiling.stage("subset", partition=self.name):
+                self.__selected = self.subset.apply(self.name, chunk)
+        return self.__selected
+
+    def get_classes(self) -> List[DatasetClass]:
+        return list(self.subset.classes)
+
+    def get_images(self) -> Dict[int, DatasetImage]:
+        return self.__select().index.images
+
+    def get_annotations(self) -> AnnotationTable:
+        return self.__select().annotations
+
+    def iter_chunks(self, size: int = 1024) -> Iterator[RecordChunk]:
+        for chunk in self.partition.iter_chunks(size):
+            with profiling.stage("subset", partition=self.name):
+                chunk = self.subset.apply(self.name, chunk)
+            if chunk.images:
+                yield chunk
@@ -0,0 +1,118 @@
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, Sequence, overload
+
+from ODConvert.core import BoundingBox
+from ODConvert.core.dataset import DatasetAnnotation, DatasetClass
+from ODConvert.core.dataset import DatasetImage
+
+
+class AnnotationTable(Sequence[DatasetAnnotation]):
+    """
+    Columnar store for the annotations of a dataset partition. Every
+    field is kept in a typed array column, DatasetAnnotation objects
+    are only constructed when a row is indexed.
+    """
+
+    def __init__(self,
+                 classes: Dict[int, DatasetClass],
+                 images: Dict[int, DatasetImage]):
+        """
+        Initialize an empty AnnotationTable.
+        :param classes: The classes of the partition, keyed by ID.
+        :param images: The images of the partition, keyed by ID.
+        """
+        self.classes = classes
+        self.images = images
+        # Integer columns
+        self.ids = array("q")
+        self.image_ids = array("q")
+        self.class_ids = array("q")
+        self.iscrowd = array("b")
+        # Bounding box columns
+        self.x_center = array("d")
+        self.y_center = array("d")
+        self.width = array("d")
+        self.height = array("d")
+
+    def append(self, id: int, image_id: int, class_id: int,
+               x_center: float, y_center: float,
+               width: float, height: float, iscrowd: int = 0):
+        """
+        Appends a single annotation row to the table.
+        """
+        self.ids.append(id)
+        self.image_ids.append(image_id)
+        self.class_ids.append(class_id)
+        self.iscrowd.append(iscrowd)
+        self.x_center.append(x_center)
+        self.y_center.append(y_center)
+        self.width.append(width)
+        self.height.append(height)
+
+    def columns(self) -> Dict[str, array]:
+        """
+        Returns the columns of the table keyed by name.
+        :return: Dict[str, array]
+        """
+        return {
+            "ids": self.ids,
+            "image_ids": self.image_ids,
+            "class_ids": self.class_ids,
+            "iscrowd": self.iscrowd,
+            "x_center": self.x_center,
+            "y_center": self.y_center,
+            "width": self.width,
+            "height": self.height,
+        }
+
+    def class_counts(self) -> Dict[int, int]:
+        """
+        Returns the number of annotations per class ID.
+        :return: Dict[int, int]
+        """
+        return dict(Counter(self.class_ids))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @overload
+    def __getitem__(self, index: int) -> DatasetAnnotation: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "AnnotationTable": ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # Slicing returns a new table over copies of the columns
+            table = AnnotationTable(self.classes, self.images)
+            for name, column in self.columns().items():
+                setattr(table, name, column[index])
+            return table
+        # Lookup class by ID
+        cls = self.classes.get(self.class_ids[index])
+        if cls is None:
+            raise ValueError(
+                f"Class with ID {self.class_ids[index]} not found.")
+        # Lookup image by ID
+        img = self.images.get(self.image_ids[index])
+        if img is None:
+            raise ValueError(
+                f"Image with ID {self.image_ids[index]} not found.")
+        # Construct DatasetAnnotation object for the row
+        return DatasetAnnotation(
+            id=self.ids[index],
+            cls=cls,
+            bbox=BoundingBox.from_center(
+                self.x_center[index],
+                self.y_center[index],
+                self.width[index],
+                self.height[index]
+            ),
+            image=img,
+            iscrowd=self.iscrowd[index]
+        )
+
+    def __iter__(self) -> Iterator[DatasetAnnotation]:
+        for index in range(len(self)):
+            yield self[index]
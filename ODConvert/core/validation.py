@@ -0,0 +1,209 @@
+import os
+import stat
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import chain, compress
+from math import sqrt
+from operator import mul
+from typing import Dict, List, Sequence
+
+from ODConvert.core import profiling
+from ODConvert.core.dataset import DatasetPartition
+
+
+# Number of examples kept of every kind of problem
+MAX_EXAMPLES = 10
+# Boxes may extend this many pixels past their image before they count
+# as out of bounds, to allow for rounding
+BOUNDS_TOLERANCE = 0.5
+# Upper edges of the box size histogram bins, in pixels of the square
+# root of the box area
+SIZE_EDGES = (8, 16, 32, 64, 128, 256, 512)
+# Upper edges of the small and medium box areas, as defined by COCO
+AREA_EDGES = (32 ** 2, 96 ** 2)
+AREA_NAMES = ("small", "medium", "large")
+# Number of image paths a worker thread checks at a time
+_BATCH_SIZE = 256
+
+
+@dataclass
+class Findings:
+    """
+    The images or annotations that failed a check: how many, and the
+    first few of them (image paths or annotation IDs).
+    """
+    count: int = 0
+    examples: List = field(default_factory=list)
+
+    def extend(self, items: Sequence):
+        """
+        Adds failed items.
+        :param items: The image paths or annotation IDs.
+        """
+        self.count += len(items)
+        self.examples.extend(items[:MAX_EXAMPLES - len(self.examples)])
+
+
+@dataclass
+class PartitionValidation:
+    # Images whose file does not exist or is not a regular file
+    missing_images: Findings = field(default_factory=Findings)
+    # Annotations of images that are not in the partition
+    orphan_annotations: Findings = field(default_factory=Findings)
+    # Annotations of classes that are not in the dataset
+    unknown_classes: Findings = field(default_factory=Findings)
+    # Boxes without width or height
+    zero_area_boxes: Findings = field(default_factory=Findings)
+    # Boxes extending past their image
+    out_of_bounds_boxes: Findings = field(default_factory=Findings)
+    # Images without known dimensions, whose boxes are not checked
+    # against their bounds
+    unknown_image_sizes: int = 0
+
+    def ok(self) -> bool:
+        """
+        Returns whether the partition passed all checks.
+        :return: bool
+        """
+        return not any((
+            self.missing_images.count, self.orphan_annotations.count,
+            self.unknown_classes.count, self.zero_area_boxes.count,
+            self.out_of_bounds_boxes.count))
+
+
+@dataclass
+class PartitionStats:
+    # Number of boxes per class ID
+    per_class: Dict[int, int]
+    # Number of boxes per size bin, see SIZE_EDGES
+    box_sizes: Dict[str, int]
+    # Number of small, medium and large boxes per class ID
+    box_areas: Dict[int, Dict[str, int]]
+    images_without_annotations: int
+    max_boxes_per_image: int
+
+
+def _size_labels() -> List[str]:
+    labels = [f"<{SIZE_EDGES[0]}"]
+    labels += [f"{a}-{b}" for a, b in zip(SIZE_EDGES, SIZE_EDGES[1:])]
+    labels.append(f">={SIZE_EDGES[-1]}")
+    return labels
+
+
+def missing_files(paths: Sequence[str], workers: int | None = None) \
+        -> List[str]:
+    """
+    Returns the paths that are not regular files, checking them with
+    stat on a pool of worker threads.
+    :param paths: The file paths.
+    :param workers: The number of worker threads, defaults to the
+    ThreadPoolExecutor default.
+    :return: List[str] in the order of paths
+    """
+
+    def check(batch: Sequence[str]) -> List[str]:
+        missing = []
+        for path in batch:
+            try:
+                if not stat.S_ISREG(os.stat(path).st_mode):
+                    missing.append(path)
+            except OSError:
+                missing.append(path)
+        return missing
+
+    batches = [paths[i:i + _BATCH_SIZE]
+               for i in range(0, len(paths), _BATCH_SIZE)]
+    with ThreadPoolExecutor(workers) as pool:
+        missing = list(chain.from_iterable(pool.map(check, batches)))
+    profiling.add_io(files=len(paths))
+    return missing
+
+
+def validate_partition(partition: DatasetPartition,
+                       class_ids: Sequence[int],
+                       workers: int | None = None) -> PartitionValidation:
+    """
+    Checks the images and annotations of a partition. Every check is a
+    single pass over the columns of the annotation table.
+    :param partition: The partition.
+    :param class_ids: The class IDs of the dataset.
+    :param workers: The number of threads image files are checked on.
+    :return: PartitionValidation
+    """
+    report = PartitionValidation()
+    images = partition.get_images()
+    table = partition.get_annotations()
+    ids = table.ids
+
+    with profiling.stage("validate.files", partition=partition.name):
+        report.missing_images.extend(missing_files(
+            [str(image.path) for image in images.values()], workers))
+
+    with profiling.stage("validate.boxes", partition=partition.name):
+        # Annotations of unknown images and classes
+        known = set(class_ids)
+        report.orphan_annotations.extend(list(compress(
+            ids, (image_id not in images for image_id in table.image_ids))))
+        report.unknown_classes.extend(list(compress(
+            ids, (class_id not in known for class_id in table.class_ids))))
+        # Boxes without area
+        report.zero_area_boxes.extend(list(compress(
+            ids, (w <= 0 or h <= 0
+                  for w, h in zip(table.width, table.height)))))
+
+        # Boxes past the bounds of their image, where it is known
+        sizes = {
+            image.id: (image.width + BOUNDS_TOLERANCE,
+                       image.height + BOUNDS_TOLERANCE)
+            for image in images.values()
+            if image.width is not None and image.height is not None
+        }
+        report.unknown_image_sizes = len(images) - len(sizes)
+        unbounded = (float("inf"), float("inf"))
+        report.out_of_bounds_boxes.extend(list(compress(ids, (
+            2 * x - w < -2 * BOUNDS_TOLERANCE
+            or 2 * y - h < -2 * BOUNDS_TOLERANCE
+            or 2 * x + w > 2 * size[0] or 2 * y + h > 2 * size[1]
+            for x, y, w, h, size in zip(
+                table.x_center, table.y_center, table.width, table.height,
+                (sizes.get(id, unbounded) for id in table.image_ids))))))
+    return report
+
+
+def partition_stats(partition: DatasetPartition) -> PartitionStats:
+    """
+    Computes the box statistics of a partition, aggregating the columns
+    of the annotation table.
+    :param partition: The partition.
+    :return: PartitionStats
+    """
+    images = partition.get_images()
+    table = partition.get_annotations()
+    with profiling.stage("stats", partition=partition.name):
+        areas = list(map(mul, table.width, table.height))
+        # Box sizes as the square root of their area
+        labels = _size_labels()
+        sizes = Counter(map(partial(bisect_right, SIZE_EDGES),
+                            map(sqrt, map(abs, areas))))
+        # Small, medium and large boxes per class
+        by_area = Counter(zip(
+            table.class_ids,
+            map(partial(bisect_right, AREA_EDGES), areas)))
+        box_areas: Dict[int, Dict[str, int]] = {}
+        for (class_id, area), count in sorted(by_area.items()):
+            box_areas.setdefault(
+                class_id, dict.fromkeys(AREA_NAMES, 0)
+            )[AREA_NAMES[area]] = count
+        per_image = Counter(table.image_ids)
+        return PartitionStats(
+            per_class=dict(sorted(Counter(table.class_ids).items())),
+            box_sizes={label: sizes.get(bin, 0)
+                       for bin, label in enumerate(labels)},
+            box_areas=box_areas,
+            images_without_annotations=sum(
+                1 for id in images if id not in per_image),
+            max_boxes_per_image=max(per_image.values(), default=0)
+        )
@@ -1,2 +1,24 @@
-# Import COCO dataset handler and partition classes
-from ODConvert.handlers.coco import COCODatasetHandler, COCODatasetPartition
+from ODConvert.utils.lazy import lazy_exports
+
+# Handlers are imported on first use, so that reading one dataset type
+# does not import the others
+__all__ = [
+    # COCO dataset handler and partition classes
+    "COCODatasetHandler", "COCODatasetPartition",
+    # YOLO dataset handler and partition classes
+    "YOLODatasetHandler", "YOLODatasetPartition",
+    # VOC dataset handler and partition classes
+    "VOCDatasetHandler", "VOCDatasetPartition",
+    # ODC dataset handler and partition classes
+    "ODCDatasetHandler", "ODCDatasetPartition",
+]
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "COCODatasetHandler": "ODConvert.handlers.coco",
+    "COCODatasetPartition": "ODConvert.handlers.coco",
+    "YOLODatasetHandler": "ODConvert.handlers.yolo",
+    "YOLODatasetPartition": "ODConvert.handlers.yolo",
+    "VOCDatasetHandler": "ODConvert.handlers.voc",
+    "VOCDatasetPartition": "ODConvert.handlers.voc",
+    "ODCDatasetHandler": "ODConvert.handlers.odc",
+    "ODCDatasetPartition": "ODConvert.handlers.odc",
+})
@@ -1,29 +1,45 @@
 from pathlib import Path
 from ODConvert.core import DatasetPartition, DatasetAnnotation, DatasetClass
 from ODConvert.core import DatasetImage, BoundingBox, DatasetHandler
-from ODConvert.core import DatasetType
+from ODConvert.core import DatasetType, AnnotationTable
+from ODConvert.core import BoxFormat, PartitionCounts, convert_boxes
+from ODConvert.core import profiling
+from ODConvert.core.cache import PartitionCache
+from ODConvert.core.stream import ChunkSpill, RecordChunk, make_chunk
 import json
-from typing import List
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from tempfile import TemporaryDirectory
+from typing import Dict, Iterator, List, Tuple
 from uuid import uuid4
 
+from ODConvert.utils.jsonstream import iter_json_items
+
 
 class COCODatasetHandler(DatasetHandler):
 
-    def __init__(self, dir: Path):
+    def __init__(self, dir: Path, stream: bool = True,
+                 cache: PartitionCache | None = None,
+                 strict: bool = True):
         # Initialise the dataset partition
         self.dir = dir
+        # Stream annotation files instead of loading them eagerly
+        self.stream = stream
+        # Cache of previously parsed annotation files
+        self.cache = cache
+        # Reject annotations of unknown classes or images, instead of
+        # keeping them for validation
+        self.strict = strict
         # Find all partitions in the dataset
         partitions = self.__find_partitions()
         # Check the first partition for classes
         if not partitions:
             raise ValueError("No partitions found in the dataset.")
-        # Check if the first partition has classes
-        classes = partitions[0].get_classes()
-        if classes is None:
-            raise ValueError("No classes found in the dataset.")
-        # Initialise the DatasetHandler with the classes and partitions
-        # from the first partition
-        super().__init__(DatasetType.COCO, classes, partitions)
+        # Initialise the DatasetHandler with the partitions, classes
+        # are read from the first partition once they are needed
+        super().__init__(
+            DatasetType.COCO, partitions[0].get_classes, partitions)
 
     def __find_partitions(self):
         partitions: List[DatasetPartition] = []
@@ -42,7 +58,10 @@ class COCODatasetHandler(DatasetHandler):
                     partitions.append(COCODatasetPartition(
                         name=name,
                         image_dir=self.dir / "images",
-                        annotation_file=item
+                        annotation_file=item,
+                        stream=self.stream,
+                        cache=self.cache,
+                        strict=self.strict
                     ))
         # TODO: Add support for occurences where annotations
         # are stored with images in the partition directories.
@@ -67,104 +86,384 @@ class COCODatasetHandler(DatasetHandler):
 
 class COCODatasetPartition(DatasetPartition):
 
-    def __init__(self, name, image_dir: Path, annotation_file: Path):
+    def __init__(self, name, image_dir: Path, annotation_file: Path,
+                 stream: bool = True, cache: PartitionCache | None = None,
+                 strict: bool = True):
         self.name = name
         self.image_dir = image_dir
         self.annotation_file = annotation_file
-        # Load the annotation file and parse it as JSON
-        self.raw = json.loads(open(annotation_file, "r").read())
-        # Load classes, images and annotations into memory
-        self.__classes = self.get_classes()
-        self.__images = self.get_images()
-        self.__annotations = self.get_annotations()
-
-    def get_class(self, id: int) -> DatasetClass | None:
-        """
-        Get a class by its ID.
-        :param id: The ID of the class.
-        :return: DatasetClass object
-        """
-        # Load classes if not already loaded
-        if self.__classes is None:
-            self.__classes = self.get_classes()
-        # Search for the class with the given ID
-        for cls in self.__classes:
-            if cls.id == id:
-                return cls
-        # If not found, return None
-        return None
-
-    def get_classes(self):
-        # Check if classes are already loaded
-        # and return them if so
-        if getattr(self, "__classes", None) is not None:
-            return self.__classes
-
-        return [
-            # Construct DatasetClass object
-            DatasetClass(
-                id=category["id"],
-                name=category["name"],
-                parent=None
-            )
-            # for all categories in the raw data
-            for category in self.raw["categories"]]
+        self.stream = stream
+        self.cache = cache
+        self.strict = strict
+        # Whether annotations of unknown classes or images were kept
+        self.__lenient = False
+        # Nothing is read until the data of the partition is requested
+        self.raw = None
+        self.__classes: List[DatasetClass] | None = None
+        self.__images: Dict[int, DatasetImage] | None = None
+        self.__annotations: AnnotationTable | None = None
+        self.__cache_checked = False
 
-    def get_images(self):
-        # Check if images are already loaded,
-        # and return them if so
-        if getattr(self, "__images", None) is not None:
-            print("DBG: Using cached images")
-            return self.__images
-
-        return {
-            image["id"]: DatasetImage(
-                id=image["id"],
-                path=self.image_dir / image["file_name"],
+    def __reduce__(self):
+        # Only the location of the partition is sent to worker
+        # processes, which load it themselves (from the cache if any)
+        return (COCODatasetPartition, (
+            self.name, self.image_dir, self.annotation_file,
+            self.stream, self.cache, self.strict))
+
+    def __load_cached(self) -> bool:
+        """
+        Loads the partition from the cache, checking it only once.
+        :return: bool, True if the partition was loaded from the cache
+        """
+        if self.__cache_checked or self.cache is None:
+            return False
+        self.__cache_checked = True
+        with profiling.stage("load.cache", partition=self.name):
+            cached = self.cache.load(self.annotation_file)
+        if cached is None:
+            return False
+        self.__classes, self.__images, self.__annotations = cached
+        return True
+
+    def __load_metadata(self):
+        """
+        Loads the classes and images of the partition if they are not
+        loaded yet. Eager partitions load their annotations as well.
+        """
+        if self.__images is not None or self.__load_cached():
+            return
+        if self.stream:
+            # Stream only the categories and images sections of the
+            # annotation file, annotations are read when needed
+            with profiling.stage("load.metadata", partition=self.name):
+                self.__classes, self.__images = self.__scan_metadata()
+                self.__count_read()
+            return
+        with profiling.stage("load.eager", partition=self.name):
+            # Load the annotation file and parse it as JSON
+            self.raw = json.loads(open(self.annotation_file, "r").read())
+            self.__count_read()
+            # Load classes, images and annotations into memory
+            self.__classes = [
+                self.__construct_class(category)
+                for category in self.raw["categories"]
+            ]
+            self.__images = {
+                image["id"]: self.__construct_image(image)
+                for image in self.raw["images"]
+            }
+            self.__annotations = self.__build_table(
+                self.raw["annotations"])
+        self.__store()
+
+    def __count_read(self):
+        """
+        Counts a full read of the annotation file while profiling.
+        """
+        if profiling.enabled():
+            profiling.add_io(
+                read=self.annotation_file.stat().st_size, files=1)
+
+    def __store(self):
+        """
+        Stores the parsed partition in the cache, if there is one.
+        """
+        # Tables with annotations of unknown classes or images are
+        # not cached, as strict readers would have rejected them
+        if self.cache is not None and not self.__lenient:
+            with profiling.stage("cache.store", partition=self.name):
+                try:
+                    self.cache.store(self.annotation_file, self.__classes,
+                                     self.__images, self.__annotations)
+                except (OSError, TypeError, ValueError, OverflowError):
+                    # A partition that cannot be cached is still loaded,
+                    # it is parsed again next time
+                    pass
+
+    def __scan_metadata(self) -> Tuple[List[DatasetClass],
+                                       Dict[int, DatasetImage]]:
+        """
+        Streams the categories and images of the annotation file
+        without reading its annotations into memory.
+        :return: Tuple[List[DatasetClass], Dict[int, DatasetImage]]
+        """
+        classes: List[DatasetClass] = []
+        images: Dict[int, DatasetImage] = {}
+        for key, item in iter_json_items(
+                self.annotation_file, ("categories", "images")):
+            if key == "categories":
+                classes.append(self.__construct_class(item))
+            else:
+                images[item["id"]] = self.__construct_image(item)
+        return classes, images
+
+    def __construct_class(self, category) -> DatasetClass:
+        # Construct DatasetClass object
+        return DatasetClass(
+            id=category["id"],
+            name=category["name"],
+            parent=None
+        )
+
+    def __construct_image(self, image) -> DatasetImage:
+        # Construct DatasetImage object
+        return DatasetImage(
+            id=image["id"],
+            path=self.image_dir / image["file_name"],
+            width=image.get("width"),
+            height=image.get("height")
+        )
+
+    def __construct_annotation(self, annotation) -> DatasetAnnotation:
+        # Lookup class by ID
+        cls = self.get_class(annotation["category_id"])
+        if cls is None:
+            raise ValueError(
+                f"Class with ID {annotation['category_id']} not found.")
+        # Lookup image by ID
+        img = self.get_image(annotation["image_id"])
+        if img is None:
+            raise ValueError(
+                f"Image with ID {annotation['image_id']} not found."
             )
-            for image in self.raw["images"]
-        }
+        # Construct BoundingBox object from the COCO top left
+        # corner, width and height
+        x_min, y_min, width, height = annotation["bbox"]
+        bbox = BoundingBox.from_min_max(
+            x_min, y_min, x_min + width, y_min + height)
+        # Construct DatasetAnnotation object
+        return DatasetAnnotation(
+            id=annotation["id"],
+            cls=cls,
+            bbox=bbox,
+            image=img,
+            iscrowd=annotation.get("iscrowd", 0)
+        )
 
-    def get_image(self, id: int):
-        return self.__images[id]
+    def get_classes(self) -> List[DatasetClass]:
+        if self.__classes is None and not self.__load_cached():
+            if self.stream:
+                # Only the categories are needed, skip everything else
+                with profiling.stage("load.classes", partition=self.name):
+                    self.__classes = [
+                        self.__construct_class(category)
+                        for _, category in iter_json_items(
+                            self.annotation_file, ("categories",))
+                    ]
+            else:
+                self.__load_metadata()
+        return self.__classes
 
-    def get_annotations(self):
+    def get_images(self) -> Dict[int, DatasetImage]:
+        self.__load_metadata()
+        return self.__images
+
+    def get_annotations(self) -> AnnotationTable:
+        self.__load_metadata()
         # Check if annotations are already loaded,
         # and return them if so
-        if getattr(self, "__annotations", None) is not None:
-            return self.__annotations
-
-        def construct_annotation(annotation):
-            # Lookup class by ID
-            cls = self.get_class(annotation["category_id"])
-            if cls is None:
-                raise ValueError(
-                    f"Class with ID {annotation['category_id']} not found.")
-            # Lookup image by ID
-            img = self.get_image(annotation["image_id"])
-            if img is None:
-                raise ValueError(
-                    f"Image with ID {annotation['image_id']} not found."
-                )
-            # Construct BoundingBox object
-            bbox = BoundingBox.from_center(
-                annotation["bbox"][0],
-                annotation["bbox"][1],
-                annotation["bbox"][2],
-                annotation["bbox"][3]
-            )
-            # Construct DatasetAnnotation object
-            return DatasetAnnotation(
-                id=annotation["id"],
-                cls=cls,
-                bbox=bbox,
-                image=img,
-                iscrowd=0
-            )
+        if self.__annotations is None:
+            # Streamed partitions read the annotations from disk
+            # straight into the table and keep it, as it is compact
+            with profiling.stage("load.annotations", partition=self.name):
+                self.__annotations = self.__build_table(
+                    annotation for _, annotation in iter_json_items(
+                        self.annotation_file, ("annotations",)))
+                self.__count_read()
+            self.__store()
+        return self.__annotations
+
+    def counts(self) -> PartitionCounts:
+        """
+        Returns the image, annotation and per class annotation counts
+        of the partition. Unless the annotations are already loaded or
+        cached, they are counted in a single streaming pass over the
+        annotation file that keeps no objects around. With a cache, the
+        pass loads the partition instead and stores it, so that later
+        counts are read from the cache.
+        :return: PartitionCounts
+        """
+        if self.__annotations is not None or self.__load_cached():
+            return super().counts()
+        if self.cache is not None:
+            if self.stream and self.__images is None:
+                self.__scan_partition()
+            else:
+                self.get_annotations()
+            return super().counts()
+        images = 0
+        annotations = 0
+        per_class: Counter = Counter()
+        with profiling.stage("load.counts", partition=self.name):
+            for key, item in iter_json_items(
+                    self.annotation_file, ("images", "annotations")):
+                if key == "images":
+                    images += 1
+                else:
+                    annotations += 1
+                    per_class[item["category_id"]] += 1
+            self.__count_read()
+        return PartitionCounts(
+            images=images,
+            annotations=annotations,
+            per_class=dict(per_class)
+        )
 
-        return [
-            # Construct DatasetAnnotation object
-            construct_annotation(annotation)
-            # for all annotations in the raw data
-            for annotation in self.raw["annotations"]
-        ]
+    def __scan_partition(self):
+        """
+        Loads the classes, images and annotations of the partition in
+        a single streaming pass over the annotation file, and stores
+        the partition in the cache.
+        """
+        classes: Dict[int, DatasetClass] = {}
+        images: Dict[int, DatasetImage] = {}
+        table = AnnotationTable(classes, images)
+        with profiling.stage("load.partition", partition=self.name):
+            for key, item in iter_json_items(
+                    self.annotation_file,
+                    ("categories", "images", "annotations")):
+                if key == "categories":
+                    cls = self.__construct_class(item)
+                    classes[cls.id] = cls
+                elif key == "images":
+                    images[item["id"]] = self.__construct_image(item)
+                else:
+                    self.__append(table, item)
+            self.__count_read()
+            # The sections may come in any order, so the annotations
+            # are checked once all classes and images are known
+            self.__classes = list(classes.values())
+            self.__images = images
+            self.__annotations = self.__finish_table(table)
+        self.__store()
+
+    def __append(self, table: AnnotationTable, annotation):
+        # Appends a raw COCO annotation with its COCO box
+        bbox = annotation["bbox"]
+        table.append(
+            annotation["id"],
+            annotation["image_id"],
+            annotation["category_id"],
+            bbox[0], bbox[1], bbox[2], bbox[3],
+            annotation.get("iscrowd", 0)
+        )
+
+    def __build_table(self, annotations) -> AnnotationTable:
+        """
+        Fills an AnnotationTable from raw COCO annotation dicts.
+        :param annotations: Iterable of raw COCO annotations.
+        :return: AnnotationTable
+        """
+        index = self.get_index()
+        table = AnnotationTable(index.classes, index.images)
+        for annotation in annotations:
+            self.__append(table, annotation)
+        return self.__finish_table(table)
+
+    def __finish_table(self, table: AnnotationTable) -> AnnotationTable:
+        """
+        Checks the annotations of a filled table against its classes
+        and images, and converts its COCO boxes to centers.
+        :param table: The table, with COCO boxes.
+        :return: AnnotationTable
+        """
+        # Reject annotations pointing to unknown classes or images
+        for class_id in table.class_ids:
+            if class_id not in table.classes:
+                if self.strict:
+                    raise ValueError(f"Class with ID {class_id} not found.")
+                self.__lenient = True
+                break
+        for image_id in table.image_ids:
+            if image_id not in table.images:
+                if self.strict:
+                    raise ValueError(f"Image with ID {image_id} not found.")
+                self.__lenient = True
+                break
+        # The bbox columns hold COCO top left corner, width and height
+        # values so far, convert them to centers in one batch
+        (table.x_center, table.y_center, table.width, table.height), _ = \
+            convert_boxes(
+                (table.x_center, table.y_center, table.width, table.height),
+                BoxFormat.XYWH, BoxFormat.CXCYWH)
+        return table
+
+    def iter_chunks(self, size: int = 1024) -> Iterator[RecordChunk]:
+        """
+        Yields the images of the partition in chunks together with
+        their annotations. Streamed partitions read the annotations in
+        one pass, grouping them by chunk on disk (COCO annotations are
+        not ordered by image), instead of loading them into memory.
+        With a cache, the chunk tables are collected and stored once
+        the partition has been streamed completely.
+        :param size: The maximum number of images per chunk.
+        :return: Iterator[RecordChunk]
+        """
+        self.__load_metadata()
+        if not self.stream or self.__annotations is not None:
+            yield from super().iter_chunks(size)
+            return
+        index = self.get_index()
+        ids = array("q", sorted(self.__images))
+        cached = AnnotationTable(index.classes, self.__images) \
+            if self.cache is not None else None
+        with TemporaryDirectory(prefix="odc-chunks-") as directory:
+            spill = ChunkSpill(Path(directory))
+            with profiling.stage("load.spill", partition=self.name):
+                for _, annotation in iter_json_items(
+                        self.annotation_file, ("annotations",)):
+                    image_id = annotation["image_id"]
+                    # Reject annotations pointing to unknown classes
+                    # or images
+                    if annotation["category_id"] not in index.classes:
+                        raise ValueError(
+                            f"Class with ID {annotation['category_id']} "
+                            f"not found.")
+                    if image_id not in self.__images:
+                        raise ValueError(
+                            f"Image with ID {image_id} not found.")
+                    spill.add(bisect_left(ids, image_id) // size,
+                              annotation["id"], image_id,
+                              annotation["category_id"],
+                              annotation.get("iscrowd", 0),
+                              *annotation["bbox"])
+                spill.flush()
+                self.__count_read()
+            for number, start in enumerate(range(0, len(ids), size)):
+                images = [self.__images[id]
+                          for id in ids[start:start + size]]
+                table = spill.table(number, index.classes,
+                                    {image.id: image for image in images})
+                # The box columns hold COCO top left corners, widths
+                # and heights, convert them to centers in one batch
+                (table.x_center, table.y_center,
+                 table.width, table.height), _ = convert_boxes(
+                    (table.x_center, table.y_center,
+                     table.width, table.height),
+                    BoxFormat.XYWH, BoxFormat.CXCYWH)
+                yield make_chunk(index.classes.values(), images, table)
+                if cached is not None:
+                    for name, column in table.columns().items():
+                        getattr(cached, name).extend(column)
+        if cached is not None:
+            self.__annotations = cached
+            self.__store()
+
+    def iter_annotations(self) -> Iterator[DatasetAnnotation]:
+        """
+        Yields the annotations of the partition one at a time. Streamed
+        partitions read them from the annotation file unless the table
+        has already been loaded.
+        :return: Iterator[DatasetAnnotation]
+        """
+        if self.__annotations is not None:
+            yield from self.__annotations
+            return
+        self.__load_metadata()
+        if self.__annotations is not None:
+            yield from self.__annotations
+            return
+        for _, annotation in iter_json_items(
+                self.annotation_file, ("annotations",)):
+            yield self.__construct_annotation(annotation)
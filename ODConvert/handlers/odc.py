@@ -0,0 +1,125 @@
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+
+from ODConvert.core import AnnotationTable, DatasetClass, DatasetHandler
+from ODConvert.core import DatasetImage, DatasetPartition, DatasetType
+from ODConvert.core import PartitionCounts, profiling
+from ODConvert.core.odc import BOX_COLUMNS, COLUMNS
+from ODConvert.core.odc import StringTable, column_file, map_column
+from ODConvert.core.odc import read_manifest
+from ODConvert.core.stream import RecordChunk, make_chunk
+
+
+class ODCDatasetHandler(DatasetHandler):
+
+    def __init__(self, dir: Path, stream: bool = True, cache=None,
+                 processes: int | None = None, strict: bool = True):
+        # ODC datasets are always mapped, the streaming, cache, process
+        # and strict options of the other handlers do not apply
+        self.dir = dir
+        manifest = read_manifest(dir)
+        partitions: List[DatasetPartition] = [
+            ODCDatasetPartition(name=name, directory=dir / name)
+            for name in manifest["partitions"]
+        ]
+        if not partitions:
+            raise ValueError("No partitions found in the dataset.")
+        super().__init__(
+            DatasetType.ODC, partitions[0].get_classes, partitions)
+
+
+class ODCDatasetPartition(DatasetPartition):
+
+    def __init__(self, name: str, directory: Path):
+        self.name = name
+        self.directory = directory
+        self.image_dir = directory
+        self.annotation_file = directory / column_file("boxes.id", "q")
+        # Columns are mapped when they are first needed
+        self.__columns: Dict[str, Sequence] = {}
+        self.__paths: StringTable | None = None
+        self.__classes: List[DatasetClass] | None = None
+        self.__images: Dict[int, DatasetImage] | None = None
+        self.__annotations: AnnotationTable | None = None
+
+    def __reduce__(self):
+        # Worker processes map the same files, sharing their pages
+        return (ODCDatasetPartition, (self.name, self.directory))
+
+    def __column(self, name: str) -> Sequence:
+        column = self.__columns.get(name)
+        if column is None:
+            typecode = COLUMNS[name]
+            column = self.__columns[name] = map_column(
+                self.directory / column_file(name, typecode), typecode)
+        return column
+
+    def __image(self, position: int) -> DatasetImage:
+        if self.__paths is None:
+            self.__paths = StringTable(self.directory, "images.path")
+        width = self.__column("images.width")[position]
+        height = self.__column("images.height")[position]
+        return DatasetImage(
+            id=self.__column("images.id")[position],
+            path=Path(self.__paths[position]),
+            width=width if width >= 0 else None,
+            height=height if height >= 0 else None
+        )
+
+    def __table(self, images: Dict[int, DatasetImage],
+                start: int = 0, stop: int | None = None) -> AnnotationTable:
+        # The table columns are views of the mapped columns, so that
+        # neither the table nor its slices copy any rows
+        table = AnnotationTable(
+            {cls.id: cls for cls in self.get_classes()}, images)
+        for name, column in BOX_COLUMNS.items():
+            setattr(table, name, self.__column(column)[start:stop])
+        return table
+
+    def get_classes(self) -> List[DatasetClass]:
+        if self.__classes is None:
+            root = self.directory.parent
+            ids = map_column(root / column_file("classes.id", "q"), "q")
+            names = StringTable(root, "classes.name")
+            self.__classes = [DatasetClass(id=id, name=name, parent=None)
+                              for id, name in zip(ids, names)]
+        return self.__classes
+
+    def get_images(self) -> Dict[int, DatasetImage]:
+        if self.__images is None:
+            with profiling.stage("load.images", partition=self.name):
+                self.__images = {
+                    image.id: image for image in map(
+                        self.__image,
+                        range(len(self.__column("images.id"))))
+                }
+        return self.__images
+
+    def get_annotations(self) -> AnnotationTable:
+        if self.__annotations is None:
+            self.__annotations = self.__table(self.get_images())
+        return self.__annotations
+
+    def counts(self) -> PartitionCounts:
+        # Counting only reads the ID columns
+        class_ids = self.__column(BOX_COLUMNS["class_ids"])
+        return PartitionCounts(
+            images=len(self.__column("images.id")),
+            annotations=len(class_ids),
+            per_class=dict(Counter(class_ids))
+        )
+
+    def iter_chunks(self, size: int = 1024) -> Iterator[RecordChunk]:
+        # Images are stored in image ID order with the rows of their
+        # boxes, so a chunk is a slice of the columns. Only the images
+        # of the current chunk are constructed
+        ends = self.__column("images.rows")
+        for start in range(0, len(ends), size):
+            stop = min(start + size, len(ends))
+            images = [self.__image(position)
+                      for position in range(start, stop)]
+            table = self.__table(
+                {image.id: image for image in images},
+                ends[start - 1] if start else 0, ends[stop - 1])
+            yield make_chunk(self.get_classes(), images, table)
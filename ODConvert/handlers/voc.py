@@ -0,0 +1,365 @@
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import parent_process
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Set, Tuple
+from xml.etree.ElementTree import XMLPullParser
+
+from ODConvert.core import DatasetPartition, DatasetClass, DatasetImage
+from ODConvert.core import DatasetHandler, DatasetType, AnnotationTable
+from ODConvert.core import BoxFormat, convert_boxes
+from ODConvert.core import profiling
+from ODConvert.core.cache import PartitionCache
+
+
+def _parse_annotation(path: str, names: Dict[str, int], name_ids: array,
+                      difficult: array,
+                      columns: Tuple[array, array, array, array]
+                      ) -> Tuple[str | None, int, int, int, int]:
+    """
+    Parses a VOC annotation file with a pull parser, appending its
+    objects to the given columns. The file is fed to the parser in a
+    single read, which avoids the per event overhead of iterparse.
+    :param path: The annotation file.
+    :param names: The class names seen so far, mapped to their index,
+    new names are added.
+    :param name_ids: The class name index column to append to.
+    :param difficult: The difficult flag column to append to.
+    :param columns: The x_min, y_min, x_max and y_max columns to
+    append to.
+    :return: Tuple of the image file name, width, height, the number
+    of objects and the size of the file
+    """
+    filename = None
+    width = height = -1
+    count = 0
+    # Annotation files are small, so the whole file is parsed before
+    # the end events of its elements are read, which are complete
+    parser = XMLPullParser(events=("end",))
+    with open(path, "rb") as f:
+        data = f.read()
+    parser.feed(data)
+    parser.close()
+    for _, element in parser.read_events():
+        tag = element.tag
+        if tag == "object":
+            box = element.find("bndbox")
+            name = element.findtext("name")
+            if box is None or name is None:
+                raise ValueError(f"Incomplete object in {path}.")
+            name_ids.append(names.setdefault(name.strip(), len(names)))
+            difficult.append(int(element.findtext("difficult") or 0))
+            for column, key in zip(columns,
+                                   ("xmin", "ymin", "xmax", "ymax")):
+                column.append(float(box.findtext(key)))
+            count += 1
+        elif tag == "filename":
+            filename = (element.text or "").strip() or None
+        elif tag == "size":
+            width = int(float(element.findtext("width") or -1))
+            height = int(float(element.findtext("height") or -1))
+    return filename, width, height, count, len(data)
+
+
+def _read_batch(batch: Sequence[str]) -> tuple:
+    """
+    Parses a batch of VOC annotation files in a worker process.
+    :param batch: The annotation files.
+    :return: tuple of the number of bytes read, the class names and
+    the file names, widths, heights and object counts per image,
+    followed by the class name index, difficult flag and absolute box
+    center and size columns of all objects
+    """
+    read = 0
+    names: Dict[str, int] = {}
+    filenames: List[str | None] = []
+    widths = array("q")
+    heights = array("q")
+    counts = array("q")
+    name_ids = array("q")
+    difficult = array("b")
+    columns = (array("d"), array("d"), array("d"), array("d"))
+    for path in batch:
+        filename, width, height, count, size = _parse_annotation(
+            path, names, name_ids, difficult, columns)
+        read += size
+        if filename is None:
+            # Fall back to the JPEG named after the annotation file
+            filename = os.path.splitext(os.path.basename(path))[0] + ".jpg"
+        filenames.append(filename)
+        widths.append(width)
+        heights.append(height)
+        counts.append(count)
+    # Convert all boxes of the batch at once
+    columns, _ = convert_boxes(columns, BoxFormat.XYXY, BoxFormat.CXCYWH)
+    return (read, list(names), filenames, widths, heights, counts,
+            name_ids, difficult) + tuple(columns)
+
+
+class VOCDatasetHandler(DatasetHandler):
+
+    def __init__(self, dir: Path, stream: bool = True,
+                 cache: PartitionCache | None = None,
+                 processes: int | None = None,
+                 strict: bool = True):
+        """
+        Initialize the VOCDatasetHandler. VOC datasets keep one XML
+        annotation file per image in Annotations, the images in
+        JPEGImages and the image lists of their partitions in
+        ImageSets/Main.
+        :param dir: The dataset directory.
+        :param stream: Unused, VOC annotations are always read per file.
+        :param cache: Unused, VOC annotations are always read per file.
+        :param processes: The number of processes annotation files
+        are parsed on, defaults to the number of CPUs.
+        :param strict: Unused, VOC classes are the names used in the
+        annotations.
+        """
+        self.dir = dir
+        self.processes = processes
+        # Class IDs are assigned in class name order once the names
+        # used by all partitions are known
+        self.class_ids: Dict[str, int] | None = None
+        partitions = self.__find_partitions()
+        if not partitions:
+            raise ValueError("No partitions found in the dataset.")
+        super().__init__(DatasetType.VOC, self.__load_classes, partitions)
+
+    def __find_partitions(self) -> List[DatasetPartition]:
+        partitions: List[DatasetPartition] = []
+        sets_dir = self.dir / "ImageSets" / "Main"
+        sets: Dict[str, Path] = {}
+        if sets_dir.is_dir():
+            with os.scandir(sets_dir) as entries:
+                for entry in entries:
+                    stem, suffix = os.path.splitext(entry.name)
+                    if suffix == ".txt" and entry.is_file():
+                        sets[stem] = Path(entry.path)
+        # Skip the per class lists (e.g. cat_train.txt) and the union
+        # of the train and val lists
+        for name in list(sets):
+            if name.rsplit("_", 1)[-1] in sets and "_" in name:
+                del sets[name]
+        if "trainval" in sets and "train" in sets and "val" in sets:
+            del sets["trainval"]
+        for name in sorted(sets):
+            partitions.append(self.__partition(name, sets[name]))
+        # Datasets without image lists form a single partition of
+        # all annotation files
+        if not partitions and (self.dir / "Annotations").is_dir():
+            partitions.append(self.__partition("default", None))
+        return partitions
+
+    def __partition(self, name: str, image_set: Path | None
+                    ) -> "VOCDatasetPartition":
+        partition = VOCDatasetPartition(
+            name=name,
+            image_dir=self.dir / "JPEGImages",
+            annotation_dir=self.dir / "Annotations",
+            image_set=image_set,
+            processes=self.processes
+        )
+        partition.resolve_class_ids = self.__resolve_class_ids
+        return partition
+
+    def __resolve_class_ids(self) -> Dict[str, int]:
+        """
+        Assigns class IDs to the class names used by all partitions,
+        parsing the partitions that have not been parsed yet.
+        :return: Dict[str, int] of class IDs keyed by class name
+        """
+        if self.class_ids is None:
+            names: Set[str] = set()
+            for partition in self.get_partitions():
+                names.update(partition.class_names())
+            self.class_ids = {
+                name: id for id, name in enumerate(sorted(names))
+            }
+            # Partitions sent to worker processes take the class IDs
+            # along, see VOCDatasetPartition.__reduce__
+            for partition in self.get_partitions():
+                partition.class_ids = self.class_ids
+        return self.class_ids
+
+    def __load_classes(self) -> List[DatasetClass]:
+        return [DatasetClass(id=id, name=name, parent=None)
+                for name, id in self.__resolve_class_ids().items()]
+
+
+class VOCDatasetPartition(DatasetPartition):
+
+    # Number of annotation files a worker process parses at a time
+    batch_size = 1024
+
+    def __init__(self, name, image_dir: Path, annotation_dir: Path,
+                 image_set: Path | None = None,
+                 class_ids: Dict[str, int] | None = None,
+                 processes: int | None = None):
+        self.name = name
+        self.image_dir = image_dir
+        self.annotation_dir = annotation_dir
+        self.image_set = image_set
+        # VOC datasets have no single annotation file
+        self.annotation_file = None
+        self.class_ids = class_ids
+        self.processes = processes
+        # Set by the handler to assign dataset wide class IDs
+        self.resolve_class_ids: Callable[[], Dict[str, int]] | None = None
+        # Nothing is read until the data of the partition is requested
+        self.__parsed: tuple | None = None
+        self.__classes: List[DatasetClass] | None = None
+        self.__images: Dict[int, DatasetImage] | None = None
+        self.__annotations: AnnotationTable | None = None
+
+    def __reduce__(self):
+        # Only the location of the partition and the class IDs, if they
+        # are resolved, are sent to worker processes, which load it
+        # themselves. Resolving them here would parse every partition
+        # of the dataset in the parent, see DatasetConverter.convert
+        return (VOCDatasetPartition, (
+            self.name, self.image_dir, self.annotation_dir,
+            self.image_set, self.class_ids, self.processes))
+
+    def __class_ids(self) -> Dict[str, int]:
+        if self.class_ids is None:
+            if self.resolve_class_ids is not None:
+                self.class_ids = self.resolve_class_ids()
+            else:
+                # A partition of its own numbers its class names
+                self.class_ids = {
+                    name: id
+                    for id, name in enumerate(sorted(self.class_names()))
+                }
+        return self.class_ids
+
+    def __stems(self) -> List[str]:
+        """
+        Returns the annotation file names (without suffix) of the
+        images in the partition.
+        :return: List[str]
+        """
+        if self.image_set is not None:
+            with open(self.image_set, "r") as f:
+                return [line.split()[0] for line in f if line.strip()]
+        with os.scandir(self.annotation_dir) as entries:
+            return sorted(
+                entry.name[:-4] for entry in entries
+                if entry.name.endswith(".xml") and entry.is_file())
+
+    def __parse(self) -> tuple:
+        """
+        Parses the annotation files of the partition in batches on a
+        process pool, each batch returning typed array columns.
+        :return: tuple of the image stems, the class names and the
+        merged columns, see _read_batch
+        """
+        if self.__parsed is not None:
+            return self.__parsed
+        stems = self.__stems()
+        annotation_dir = str(self.annotation_dir)
+        batches = [
+            [os.path.join(annotation_dir, stem + ".xml")
+             for stem in stems[i:i + self.batch_size]]
+            for i in range(0, len(stems), self.batch_size)
+        ]
+        # Worker processes of a parallel conversion load partitions
+        # without starting a pool of their own
+        processes = self.processes
+        if processes is None:
+            processes = 1 if parent_process() is not None \
+                else os.cpu_count() or 1
+        with profiling.stage("load.parse", partition=self.name):
+            if len(batches) > 1 and processes > 1:
+                with ProcessPoolExecutor(processes) as pool:
+                    results = list(pool.map(_read_batch, batches))
+            else:
+                results = [_read_batch(batch) for batch in batches]
+            profiling.add_io(read=sum(result[0] for result in results),
+                             files=len(stems))
+
+        # Merge the batches, mapping their class name indices onto
+        # the class names of the whole partition
+        names: Dict[str, int] = {}
+        filenames: List[str] = []
+        merged = (array("q"), array("q"), array("q"),
+                  array("q"), array("b"),
+                  array("d"), array("d"), array("d"), array("d"))
+        for _, batch_names, batch_filenames, *columns in results:
+            remap = [names.setdefault(name, len(names))
+                     for name in batch_names]
+            filenames.extend(batch_filenames)
+            for column, values in zip(merged, columns):
+                if column is merged[3]:
+                    values = (remap[value] for value in values)
+                column.extend(values)
+        self.__parsed = (stems, list(names), filenames) + merged
+        return self.__parsed
+
+    def class_names(self) -> List[str]:
+        """
+        Returns the class names used in the partition.
+        :return: List[str]
+        """
+        return self.__parse()[1]
+
+    def __load(self):
+        """
+        Builds the images and the annotation table of the partition
+        from the parsed columns.
+        """
+        if self.__annotations is not None:
+            return
+        (stems, names, filenames, widths, heights, counts,
+         name_ids, difficult, *columns) = self.__parse()
+        class_ids = self.__class_ids()
+        self.__classes = [DatasetClass(id=id, name=name, parent=None)
+                          for name, id in class_ids.items()]
+        # Numeric file names are kept as image IDs, so that datasets
+        # converted to VOC keep their IDs, otherwise images are
+        # numbered in image list order
+        if all(stem.isdigit() for stem in stems) \
+                and len(set(map(int, stems))) == len(stems):
+            ids = [int(stem) for stem in stems]
+        else:
+            ids = list(range(len(stems)))
+
+        self.__images = {}
+        table = AnnotationTable(
+            {cls.id: cls for cls in self.__classes}, self.__images)
+        for id, filename, width, height, count in zip(
+                ids, filenames, widths, heights, counts):
+            # Missing or zero sizes are read from the image headers
+            # once they are needed, see image_sizes
+            self.__images[id] = DatasetImage(
+                id=id,
+                path=self.image_dir / filename,
+                width=width if width > 0 else None,
+                height=height if height > 0 else None
+            )
+            table.image_ids.extend([id] * count)
+        remap = [class_ids[name] for name in names]
+        table.class_ids = array("q", (remap[i] for i in name_ids))
+        # VOC difficult objects are kept in the iscrowd column, both
+        # mark boxes that evaluation ignores
+        table.iscrowd = difficult
+        (table.x_center, table.y_center,
+         table.width, table.height) = columns
+        # VOC objects have no IDs of their own, number them in file
+        # order instead
+        table.ids = array("q", range(len(table.class_ids)))
+        self.__annotations = table
+        # The parsed columns now live in the table
+        self.__parsed = (stems, names)
+
+    def get_classes(self) -> List[DatasetClass]:
+        self.__load()
+        return self.__classes
+
+    def get_images(self) -> Dict[int, DatasetImage]:
+        self.__load()
+        return self.__images
+
+    def get_annotations(self) -> AnnotationTable:
+        self.__load()
+        return self.__annotations
@@ -0,0 +1,521 @@
+import json
+import os
+import re
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import parent_process
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from ODConvert.core import DatasetPartition, DatasetClass, DatasetImage
+from ODConvert.core import DatasetHandler, DatasetType, AnnotationTable
+from ODConvert.core import BoxFormat, convert_boxes
+from ODConvert.core import profiling
+from ODConvert.core.cache import PartitionCache
+from ODConvert.core.imagesize import ImageSizeCache, default_size_cache
+from ODConvert.core.imagesize import probe_many
+from ODConvert.core.stream import RecordChunk, make_chunk
+
+
+# File suffixes of the images of a YOLO dataset
+IMAGE_SUFFIXES = frozenset((
+    ".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff", ".gif"
+))
+
+# Files that name the classes of a YOLO dataset, in order of preference
+YAML_FILES = ("data.yaml", "dataset.yaml", "data.yml", "dataset.yml")
+NAMES_FILES = ("classes.txt", "obj.names", "classes.names")
+# A label line of exactly five tokens, and a label file made of them
+_BOX_LINE = rb"[ \t]*+\S++(?:[ \t]++\S++){4}[ \t\r]*+"
+BOX_LINES = re.compile(_BOX_LINE + rb"(?:\n" + _BOX_LINE + rb")*+")
+
+# The "names:" key of a YAML file, with its inline value if any
+_NAMES_KEY = re.compile(r"^names\s*:\s*(.*?)\s*$")
+
+
+def _unquote(value: str) -> str:
+    """
+    Removes the quotes around a YAML scalar.
+    :param value: The scalar as written in the file.
+    :return: str
+    """
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return json.loads(value)
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    return value
+
+
+def _parse_yaml_names(path: Path) -> Dict[int, str] | None:
+    """
+    Reads the "names" entry of a YOLO dataset YAML file, given either
+    as an inline or block list of names, or as a mapping of class IDs
+    to names. Only this entry is parsed, the rest of the file is
+    ignored.
+    :param path: The YAML file.
+    :return: Dict[int, str] | None if the file has no names entry
+    """
+    lines = path.read_text(encoding="utf-8").splitlines()
+    for i, line in enumerate(lines):
+        match = _NAMES_KEY.match(line)
+        if match is None:
+            continue
+        inline = match.group(1).split(" #")[0].strip()
+        if inline.startswith("["):
+            # names: [cat, dog]
+            return {
+                id: _unquote(name)
+                for id, name in enumerate(inline.strip("[]").split(","))
+                if name.strip()
+            }
+        if inline.startswith("{"):
+            # names: {0: cat, 1: dog}
+            items = (item.split(":", 1)
+                     for item in inline.strip("{}").split(",")
+                     if item.strip())
+            return {int(id): _unquote(name) for id, name in items}
+        # Block list or mapping on the following indented lines
+        names: Dict[int, str] = {}
+        for line in lines[i + 1:]:
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if not line[0].isspace() and not line.startswith("-"):
+                break
+            entry = line.strip()
+            if entry.startswith("-"):
+                names[len(names)] = _unquote(entry[1:])
+            else:
+                id, name = entry.split(":", 1)
+                names[int(id)] = _unquote(name)
+        return names
+    return None
+
+
+def read_class_names(dir: Path) -> Dict[int, str] | None:
+    """
+    Reads the class names of a YOLO dataset from its YAML file or
+    from a names file with one class name per line.
+    :param dir: The dataset directory.
+    :return: Dict[int, str] | None if the dataset names no classes
+    """
+    for name in YAML_FILES:
+        if (dir / name).is_file():
+            names = _parse_yaml_names(dir / name)
+            if names is not None:
+                return names
+    for name in NAMES_FILES:
+        if (dir / name).is_file():
+            lines = (dir / name).read_text(encoding="utf-8").splitlines()
+            return {
+                id: line.strip()
+                for id, line in enumerate(lines) if line.strip()
+            }
+    return None
+
+
+def _parse_label(data: bytes, label_path: str, class_ids: array,
+                 columns: Tuple[array, array, array, array]):
+    """
+    Parses the contents of a YOLO label file into the given columns.
+    Files made of "class x_center y_center width height" lines only
+    are parsed as one block of tokens, segmentation polygons are
+    reduced to their bounding box line by line.
+    :param data: The contents of the label file.
+    :param label_path: The label file, for error messages.
+    :param class_ids: The class ID column to append to.
+    :param columns: The normalized box columns to append to.
+    """
+    data = data.strip()
+    if not data:
+        return
+    if BOX_LINES.fullmatch(data):
+        # Every line holds exactly five tokens, a single box, so the
+        # columns are strided slices of the tokens. Anything else, e.g.
+        # polygons, blank or malformed lines, takes the line by line
+        # path
+        tokens = data.split()
+        class_ids.extend(map(int, tokens[0::5]))
+        for offset, column in enumerate(columns, start=1):
+            column.extend(map(float, tokens[offset::5]))
+        return
+    for number, line in enumerate(data.splitlines(), start=1):
+        values = line.split()
+        if not values:
+            continue
+        if len(values) == 5:
+            box = [float(value) for value in values[1:]]
+        elif len(values) >= 7 and len(values) % 2 == 1:
+            # Polygon of normalized x y points
+            xs = [float(value) for value in values[1::2]]
+            ys = [float(value) for value in values[2::2]]
+            box = [(min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2,
+                   max(xs) - min(xs), max(ys) - min(ys)]
+        else:
+            raise ValueError(
+                f"Invalid label on line {number} of {label_path}.")
+        class_ids.append(int(values[0]))
+        for column, value in zip(columns, box):
+            column.append(value)
+
+
+def _read_batch(batch: Sequence[Tuple[str, str | None, int, int]]
+                ) -> tuple:
+    """
+    Parses the labels of a batch of images in a worker process. Boxes
+    are converted to absolute pixel centers and sizes before they are
+    returned.
+    :param batch: The (image file, label file or None, image width,
+    image height) tuples, with -1 for unknown dimensions.
+    :return: tuple of the number of bytes read and the box counts per
+    image, followed by the class ID and box columns of all boxes
+    """
+    read = 0
+    counts = array("q")
+    class_ids = array("q")
+    columns = (array("d"), array("d"), array("d"), array("d"))
+    box_widths = array("d")
+    box_heights = array("d")
+    for image_path, label_path, width, height in batch:
+        start = len(class_ids)
+        if label_path is not None:
+            with open(label_path, "rb") as f:
+                data = f.read()
+            read += len(data)
+            _parse_label(data, label_path, class_ids, columns)
+        count = len(class_ids) - start
+        counts.append(count)
+        if count and width < 0:
+            raise ValueError(
+                f"Unable to read the dimensions of image {image_path}.")
+        box_widths.extend([width] * count)
+        box_heights.extend([height] * count)
+    # Denormalize all boxes of the batch at once
+    columns, _ = convert_boxes(
+        columns, BoxFormat.CXCYWH, BoxFormat.CXCYWH,
+        widths=box_widths, heights=box_heights, src_normalized=True)
+    return (read, counts, class_ids) + tuple(columns)
+
+
+class YOLODatasetHandler(DatasetHandler):
+
+    def __init__(self, dir: Path, stream: bool = True,
+                 cache: PartitionCache | None = None,
+                 processes: int | None = None,
+                 strict: bool = True):
+        """
+        Initialize the YOLODatasetHandler. YOLO datasets keep their
+        images in images/<partition> and their labels in
+        labels/<partition>, with one label file per image.
+        :param dir: The dataset directory.
+        :param stream: Unused, YOLO labels are always read per file.
+        :param cache: Unused, YOLO labels are always read per file.
+        :param processes: The number of processes label files are
+        parsed on, defaults to the number of CPUs.
+        :param strict: Reject labels of classes that are not named,
+        instead of keeping them for validation.
+        """
+        self.dir = dir
+        self.processes = processes
+        self.strict = strict
+        # Class names come from the dataset YAML or names file,
+        # without one the classes are the IDs used in the labels
+        self.names = read_class_names(dir)
+        partitions = self.__find_partitions()
+        if not partitions:
+            raise ValueError("No partitions found in the dataset.")
+        super().__init__(DatasetType.YOLO, self.__load_classes, partitions)
+
+    def __find_partitions(self) -> List[DatasetPartition]:
+        partitions: List[DatasetPartition] = []
+        images_dir = self.dir / "images"
+        labels_dir = self.dir / "labels"
+        if not images_dir.is_dir():
+            return partitions
+        # Every subdirectory of the images directory is a partition
+        with os.scandir(images_dir) as entries:
+            names = sorted(entry.name for entry in entries
+                           if entry.is_dir())
+        for name in names:
+            partitions.append(YOLODatasetPartition(
+                name=name,
+                image_dir=images_dir / name,
+                label_dir=labels_dir / name,
+                names=self.names,
+                processes=self.processes,
+                strict=self.strict
+            ))
+        # Datasets without partitions keep their images directly in
+        # the images directory
+        if not partitions:
+            partitions.append(YOLODatasetPartition(
+                name="default",
+                image_dir=images_dir,
+                label_dir=labels_dir,
+                names=self.names,
+                processes=self.processes,
+                strict=self.strict
+            ))
+        return partitions
+
+    def __load_classes(self) -> List[DatasetClass]:
+        if self.names is not None:
+            return [DatasetClass(id=id, name=name, parent=None)
+                    for id, name in self.names.items()]
+        # Merge the class IDs used in the labels of all partitions
+        classes: Dict[int, DatasetClass] = {}
+        for partition in self.get_partitions():
+            for cls in partition.get_classes():
+                classes.setdefault(cls.id, cls)
+        return [classes[id] for id in sorted(classes)]
+
+
+class YOLODatasetPartition(DatasetPartition):
+
+    # Number of images whose labels a worker process reads at a time
+    batch_size = 1024
+
+    def __init__(self, name, image_dir: Path, label_dir: Path,
+                 names: Dict[int, str] | None = None,
+                 processes: int | None = None,
+                 strict: bool = True):
+        self.name = name
+        self.image_dir = image_dir
+        self.label_dir = label_dir
+        # YOLO datasets have no single annotation file
+        self.annotation_file = None
+        self.names = names
+        self.processes = processes
+        self.strict = strict
+        # Nothing is read until the data of the partition is requested
+        self.__classes: List[DatasetClass] | None = None
+        self.__images: Dict[int, DatasetImage] | None = None
+        self.__annotations: AnnotationTable | None = None
+
+    def __reduce__(self):
+        # Only the location of the partition is sent to worker
+        # processes, which load it themselves
+        return (YOLODatasetPartition, (
+            self.name, self.image_dir, self.label_dir,
+            self.names, self.processes, self.strict))
+
+    def __scan(self) -> Tuple[List[Tuple[int, Path]], Dict[str, str]]:
+        """
+        Lists the image and label files of the partition.
+        :return: Tuple of the (image ID, image file) pairs in ID
+        order, and the label files keyed by file stem
+        """
+        with os.scandir(self.image_dir) as entries:
+            image_files = sorted(
+                entry.name for entry in entries
+                if entry.is_file()
+                and os.path.splitext(entry.name)[1].lower()
+                in IMAGE_SUFFIXES)
+        labels: Dict[str, str] = {}
+        if self.label_dir.is_dir():
+            with os.scandir(self.label_dir) as entries:
+                for entry in entries:
+                    stem, suffix = os.path.splitext(entry.name)
+                    if suffix == ".txt" and entry.is_file():
+                        labels[stem] = entry.path
+        # Numeric file names are kept as image IDs, so that datasets
+        # converted to YOLO keep their IDs, otherwise images are
+        # numbered in file name order
+        stems = [os.path.splitext(name)[0] for name in image_files]
+        if all(stem.isdigit() for stem in stems) \
+                and len(set(map(int, stems))) == len(stems):
+            ids = [int(stem) for stem in stems]
+        else:
+            ids = list(range(len(stems)))
+        images = sorted(zip(ids, (self.image_dir / name
+                                  for name in image_files)))
+        return images, labels
+
+    def __probe(self, images: Sequence[Tuple[int, Path]],
+                labels: Dict[str, str], cache: ImageSizeCache | None
+                ) -> Tuple[List[Tuple[int, int]], List[tuple]]:
+        """
+        Reads the dimensions of images from their headers, on worker
+        threads and skipping the images probed before.
+        :param images: The (image ID, image file) pairs.
+        :param labels: The label files keyed by file stem.
+        :param cache: The image size cache, if any.
+        :return: Tuple of the image dimensions, -1 where unknown, and
+        the label jobs of the images, see _read_batch
+        """
+        with profiling.stage("load.probe", partition=self.name):
+            sizes = [size or (-1, -1) for size in probe_many(
+                [path for _, path in images], cache=cache)]
+        # Workers get plain string paths, which are cheaper to send
+        # and open than Path objects
+        jobs = [
+            (str(path), labels.get(path.stem), width, height)
+            for (_, path), (width, height) in zip(images, sizes)
+        ]
+        return sizes, jobs
+
+    def __processes(self) -> int:
+        # Worker processes of a parallel conversion load partitions
+        # without starting a pool of their own
+        if self.processes is not None:
+            return self.processes
+        return 1 if parent_process() is not None else os.cpu_count() or 1
+
+    @staticmethod
+    def __build(images: Sequence[Tuple[int, Path]],
+                sizes: Sequence[Tuple[int, int]], results: Sequence[tuple],
+                classes: Dict[int, DatasetClass], first_row: int = 0
+                ) -> AnnotationTable:
+        """
+        Builds the images and the annotation table of a run of images
+        from the parsed label batches.
+        :param images: The (image ID, image file) pairs.
+        :param sizes: The image dimensions, -1 where unknown.
+        :param results: The parsed batches, see _read_batch.
+        :param classes: The classes, keyed by ID.
+        :param first_row: The ID of the first annotation.
+        :return: AnnotationTable, with the images as its images
+        """
+        built: Dict[int, DatasetImage] = {}
+        table = AnnotationTable(classes, built)
+        for (id, path), (width, height) in zip(images, sizes):
+            built[id] = DatasetImage(
+                id=id,
+                path=path,
+                width=width if width >= 0 else None,
+                height=height if height >= 0 else None
+            )
+        image_ids = iter(built)
+        for _, counts, class_ids, *columns in results:
+            for count in counts:
+                table.image_ids.extend([next(image_ids)] * count)
+            table.class_ids.extend(class_ids)
+            table.x_center.extend(columns[0])
+            table.y_center.extend(columns[1])
+            table.width.extend(columns[2])
+            table.height.extend(columns[3])
+        # YOLO annotations have no IDs of their own, number them in
+        # file order instead
+        table.ids = array(
+            "q", range(first_row, first_row + len(table.class_ids)))
+        table.iscrowd = array("b", bytes(len(table.class_ids)))
+        return table
+
+    @staticmethod
+    def __check_classes(table: AnnotationTable):
+        for id in set(table.class_ids) - table.classes.keys():
+            raise ValueError(f"Class with ID {id} not found.")
+
+    def __load(self):
+        """
+        Reads the images and labels of the partition. Label files are
+        read and parsed in batches on a process pool, each batch
+        returning typed array columns that are appended to the table.
+        """
+        if self.__annotations is not None:
+            return
+        images, labels = self.__scan()
+        cache = default_size_cache()
+        try:
+            sizes, jobs = self.__probe(images, labels, cache)
+        finally:
+            if cache is not None:
+                cache.close()
+        batches = [jobs[i:i + self.batch_size]
+                   for i in range(0, len(jobs), self.batch_size)]
+        processes = self.__processes()
+        with profiling.stage("load.labels", partition=self.name):
+            if len(batches) > 1 and processes > 1:
+                with ProcessPoolExecutor(processes) as pool:
+                    results = list(pool.map(_read_batch, batches))
+            else:
+                results = [_read_batch(batch) for batch in batches]
+            profiling.add_io(
+                read=sum(result[0] for result in results),
+                files=sum(1 for job in jobs if job[1] is not None))
+
+        table = self.__build(images, sizes, results, {})
+        self.__images = table.images
+        # Classes are the named classes, or the IDs used in the labels
+        if self.names is not None:
+            names = self.names
+        else:
+            names = {id: str(id) for id in sorted(set(table.class_ids))}
+        self.__classes = [DatasetClass(id=id, name=name, parent=None)
+                          for id, name in names.items()]
+        table.classes.update({cls.id: cls for cls in self.__classes})
+        if self.strict:
+            self.__check_classes(table)
+        self.__annotations = table
+
+    def iter_chunks(self, size: int = 1024) -> Iterator[RecordChunk]:
+        """
+        Yields the images of the partition in chunks together with
+        their annotations, reading the labels of one chunk at a time
+        (on a process pool, a few chunks ahead). Partitions without
+        class names read all labels first, as their classes are the
+        IDs used across the labels.
+        :param size: The maximum number of images per chunk.
+        :return: Iterator[RecordChunk]
+        """
+        if self.names is None or self.__annotations is not None:
+            yield from super().iter_chunks(size)
+            return
+        classes = {cls.id: cls for cls in self.get_classes()}
+        images, labels = self.__scan()
+        runs = [images[i:i + size] for i in range(0, len(images), size)]
+        processes = self.__processes()
+        cache = default_size_cache()
+        pool = ProcessPoolExecutor(processes) \
+            if len(runs) > 1 and processes > 1 else None
+        pending: deque = deque()
+        rows = 0
+        try:
+            for number in range(len(runs)):
+                # Keep a few chunks in flight on the pool, so that
+                # parsing overlaps with converting earlier chunks
+                while len(pending) < (processes if pool else 1) \
+                        and number + len(pending) < len(runs):
+                    run = runs[number + len(pending)]
+                    sizes, jobs = self.__probe(run, labels, cache)
+                    result = pool.submit(_read_batch, jobs) \
+                        if pool is not None else None
+                    pending.append((run, sizes, jobs, result))
+                run, sizes, jobs, result = pending.popleft()
+                with profiling.stage("load.labels", partition=self.name):
+                    result = result.result() if result is not None \
+                        else _read_batch(jobs)
+                    profiling.add_io(
+                        read=result[0],
+                        files=sum(1 for job in jobs if job[1] is not None))
+                table = self.__build(run, sizes, [result], classes, rows)
+                if self.strict:
+                    self.__check_classes(table)
+                rows += len(table)
+                yield make_chunk(classes.values(),
+                                 list(table.images.values()), table)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if cache is not None:
+                cache.close()
+
+    def get_classes(self) -> List[DatasetClass]:
+        if self.__classes is None:
+            if self.names is not None:
+                # Named classes are known without reading any labels
+                self.__classes = [
+                    DatasetClass(id=id, name=name, parent=None)
+                    for id, name in self.names.items()]
+            else:
+                self.__load()
+        return self.__classes
+
+    def get_images(self) -> Dict[int, DatasetImage]:
+        self.__load()
+        return self.__images
+
+    def get_annotations(self) -> AnnotationTable:
+        self.__load()
+        return self.__annotations
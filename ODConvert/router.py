@@ -1,4 +1,19 @@
-from ODConvert.commands import *
+import ODConvert.commands as _commands
+
+# Fire looks commands up through dir() and getattr() on this module,
+# so only the module of the invoked command is imported
+_COMMANDS = _commands.__all__
+
+
+def __getattr__(name: str) -> object:
+    if name not in _COMMANDS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(_commands, name)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_COMMANDS))
+
 
 if __name__ == "__main__":
-    inspect(path=".demo")
+    _commands.inspect(path=".demo")
@@ -1,11 +1,221 @@
+import os
 from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Tuple
 
 
-def detect_type(path: Path) -> str:
+class DirectoryListing:
+    """
+    A cached view of a dataset directory shared by the format sniffers.
+    Every directory is listed at most once and every file head read at
+    most once, however many sniffers ask for it. Subdirectories are
+    only scanned up to the first few matching entries, so that large
+    annotation directories cost the same as small ones.
+    """
 
-    def check_is_yolo(path: Path) -> bool:
-        # TODO
-        return True
+    def __init__(self, path: Path, head_size: int = 4096):
+        """
+        Initialize the DirectoryListing.
+        :param path: The dataset directory.
+        :param head_size: The number of bytes read from the start of
+        candidate files.
+        """
+        self.path = path
+        self.head_size = head_size
+        self.__lock = Lock()
+        self.__entries: Dict[str, Dict[str, bool]] = {}
+        self.__samples: Dict[Tuple[str, str, int], List[str]] = {}
+        self.__heads: Dict[str, bytes] = {}
 
-    if check_is_yolo(path):
-        return "yolo"
+    def entries(self, relative: str = "") -> Dict[str, bool]:
+        """
+        Lists a directory of the dataset.
+        :param relative: The directory, relative to the dataset.
+        :return: Dict[str, bool] of whether each entry is a directory,
+        keyed by the entry name, empty if the directory does not exist
+        """
+        with self.__lock:
+            entries = self.__entries.get(relative)
+            if entries is None:
+                entries = {}
+                try:
+                    with os.scandir(self.path / relative) as scan:
+                        for entry in scan:
+                            entries[entry.name] = entry.is_dir()
+                except OSError:
+                    pass
+                self.__entries[relative] = entries
+            return entries
+
+    def is_dir(self, relative: str) -> bool:
+        """
+        Checks whether a path of the dataset is a directory, using the
+        listing of its parent.
+        :param relative: The path, relative to the dataset.
+        :return: bool
+        """
+        parent, _, name = relative.rpartition("/")
+        return self.entries(parent).get(name, False)
+
+    def sample(self, relative: str, suffix: str, count: int = 3) \
+            -> List[str]:
+        """
+        Returns the first few files of a directory with a suffix,
+        without listing the rest of the directory.
+        :param relative: The directory, relative to the dataset.
+        :param suffix: The file suffix, e.g. ".json".
+        :param count: The maximum number of files returned.
+        :return: List[str] of the file paths relative to the dataset
+        """
+        key = (relative, suffix, count)
+        with self.__lock:
+            sample = self.__samples.get(key)
+            if sample is not None:
+                return sample
+        sample = []
+        try:
+            with os.scandir(self.path / relative) as scan:
+                for entry in scan:
+                    if entry.name.endswith(suffix) and entry.is_file():
+                        sample.append(f"{relative}/{entry.name}")
+                        if len(sample) == count:
+                            break
+        except OSError:
+            pass
+        with self.__lock:
+            self.__samples[key] = sample
+        return sample
+
+    def head(self, relative: str) -> bytes:
+        """
+        Reads the start of a file of the dataset.
+        :param relative: The file, relative to the dataset.
+        :return: bytes, empty if the file cannot be read
+        """
+        with self.__lock:
+            head = self.__heads.get(relative)
+            if head is not None:
+                return head
+        try:
+            with open(self.path / relative, "rb") as f:
+                head = f.read(self.head_size)
+        except OSError:
+            head = b""
+        with self.__lock:
+            self.__heads[relative] = head
+        return head
+
+
+def sniff_coco(listing: DirectoryListing) -> float:
+    """
+    Scores how likely a directory is a COCO dataset. COCO datasets
+    keep .json files in an "annotations" directory, whose objects have
+    "images", "annotations" and "categories" keys.
+    :param listing: The dataset directory.
+    :return: float, the confidence between 0 and 1
+    """
+    if not listing.is_dir("annotations"):
+        return 0.0
+    files = listing.sample("annotations", ".json")
+    if not files:
+        return 0.0
+    score = 0.5
+    head = listing.head(files[0])
+    if head.lstrip()[:1] == b"{" and any(
+            key in head for key in
+            (b'"images"', b'"annotations"', b'"categories"')):
+        score += 0.4
+    if listing.is_dir("images"):
+        score += 0.1
+    return score
+
+
+def sniff_voc(listing: DirectoryListing) -> float:
+    """
+    Scores how likely a directory is a Pascal VOC dataset. VOC
+    datasets keep one <annotation> .xml file per image in
+    "Annotations", next to "JPEGImages" and "ImageSets".
+    :param listing: The dataset directory.
+    :return: float, the confidence between 0 and 1
+    """
+    if not listing.is_dir("Annotations"):
+        return 0.0
+    files = listing.sample("Annotations", ".xml")
+    if not files:
+        return 0.0
+    score = 0.5
+    if b"<annotation" in listing.head(files[0]):
+        score += 0.3
+    if listing.is_dir("JPEGImages"):
+        score += 0.1
+    if listing.is_dir("ImageSets"):
+        score += 0.1
+    return score
+
+
+def _is_yolo_label(head: bytes) -> bool:
+    # Every complete line holds a class ID followed by normalized
+    # coordinates, i.e. at least 5 numbers. The last line may be cut
+    # off by the head size
+    lines = head.splitlines()[:-1] or head.splitlines()
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        if len(tokens) < 5 or not tokens[0].isdigit():
+            return False
+        try:
+            [float(token) for token in tokens[1:]]
+        except ValueError:
+            return False
+    return True
+
+
+def sniff_yolo(listing: DirectoryListing) -> float:
+    """
+    Scores how likely a directory is a YOLO dataset. YOLO datasets
+    keep their images and .txt label files in "images" and "labels"
+    directories, optionally split into partition subdirectories, and
+    often their class names in a data.yaml file.
+    :param listing: The dataset directory.
+    :return: float, the confidence between 0 and 1
+    """
+    if not listing.is_dir("images") or not listing.is_dir("labels"):
+        return 0.0
+    # Only the labels directory of partitioned datasets is listed, as
+    # flat ones may hold thousands of files
+    files = listing.sample("labels", ".txt")
+    if not files:
+        partitions = sorted(
+            name for name, is_dir in listing.entries("labels").items()
+            if is_dir)
+        if not partitions:
+            return 0.0
+        for name in partitions:
+            files = listing.sample(f"labels/{name}", ".txt")
+            if files:
+                break
+    score = 0.5
+    if files and _is_yolo_label(listing.head(files[0])):
+        score += 0.3
+    root = listing.entries()
+    if any(name in root for name in
+           ("data.yaml", "dataset.yaml", "data.yml", "dataset.yml",
+            "classes.txt", "obj.names", "classes.names")):
+        score += 0.2
+    return score
+
+
+def sniff_odc(listing: DirectoryListing) -> float:
+    """
+    Scores how likely a directory is an ODC dataset, ODConvert's own
+    format. Complete ODC datasets hold an odc.json manifest naming the
+    format.
+    :param listing: The dataset directory.
+    :return: float, the confidence between 0 and 1
+    """
+    if "odc.json" not in listing.entries():
+        return 0.0
+    if b'"format": "odc"' in listing.head("odc.json"):
+        return 1.0
+    return 0.0
@@ -0,0 +1,87 @@
+import errno
+import os
+import shutil
+from enum import Enum
+from pathlib import Path
+
+from ODConvert.core import profiling
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, reflinks fall back to a plain copy there
+    fcntl = None
+
+
+# ioctl request to clone a file's extents on Linux (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+
+class LinkMode(Enum):
+    COPY = "copy"
+    HARDLINK = "hardlink"
+    SYMLINK = "symlink"
+    REFLINK = "reflink"
+
+    def __str__(self):
+        return self.value
+
+
+def transfer_file(src: Path, dst: Path, mode: LinkMode = LinkMode.COPY):
+    """
+    Places the file src at dst by copying or linking it. Hard links
+    and reflinks fall back to a plain copy when the filesystem does
+    not support them, e.g. across devices.
+    :param src: The source file.
+    :param dst: The destination path.
+    :param mode: How to place the file.
+    """
+    profiling.add_io(files=1)
+    if mode is LinkMode.COPY:
+        _copy(src, dst)
+        return
+    # Links cannot replace an existing file
+    dst.unlink(missing_ok=True)
+    if mode is LinkMode.SYMLINK:
+        os.symlink(Path(src).absolute(), dst)
+    elif mode is LinkMode.HARDLINK:
+        try:
+            os.link(src, dst)
+        except OSError:
+            _copy(src, dst)
+    else:
+        try:
+            _reflink(src, dst)
+        except OSError:
+            _copy(src, dst)
+
+
+def _copy(src: Path, dst: Path):
+    """
+    Copies src to dst, counting the copied bytes while profiling.
+    :param src: The source file.
+    :param dst: The destination path.
+    """
+    shutil.copyfile(src, dst)
+    if profiling.enabled():
+        size = os.path.getsize(dst)
+        profiling.add_io(read=size, written=size)
+
+
+def _reflink(src: Path, dst: Path):
+    """
+    Clones src into dst without copying its data blocks.
+    :param src: The source file.
+    :param dst: The destination path.
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP,
+                      "Reflinks are not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            # Leave no empty file behind for the fallback copy
+            fdst.close()
+            dst.unlink(missing_ok=True)
+            raise
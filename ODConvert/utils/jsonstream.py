@@ -0,0 +1,161 @@
+import json
+import re
+from pathlib import Path
+from typing import Any, Iterable, Iterator, TextIO, Tuple
+
+
+# Whitespace allowed between JSON tokens
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_DECODER = json.JSONDecoder()
+
+
+class JSONStreamReader:
+    """
+    Incrementally walks the top-level object of a JSON document,
+    decoding one array element at a time so that large documents
+    never have to be held in memory as a whole.
+    """
+
+    def __init__(self, fp: TextIO, chunk_size: int = 1 << 20):
+        """
+        Initialize the JSONStreamReader.
+        :param fp: A text file object positioned at the document start.
+        :param chunk_size: The number of characters read at a time.
+        """
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def __fill(self) -> bool:
+        """
+        Discards consumed text and appends the next chunk to the buffer.
+        :return: bool, False if the end of the file was reached
+        """
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def __peek(self) -> str:
+        """
+        Returns the next non-whitespace character without consuming it.
+        :return: str
+        """
+        # Fast path for compact documents without whitespace
+        if self.pos < len(self.buf) and self.buf[self.pos] not in " \t\n\r":
+            return self.buf[self.pos]
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.__fill():
+                raise ValueError("Unexpected end of JSON document.")
+
+    def __expect(self, char: str):
+        """
+        Consumes the next non-whitespace character, which must be char.
+        :param char: The expected character.
+        """
+        found = self.__peek()
+        if found != char:
+            raise ValueError(
+                f"Expected '{char}' but found '{found}' in JSON document.")
+        self.pos += 1
+
+    def __decode(self) -> Any:
+        """
+        Decodes the next JSON value, reading more input until it is
+        complete.
+        :return: Any
+        """
+        self.__peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # The value is most likely cut off by the chunk boundary
+                if self.__fill():
+                    continue
+                raise
+            # A number at the very end of the buffer may continue
+            # in the next chunk, so decode it again with more input
+            if end == len(self.buf) and self.__fill():
+                continue
+            self.pos = end
+            return value
+
+    def __skip(self):
+        """
+        Skips the next JSON value. Arrays are decoded and discarded one
+        element at a time, which is much faster than scanning them
+        character by character while never holding more than one
+        element in memory.
+        """
+        if self.__peek() != "[":
+            self.__decode()
+            return
+        self.pos += 1
+        if self.__peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            self.__decode()
+            if self.__peek() == "]":
+                self.pos += 1
+                return
+            self.__expect(",")
+
+    def items(self, keys: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+        """
+        Yields the values stored under the given top-level keys. Arrays
+        are yielded element by element, any other value is yielded
+        whole. Values of all other keys are skipped without decoding.
+        :param keys: The top-level keys of interest.
+        :return: Iterator[Tuple[str, Any]] of (key, value) pairs
+        """
+        keys = set(keys)
+        self.__expect("{")
+        if self.__peek() == "}":
+            return
+        while True:
+            key = self.__decode()
+            self.__expect(":")
+            if key not in keys:
+                self.__skip()
+            elif self.__peek() == "[":
+                self.pos += 1
+                if self.__peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.__decode()
+                        if self.__peek() == "]":
+                            self.pos += 1
+                            break
+                        self.__expect(",")
+            else:
+                yield key, self.__decode()
+            if self.__peek() == "}":
+                return
+            self.__expect(",")
+
+
+def iter_json_items(path: Path,
+                    keys: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    """
+    Streams the values stored under the given top-level keys of a
+    JSON file, see JSONStreamReader.items.
+    :param path: The path to the JSON file.
+    :param keys: The top-level keys of interest.
+    :return: Iterator[Tuple[str, Any]] of (key, value) pairs
+    """
+    with open(path, "r", encoding="utf-8") as fp:
+        yield from JSONStreamReader(fp).items(keys)
@@ -0,0 +1,35 @@
+from importlib import import_module
+from typing import Callable, Dict, List, Tuple
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) \
+        -> Tuple[Callable[[str], object], Callable[[], List[str]]]:
+    """
+    Creates the module level __getattr__ and __dir__ (PEP 562) of a
+    package whose exports are only imported on first access, so that
+    using one converter, handler or command does not import the others
+    and their dependencies.
+    :param package: The name of the package, i.e. __name__.
+    :param exports: The module every exported name is defined in,
+    keyed by the name.
+    :return: Tuple of the __getattr__ and __dir__ functions
+    """
+    namespace = import_module(package).__dict__
+
+    def __getattr__(name: str) -> object:
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(
+                f"module {package!r} has no attribute {name!r}")
+        value = getattr(import_module(module), name)
+        # Importing a submodule binds it on the package, which would
+        # shadow an export of the same name (e.g. commands.inspect),
+        # so the export is bound afterwards and later lookups skip
+        # __getattr__ entirely
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace) | set(exports))
+
+    return __getattr__, __dir__
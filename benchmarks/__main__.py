@@ -0,0 +1,212 @@
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List
+
+from fire import Fire
+from rich import print
+from rich.table import Table
+
+from benchmarks.imports import BUDGETS, measure_imports
+from benchmarks.scenarios import SCENARIOS, run_scenario
+from benchmarks.synthetic import generate_coco
+
+
+def _commit() -> str | None:
+    """
+    Returns the commit the benchmarks run against, if in a git tree.
+    :return: str | None
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _isolated(name: str, path: Path, trace: bool, options: dict) -> dict:
+    """
+    Runs a scenario in a fresh process, so that its peak RSS and
+    allocations are not affected by earlier runs.
+    """
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_scenario, name, path, trace,
+                           **options).result()
+
+
+def run(output: str = "benchmark.json",
+        images: int = 2000,
+        annotations: int = 20000,
+        classes: int = 20,
+        partitions: str = "train,val",
+        dimensions: bool = True,
+        scenarios: str = ",".join(SCENARIOS),
+        repeat: int = 3,
+        trace: bool = True,
+        seed: int = 0,
+        imports: bool = True,
+        **options):
+    """
+    Generates a synthetic COCO dataset and runs the benchmark
+    scenarios against it, writing the results to a JSON file.
+    :param output: The JSON file the results are written to.
+    :param images: The number of images to generate.
+    :param annotations: The number of annotations to generate.
+    :param classes: The number of classes to generate.
+    :param partitions: The comma separated partition names.
+    :param dimensions: Whether image dimensions are written to the
+    annotation files.
+    :param scenarios: The comma separated scenarios to run.
+    :param repeat: The number of timed runs per scenario.
+    :param trace: Whether to add a run per scenario that traces
+    allocations, which is not used for timing.
+    :param seed: The random seed of the generated dataset.
+    :param imports: Whether to also measure the import times, see
+    the imports command.
+    :param options: Options passed on to the scenarios, e.g.
+    --to_type voc or --processes 4 for the convert scenario.
+    """
+    names: List[str] = [name for name in scenarios.split(",") if name]
+    for name in names:
+        if name not in SCENARIOS:
+            raise ValueError(
+                f"Unknown scenario: {name}. Valid scenarios are: "
+                f"{', '.join(SCENARIOS)}")
+
+    directory = Path(tempfile.mkdtemp(prefix="odc-bench-data-"))
+    try:
+        print(f"[bold]Generating {images} images and {annotations} "
+              f"annotations[/bold]")
+        path = directory / "dataset"
+        generate_start = time.perf_counter()
+        generate_coco(path, images=images, annotations=annotations,
+                      classes=classes, partitions=partitions.split(","),
+                      dimensions=dimensions, seed=seed)
+        generate_time = time.perf_counter() - generate_start
+
+        results: Dict[str, dict] = {}
+        for name in names:
+            print(f"[bold]Running [dodger_blue1]{name}[/dodger_blue1] "
+                  f"({repeat} runs)[/bold]")
+            runs = [_isolated(name, path, False, options)
+                    for _ in range(repeat)]
+            results[name] = {
+                "runs": runs,
+                "median_wall_s": {
+                    stage: statistics.median(
+                        run[stage]["wall_s"] for run in runs)
+                    for stage in runs[0]
+                },
+                "traced": _isolated(name, path, True, options)
+                if trace else None,
+            }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "commit": _commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "parameters": {
+            "images": images,
+            "annotations": annotations,
+            "classes": classes,
+            "partitions": partitions,
+            "dimensions": dimensions,
+            "repeat": repeat,
+            "seed": seed,
+            "options": options,
+        },
+        "generate_s": generate_time,
+        "scenarios": results,
+        "imports": measure_imports() if imports else None,
+    }
+    Path(output).write_text(json.dumps(report, indent=2))
+    _print_summary(report)
+    if report["imports"] is not None:
+        _print_imports(report["imports"])
+    print(f"Results written to {output}")
+
+
+def _print_summary(report: dict, baseline: dict | None = None):
+    """
+    Prints the median wall time and peak RSS of every stage, compared
+    with a baseline report if given.
+    """
+    table = Table("Scenario", "Stage", "Wall (s)", "Peak RSS (MB)")
+    if baseline is not None:
+        table.add_column("Baseline (s)")
+        table.add_column("Change")
+    for name, result in report["scenarios"].items():
+        for stage, wall in result["median_wall_s"].items():
+            rss = max(run[stage]["peak_rss_kb"] for run in result["runs"])
+            row = [name, stage, f"{wall:.3f}", f"{rss / 1024:.1f}"]
+            if baseline is not None:
+                base = baseline["scenarios"].get(name, {}) \
+                    .get("median_wall_s", {}).get(stage)
+                if base:
+                    row += [f"{base:.3f}", f"{(wall / base - 1):+.1%}"]
+                else:
+                    row += ["-", "-"]
+            table.add_row(*row)
+    print(table)
+
+
+def _print_imports(results: List[dict]) -> bool:
+    """
+    Prints the import times and budgets.
+    :return: bool, whether every import is within its budget
+    """
+    table = Table("Module", "Import (ms)", "Budget (ms)", "")
+    for result in results:
+        table.add_row(
+            result["module"], f"{result['median_ms']:.1f}",
+            f"{result['budget_ms']:.0f}",
+            "[green]ok[/green]" if result["within"]
+            else "[red]over budget[/red]")
+    print(table)
+    return all(result["within"] for result in results)
+
+
+def imports(budgets: Dict[str, float] | None = None, repeat: int = 5):
+    """
+    Measures how long odc takes to import its entry point and each
+    command with python -X importtime, and fails if any of them is
+    over its budget.
+    :param budgets: The budgets in milliseconds keyed by module, e.g.
+    --budgets '{"ODConvert.__main__": 100}'. Defaults to BUDGETS.
+    :param repeat: The number of measurements per module.
+    """
+    if not _print_imports(measure_imports(
+            dict(BUDGETS, **(budgets or {})), repeat=repeat)):
+        sys.exit(1)
+
+
+def compare(baseline: str, current: str):
+    """
+    Compares the results of two benchmark runs, e.g. of two commits.
+    :param baseline: The JSON results of the baseline run.
+    :param current: The JSON results of the run to compare.
+    """
+    baseline_report = json.loads(Path(baseline).read_text())
+    current_report = json.loads(Path(current).read_text())
+    if baseline_report["parameters"] != current_report["parameters"]:
+        print("[yellow]:warning: The runs used different parameters."
+              "[/yellow]")
+    print(f"Baseline: {baseline_report['commit']}")
+    print(f"Current: {current_report['commit']}")
+    _print_summary(current_report, baseline_report)
+
+
+if __name__ == "__main__":
+    Fire({"run": run, "compare": compare, "imports": imports})
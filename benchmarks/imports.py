@@ -0,0 +1,74 @@
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+
+# Import time budgets in milliseconds of what odc imports before it
+# runs a command: the entry point, and the module of each command
+BUDGETS: Dict[str, float] = {
+    "ODConvert.__main__": 150.0,
+    "ODConvert.commands.inspect": 250.0,
+    "ODConvert.commands.convert": 250.0,
+}
+
+
+def _import_times(statement: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Runs a statement in a fresh interpreter with -X importtime.
+    :param statement: The Python statement to run.
+    :return: Dict[str, Tuple[int, int]] of the self and cumulative
+    import time in microseconds, keyed by the top level modules
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, check=True)
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented, only top level imports are
+        # counted so that nothing is counted twice
+        if name.startswith("  "):
+            continue
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def import_time_ms(module: str) -> float:
+    """
+    Measures the time it takes a fresh interpreter to import a module,
+    excluding what the interpreter imports at startup.
+    :param module: The module to import.
+    :return: float, milliseconds
+    """
+    startup = _import_times("pass")
+    times = _import_times(f"import {module}")
+    return sum(cumulative for name, (_, cumulative) in times.items()
+               if name not in startup) / 1000
+
+
+def measure_imports(budgets: Dict[str, float] | None = None,
+                    repeat: int = 5) -> List[dict]:
+    """
+    Measures the median import time of every module with a budget.
+    :param budgets: The budgets in milliseconds keyed by module,
+    BUDGETS by default.
+    :param repeat: The number of measurements per module, after one
+    warm up import that compiles the bytecode caches.
+    :return: List[dict] of module, median_ms, budget_ms and within
+    """
+    results: List[dict] = []
+    for module, budget in (budgets or BUDGETS).items():
+        import_time_ms(module)
+        median = statistics.median(
+            import_time_ms(module) for _ in range(repeat))
+        results.append({
+            "module": module,
+            "median_ms": median,
+            "budget_ms": budget,
+            "within": median <= budget,
+        })
+    return results
@@ -0,0 +1,70 @@
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+def peak_rss_kb() -> int:
+    """
+    Returns the peak resident set size of this process and of its
+    finished child processes, in kilobytes.
+    :return: int
+    """
+    scale = 1024 if sys.platform == "darwin" else 1
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) // scale
+
+
+class StageRecorder:
+    """
+    Records the wall time, CPU time, peak RSS and allocations of the
+    stages of a benchmark run. Peak RSS can only grow within a process,
+    so every run happens in a fresh process and the peak of a stage is
+    the peak of the run up to the end of that stage.
+    """
+
+    def __init__(self, trace: bool = False):
+        """
+        Initialize the StageRecorder.
+        :param trace: Whether to trace allocations with tracemalloc,
+        which slows the stages down several times over, so traced
+        runs should not be used for timing.
+        """
+        self.trace = trace
+        self.stages: Dict[str, dict] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measures the code run in the context as the stage name.
+        :param name: The name of the stage.
+        """
+        if self.trace:
+            tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        cpu = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            result = {
+                "wall_s": wall,
+                "cpu_s": time.process_time() - cpu,
+                "peak_rss_kb": peak_rss_kb(),
+                # Memory blocks still allocated after the stage, i.e.
+                # the objects the stage left alive
+                "retained_blocks": sys.getallocatedblocks() - blocks,
+            }
+            if self.trace:
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                result["traced_peak_bytes"] = peak
+                result["traced_current_bytes"] = current
+                result["traced_blocks"] = sum(
+                    stat.count for stat in snapshot.statistics("filename"))
+            self.stages[name] = result
@@ -0,0 +1,92 @@
+import io
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Callable, Dict
+
+from benchmarks.measure import StageRecorder
+
+
+def bench_autodetect(path: Path, recorder: StageRecorder, **options):
+    """
+    Detects the dataset type and creates its handler.
+    """
+    from ODConvert.core import autodetect
+    with recorder.stage("autodetect"):
+        autodetect(path, cache=None)
+
+
+def bench_load(path: Path, recorder: StageRecorder, **options):
+    """
+    Detects the dataset, then loads the classes, images and
+    annotations of every partition.
+    """
+    from ODConvert.core import autodetect
+    with recorder.stage("autodetect"):
+        dataset = autodetect(path, cache=None)
+    with recorder.stage("load"):
+        dataset.get_classes()
+        for partition in dataset.get_partitions():
+            partition.get_images()
+            partition.get_annotations()
+
+
+def bench_inspect(path: Path, recorder: StageRecorder, **options):
+    """
+    Runs the inspect command end to end, discarding its output.
+    """
+    from ODConvert.commands import inspect
+    with recorder.stage("inspect"), redirect_stdout(io.StringIO()):
+        inspect(str(path), cache=False)
+
+
+def bench_convert(path: Path, recorder: StageRecorder,
+                  to_type: str = "yolo", link_mode: str = "copy",
+                  processes: int = 1, **options):
+    """
+    Detects and loads the dataset, then converts it into a temporary
+    directory that is removed afterwards.
+    """
+    from ODConvert.core import DatasetType, autodetect, registry
+    from ODConvert.utils.files import LinkMode
+    to = DatasetType(to_type.upper())
+    converter = registry.get_converter(to)
+    output = Path(tempfile.mkdtemp(prefix="odc-bench-"))
+    try:
+        with recorder.stage("autodetect"):
+            dataset = autodetect(path, cache=None)
+        with recorder.stage("load"):
+            for partition in dataset.get_partitions():
+                partition.get_annotations()
+        with recorder.stage("convert"), redirect_stdout(io.StringIO()):
+            converter(dataset, to, output,
+                      link_mode=LinkMode(link_mode),
+                      processes=processes).convert()
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+
+# Benchmark scenarios by name
+SCENARIOS: Dict[str, Callable[..., None]] = {
+    "autodetect": bench_autodetect,
+    "load": bench_load,
+    "inspect": bench_inspect,
+    "convert": bench_convert,
+}
+
+
+def run_scenario(name: str, path: Path, trace: bool = False,
+                 **options) -> Dict[str, dict]:
+    """
+    Runs a scenario and returns the measurements of its stages. Meant
+    to be called in a fresh process, see run.
+    :param name: The name of the scenario, see SCENARIOS.
+    :param path: The dataset directory.
+    :param trace: Whether to trace allocations, see StageRecorder.
+    :param options: Options passed on to the scenario.
+    :return: Dict[str, dict] of measurements keyed by stage name
+    """
+    recorder = StageRecorder(trace=trace)
+    SCENARIOS[name](path, recorder, **options)
+    return recorder.stages
@@ -0,0 +1,116 @@
+import json
+import random
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, Sequence, Tuple
+
+
+# Dimensions of the placeholder images, picked at random per image
+IMAGE_SIZES: Tuple[Tuple[int, int], ...] = ((64, 48), (48, 64), (32, 32))
+
+
+def placeholder_png(width: int, height: int) -> bytes:
+    """
+    Returns a valid, black RGB PNG image of the given dimensions. The
+    pixel data compresses to a few bytes, so that millions of images
+    stay small on disk.
+    :param width: The image width.
+    :param height: The image height.
+    :return: bytes
+    """
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data)))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    # Every row starts with a filter type byte
+    pixels = zlib.compress(bytes((1 + width * 3) * height), 9)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", pixels) + chunk(b"IEND", b""))
+
+
+def generate_coco(directory: Path,
+                  images: int = 1000,
+                  annotations: int = 10000,
+                  classes: int = 10,
+                  partitions: Sequence[str] = ("train", "val"),
+                  dimensions: bool = True,
+                  seed: int = 0) -> Dict[str, int]:
+    """
+    Generates a synthetic COCO dataset with placeholder images and
+    random boxes that lie within their image.
+    :param directory: The dataset directory, which must not exist.
+    :param images: The total number of images.
+    :param annotations: The total number of annotations.
+    :param classes: The number of classes.
+    :param partitions: The partition names, images and annotations
+    are split evenly between them.
+    :param dimensions: Whether images[].width/height are written, so
+    that readers do not have to probe the image files.
+    :param seed: The random seed, the same arguments always generate
+    the same dataset.
+    :return: Dict[str, int] of the number of images per partition
+    """
+    rng = random.Random(seed)
+    image_dir = directory / "images"
+    image_dir.mkdir(parents=True)
+    (directory / "annotations").mkdir()
+    placeholders = {size: placeholder_png(*size) for size in IMAGE_SIZES}
+    categories = [
+        {"id": id, "name": f"class_{id}", "supercategory": "none"}
+        for id in range(1, classes + 1)
+    ]
+
+    counts: Dict[str, int] = {}
+    image_id = 0
+    annotation_id = 0
+    for number, name in enumerate(partitions):
+        # Split the images and annotations evenly, the last partition
+        # takes the remainder
+        last = number == len(partitions) - 1
+        partition_images = images - image_id if last \
+            else images // len(partitions)
+        partition_annotations = annotations - annotation_id if last \
+            else annotations // len(partitions)
+
+        coco_images = []
+        for id in range(image_id, image_id + partition_images):
+            size = rng.choice(IMAGE_SIZES)
+            file_name = f"{id:012d}.png"
+            (image_dir / file_name).write_bytes(placeholders[size])
+            image = {"id": id, "file_name": file_name}
+            if dimensions:
+                image["width"], image["height"] = size
+            coco_images.append((image, size))
+
+        coco_annotations = []
+        for id in range(annotation_id,
+                        annotation_id + partition_annotations):
+            image, (width, height) = rng.choice(coco_images)
+            box_width = rng.uniform(1, width / 2)
+            box_height = rng.uniform(1, height / 2)
+            x_min = rng.uniform(0, width - box_width)
+            y_min = rng.uniform(0, height - box_height)
+            coco_annotations.append({
+                "id": id,
+                "image_id": image["id"],
+                "category_id": rng.randint(1, classes),
+                "bbox": [round(x_min, 2), round(y_min, 2),
+                         round(box_width, 2), round(box_height, 2)],
+                "area": round(box_width * box_height, 2),
+                "iscrowd": 0,
+            })
+
+        with open(directory / "annotations" / f"instances_{name}.json",
+                  "w") as f:
+            json.dump({
+                "images": [image for image, _ in coco_images],
+                "annotations": coco_annotations,
+                "categories": categories,
+            }, f)
+        counts[name] = partition_images
+        image_id += partition_images
+        annotation_id += partition_annotations
+    return counts